@@ -19,7 +19,7 @@ if config.config_file_name:
 
 # Import models and metadata
 from app.db.base import Base
-from app.models import user, document, user_api_key, feedback, conversation, conversation_message
+from app.models import user, document, user_api_key, feedback, conversation, conversation_message, ingestion_job
 
 target_metadata = Base.metadata
 
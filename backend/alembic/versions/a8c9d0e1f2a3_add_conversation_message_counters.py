@@ -0,0 +1,55 @@
+"""add conversation message counters
+
+Revision ID: a8c9d0e1f2a3
+Revises: f7b8c9d0e1f2
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a8c9d0e1f2a3"
+down_revision: Union[str, Sequence[str], None] = "f7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversations",
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("conversations", sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("conversations", sa.Column("last_message_preview", sa.String(), nullable=True))
+
+    # Backfill from existing messages; preview mirrors message_preview() (whitespace-collapsed, 120 chars)
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET message_count = stats.message_count,
+            last_message_at = stats.last_message_at,
+            last_message_preview = CASE
+                WHEN length(stats.preview) <= 120 THEN stats.preview
+                ELSE rtrim(left(stats.preview, 117)) || '...'
+            END
+        FROM (
+            SELECT DISTINCT ON (conversation_id)
+                conversation_id,
+                count(*) OVER (PARTITION BY conversation_id) AS message_count,
+                created_at AS last_message_at,
+                btrim(regexp_replace(content, '\\s+', ' ', 'g')) AS preview
+            FROM conversation_messages
+            ORDER BY conversation_id, created_at DESC, id DESC
+        ) AS stats
+        WHERE stats.conversation_id = c.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "last_message_preview")
+    op.drop_column("conversations", "last_message_at")
+    op.drop_column("conversations", "message_count")
@@ -0,0 +1,51 @@
+"""add ingestion jobs table
+
+Revision ID: c4e5f6a7b8c9
+Revises: b7c8d9e0f1a2
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c4e5f6a7b8c9"
+down_revision: Union[str, Sequence[str], None] = "b7c8d9e0f1a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingestion_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("doc_id", sa.String(), nullable=False),
+        sa.Column("user_email", sa.String(), nullable=False),
+        sa.Column("payload", sa.LargeBinary(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False, server_default="queued"),
+        sa.Column("priority", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column("run_after", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("lease_owner", sa.String(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["doc_id"], ["documents.doc_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_ingestion_jobs_id", "ingestion_jobs", ["id"], unique=False)
+    op.create_index("ix_ingestion_jobs_doc_id", "ingestion_jobs", ["doc_id"], unique=False)
+    op.create_index("ix_ingestion_jobs_user_email", "ingestion_jobs", ["user_email"], unique=False)
+    op.create_index("ix_ingestion_jobs_claim", "ingestion_jobs", ["status", "priority", "run_after"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ingestion_jobs_claim", table_name="ingestion_jobs")
+    op.drop_index("ix_ingestion_jobs_user_email", table_name="ingestion_jobs")
+    op.drop_index("ix_ingestion_jobs_doc_id", table_name="ingestion_jobs")
+    op.drop_index("ix_ingestion_jobs_id", table_name="ingestion_jobs")
+    op.drop_table("ingestion_jobs")
@@ -0,0 +1,28 @@
+"""add payload_format to ingestion jobs
+
+Revision ID: d5f6a7b8c9d0
+Revises: c4e5f6a7b8c9
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d5f6a7b8c9d0"
+down_revision: Union[str, Sequence[str], None] = "c4e5f6a7b8c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ingestion_jobs",
+        sa.Column("payload_format", sa.String(), nullable=False, server_default="text/gzip"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("ingestion_jobs", "payload_format")
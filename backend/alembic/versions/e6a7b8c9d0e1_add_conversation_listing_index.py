@@ -0,0 +1,30 @@
+"""add conversation listing index
+
+Revision ID: e6a7b8c9d0e1
+Revises: d5f6a7b8c9d0
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e6a7b8c9d0e1"
+down_revision: Union[str, Sequence[str], None] = "d5f6a7b8c9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_conversations_user_updated_id",
+        "conversations",
+        ["user_email", "updated_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_conversations_user_updated_id", table_name="conversations")
@@ -0,0 +1,38 @@
+"""add conversation messages paging index
+
+Revision ID: f7b8c9d0e1f2
+Revises: e6a7b8c9d0e1
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f7b8c9d0e1f2"
+down_revision: Union[str, Sequence[str], None] = "e6a7b8c9d0e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_conversation_messages_conversation_created_id",
+        "conversation_messages",
+        ["conversation_id", "created_at", "id"],
+        unique=False,
+    )
+    # Covered by the composite index's leading column
+    op.drop_index("ix_conversation_messages_conversation_id", table_name="conversation_messages")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_conversation_messages_conversation_id",
+        "conversation_messages",
+        ["conversation_id"],
+        unique=False,
+    )
+    op.drop_index("ix_conversation_messages_conversation_created_id", table_name="conversation_messages")
@@ -19,10 +19,21 @@ from app.api.conversations import (
 from app.core.config import settings
 from app.core.encryption import decrypt_key
 from app.core.security import get_current_user
-from app.db.session import AsyncSessionLocal, get_db
+from app.db.session import get_db
 from app.models.document import Document
 from app.models.user_api_key import UserAPIKey
+from app.services.context_packer import pack_context
+from app.services.conversation_memory import (
+    Turn,
+    build_history,
+    can_reuse_context,
+    condense_query,
+    load_recent_turns,
+    recent_context,
+)
+from app.services.message_writer import message_writer
 from app.services.rag import (
+    StreamEvent,
     get_context_chunks,
     get_workspace_context_chunks,
     has_sufficient_context,
@@ -36,38 +47,50 @@ limiter = Limiter(key_func=get_remote_address)
 MAX_QUESTION_LENGTH = 2000
 
 
+_START_FRAME = 'data: {"choices":[{"delta":{"content":""}}]}\n\n'
+_RATE_LIMIT_FRAME = 'data: {"rate_limit": true}\n\n'
+_DONE_FRAME = "data: [DONE]\n\n"
+
+
+def encode_sse(event: StreamEvent) -> str:
+    """Serialize a stream event into the SSE frame the frontend expects."""
+    if event.kind == "delta":
+        return f"data: {json.dumps({'choices': [{'delta': {'content': event.data}}]})}\n\n"
+    if event.kind == "start":
+        return _START_FRAME
+    if event.kind == "sources":
+        return f"data: {json.dumps({'sources': event.data})}\n\n"
+    if event.kind == "error":
+        return f"data: {json.dumps({'error': event.data})}\n\n"
+    if event.kind == "rate_limit":
+        return _RATE_LIMIT_FRAME
+    raise ValueError(f"Unknown stream event '{event.kind}'")
+
+
 async def persist_streaming_response(
-    generator: AsyncGenerator[str, None],
+    events: AsyncGenerator[StreamEvent, None],
     conversation_id: str,
 ) -> AsyncGenerator[str, None]:
-    ai_response = ""
+    """
+    Encode events to SSE and collect the answer on the side. The reply is
+    handed to the batched message writer, so the stream never waits on a
+    database round-trip.
+    """
+    parts: list[str] = []
     pending_sources: list[dict] | None = None
 
     try:
-        async for chunk in generator:
-            if chunk.startswith("data: "):
-                data = chunk[6:].strip()
-                if data and data != "[DONE]":
-                    try:
-                        parsed = json.loads(data)
-                        if isinstance(parsed.get("sources"), list):
-                            pending_sources = parsed["sources"]
-                        delta = parsed.get("choices", [{}])[0].get("delta", {}).get("content")
-                        if isinstance(delta, str):
-                            ai_response += delta
-                    except json.JSONDecodeError:
-                        pass
-            yield chunk
+        async for event in events:
+            if event.kind == "delta":
+                parts.append(event.data)
+            elif event.kind == "sources":
+                pending_sources = event.data
+            yield encode_sse(event)
+        yield _DONE_FRAME
     finally:
+        ai_response = "".join(parts)
         if ai_response.strip():
-            async with AsyncSessionLocal() as session:
-                await store_conversation_message(
-                    db=session,
-                    conversation_id=conversation_id,
-                    role="ai",
-                    content=ai_response,
-                    sources=pending_sources,
-                )
+            message_writer.submit(conversation_id, "ai", ai_response, pending_sources)
 
 
 @router.post("/")
@@ -92,12 +115,14 @@ async def chat_with_doc(
             detail=f"Question too long. Maximum {MAX_QUESTION_LENGTH} characters.",
         )
 
+    turns: list[Turn] = []
     if conversation_id:
         conversation = await get_conversation_or_404(db, conversation_id, user)
         if conversation.scope != scope:
             raise HTTPException(status_code=400, detail="Conversation scope mismatch")
         if conversation.doc_id != doc_id:
             raise HTTPException(status_code=400, detail="Conversation document mismatch")
+        turns = await load_recent_turns(db, conversation.id, settings.CHAT_HISTORY_TURNS)
     else:
         await validate_conversation_scope(db=db, user=user, scope=scope, doc_id=doc_id)
         conversation = await create_conversation_record(
@@ -116,6 +141,12 @@ async def chat_with_doc(
         content=question,
     )
 
+    # Follow-ups without new content terms reuse the previous turn's context;
+    # others retrieve with a condensed query
+    reuse_context = can_reuse_context(question, turns)
+    retrieval_query = condense_query(question, turns)
+    history = build_history(turns, settings.CHAT_HISTORY_MAX_TOKENS)
+
     using_fallback = False
     final_key = api_key
     if not final_key:
@@ -156,7 +187,9 @@ async def chat_with_doc(
         doc_id_to_filename = {d.doc_id: d.filename for d in user_docs}
         doc_ids = list(doc_id_to_filename.keys())
 
-        matches = await get_workspace_context_chunks(doc_ids, question)
+        matches = recent_context.get(conversation.id, doc_ids) if reuse_context else None
+        if matches is None:
+            matches = await get_workspace_context_chunks(doc_ids, retrieval_query, user_email=user)
 
         if not matches or not has_sufficient_context(matches):
             return StreamingResponse(
@@ -168,10 +201,12 @@ async def chat_with_doc(
                 headers=headers,
             )
 
-        chunks = [m["text"] for m in matches]
+        recent_context.put(conversation.id, doc_ids, matches)
+        packed = pack_context(matches, model, settings.CONTEXT_MAX_TOKENS)
+        chunks = [p["text"] for p in packed]
 
         seen: dict[str, dict] = {}
-        for match in matches:
+        for match in packed:
             match_doc_id = match["doc_id"]
             if match_doc_id not in seen or match["score"] > seen[match_doc_id]["score"]:
                 seen[match_doc_id] = {
@@ -183,7 +218,7 @@ async def chat_with_doc(
 
         return StreamingResponse(
             persist_streaming_response(
-                query_llm(question, chunks, final_key, model, sources=sources),
+                query_llm(question, chunks, final_key, model, sources=sources, history=history),
                 conversation.id,
             ),
             media_type="text/event-stream",
@@ -193,7 +228,11 @@ async def chat_with_doc(
     if not doc_id:
         raise HTTPException(status_code=400, detail="doc_id required for document scope")
 
-    matches = await get_context_chunks(doc_id, question, top_k=4)
+    matches = recent_context.get(conversation.id, [doc_id]) if reuse_context else None
+    if matches is None:
+        matches = await get_context_chunks(
+            doc_id, retrieval_query, top_k=settings.CONTEXT_CANDIDATES, user_email=user
+        )
 
     if not matches or not isinstance(matches, list):
         raise HTTPException(status_code=404, detail="No relevant context found")
@@ -208,11 +247,12 @@ async def chat_with_doc(
             headers=headers,
         )
 
-    chunks = [match["text"] for match in matches]
+    recent_context.put(conversation.id, [doc_id], matches)
+    chunks = [p["text"] for p in pack_context(matches, model, settings.CONTEXT_MAX_TOKENS)]
 
     return StreamingResponse(
         persist_streaming_response(
-            query_llm(question, chunks, final_key, model),
+            query_llm(question, chunks, final_key, model, history=history),
             conversation.id,
         ),
         media_type="text/event-stream",
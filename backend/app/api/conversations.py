@@ -1,9 +1,11 @@
+import base64
 import json
 import uuid
+from datetime import datetime
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
-from sqlalchemy import delete, func
+from sqlalchemy import and_, delete, func, or_, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
@@ -12,10 +14,13 @@ from app.db.session import get_db
 from app.models.conversation import Conversation
 from app.models.conversation_message import ConversationMessage
 from app.models.document import Document
+from app.services.message_writer import PendingMessage, record_messages
 
 router = APIRouter()
 
 VALID_SCOPES = {"document", "workspace"}
+LIST_VIEWS = {"full", "light"}
+MAX_PAGE_SIZE = 200
 
 
 class ConversationCreateRequest(BaseModel):
@@ -81,23 +86,12 @@ async def get_conversation_or_404(
     return conversation
 
 
-async def serialize_conversation_summary(
-    db: AsyncSession,
-    conversation: Conversation,
-) -> dict:
-    document = None
-    if conversation.doc_id:
-        result = await db.execute(
-            select(Document).where(Document.doc_id == conversation.doc_id)
-        )
-        document = result.scalar_one_or_none()
+def _summary_select():
+    """One-query summary: conversation row plus document filename via join."""
+    return select(Conversation, Document.filename).outerjoin(Document, Document.doc_id == Conversation.doc_id)
 
-    count_result = await db.execute(
-        select(func.count())
-        .select_from(ConversationMessage)
-        .where(ConversationMessage.conversation_id == conversation.id)
-    )
 
+def _summary_row(conversation: Conversation, filename: str | None) -> dict:
     return {
         "id": conversation.id,
         "title": conversation.title,
@@ -105,12 +99,37 @@ async def serialize_conversation_summary(
         "doc_id": conversation.doc_id,
         "created_at": conversation.created_at,
         "updated_at": conversation.updated_at,
-        "document_filename": document.filename if document else None,
-        "document_deleted": bool(conversation.doc_id and document is None),
-        "message_count": count_result.scalar() or 0,
+        "document_filename": filename,
+        "document_deleted": bool(conversation.doc_id and filename is None),
+        "message_count": conversation.message_count or 0,
+        "last_message_at": conversation.last_message_at,
+        "last_message_preview": conversation.last_message_preview,
     }
 
 
+async def serialize_conversation_summary(
+    db: AsyncSession,
+    conversation: Conversation,
+) -> dict:
+    result = await db.execute(_summary_select().where(Conversation.id == conversation.id))
+    row = result.one()
+    return _summary_row(*row)
+
+
+def encode_cursor(updated_at: datetime, conversation_id: str) -> str:
+    raw = json.dumps([updated_at.isoformat(), conversation_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, conversation_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), str(conversation_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 async def create_conversation_record(
     *,
     db: AsyncSession,
@@ -139,36 +158,56 @@ async def store_conversation_message(
     role: str,
     content: str,
     sources: list[dict] | None = None,
-) -> ConversationMessage:
-    message = ConversationMessage(
-        conversation_id=conversation_id,
-        role=role,
-        content=content,
-        sources_json=json.dumps(sources) if sources else None,
-    )
-    db.add(message)
-
-    conversation = await db.get(Conversation, conversation_id)
-    if conversation:
-        conversation.updated_at = func.now()
-
+) -> None:
+    await record_messages(db, [PendingMessage(conversation_id, role, content, sources)])
     await db.commit()
-    await db.refresh(message)
-    return message
 
 
 @router.get("/")
 async def list_conversations(
+    response: Response,
+    cursor: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    view: str = Query("full"),
     user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(
-        select(Conversation)
-        .where(Conversation.user_email == user)
-        .order_by(Conversation.updated_at.desc(), Conversation.created_at.desc())
+    """
+    Newest first, keyset-paginated on (updated_at, id). Without limit the
+    whole list is returned; otherwise X-Next-Cursor carries the cursor for
+    the following page. view=light skips the document join and message count.
+    """
+    if view not in LIST_VIEWS:
+        raise HTTPException(status_code=400, detail="Invalid view")
+
+    if view == "light":
+        query = select(
+            Conversation.id,
+            Conversation.title,
+            Conversation.scope,
+            Conversation.doc_id,
+            Conversation.updated_at,
+        )
+    else:
+        query = _summary_select()
+    query = query.where(Conversation.user_email == user).order_by(
+        Conversation.updated_at.desc(), Conversation.id.desc()
     )
-    conversations = result.scalars().all()
-    return [await serialize_conversation_summary(db, conversation) for conversation in conversations]
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        query = query.where(tuple_(Conversation.updated_at, Conversation.id) < tuple_(updated_at, conversation_id))
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1] if view == "light" else rows[-1][0]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.updated_at, last.id)
+
+    if view == "light":
+        return [dict(row._mapping) for row in rows]
+    return [_summary_row(*row) for row in rows]
 
 
 @router.post("/")
@@ -191,30 +230,86 @@ async def create_conversation(
     return await serialize_conversation_summary(db, conversation)
 
 
+def serialize_message(message: ConversationMessage) -> dict:
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "sources": json.loads(message.sources_json) if message.sources_json else [],
+        "created_at": message.created_at,
+    }
+
+
 @router.get("/{conversation_id}")
 async def get_conversation(
     conversation_id: str,
+    before_id: int | None = Query(None),
+    after_id: int | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
     user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    conversation = await get_conversation_or_404(db, conversation_id, user)
-    messages_result = await db.execute(
-        select(ConversationMessage)
-        .where(ConversationMessage.conversation_id == conversation.id)
-        .order_by(ConversationMessage.created_at.asc(), ConversationMessage.id.asc())
-    )
-    messages = messages_result.scalars().all()
-    summary = await serialize_conversation_summary(db, conversation)
-    summary["messages"] = [
-        {
-            "id": message.id,
-            "role": message.role,
-            "content": message.content,
-            "sources": json.loads(message.sources_json) if message.sources_json else [],
-            "created_at": message.created_at,
-        }
-        for message in messages
-    ]
+    """
+    Conversation summary plus messages in chronological order.
+
+    - after_id: only messages newer than a message the client already has
+      (incremental refresh after reopening a chat).
+    - before_id: messages older than the oldest one the client holds.
+    - limit: page size; without after_id the most recent page is returned.
+    has_more tells whether further messages exist in the paging direction.
+    Without any parameter the full history is returned.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id")
+
+    row = (await db.execute(
+        _summary_select().where(Conversation.id == conversation_id, Conversation.user_email == user)
+    )).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    summary = _summary_row(*row)
+
+    query = select(ConversationMessage).where(ConversationMessage.conversation_id == conversation_id)
+    anchor_id = before_id if before_id is not None else after_id
+    if anchor_id is not None:
+        anchor_created_at = (
+            select(ConversationMessage.created_at)
+            .where(ConversationMessage.id == anchor_id, ConversationMessage.conversation_id == conversation_id)
+            .scalar_subquery()
+        )
+        if before_id is not None:
+            query = query.where(
+                or_(
+                    ConversationMessage.created_at < anchor_created_at,
+                    and_(ConversationMessage.created_at == anchor_created_at, ConversationMessage.id < anchor_id),
+                )
+            )
+        else:
+            query = query.where(
+                or_(
+                    ConversationMessage.created_at > anchor_created_at,
+                    and_(ConversationMessage.created_at == anchor_created_at, ConversationMessage.id > anchor_id),
+                )
+            )
+
+    # Newest-first when paging backwards so LIMIT keeps the most recent rows
+    newest_first = limit is not None and after_id is None
+    if newest_first:
+        query = query.order_by(ConversationMessage.created_at.desc(), ConversationMessage.id.desc())
+    else:
+        query = query.order_by(ConversationMessage.created_at.asc(), ConversationMessage.id.asc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    messages = list((await db.execute(query)).scalars().all())
+    has_more = limit is not None and len(messages) > limit
+    if has_more:
+        messages = messages[:limit]
+    if newest_first:
+        messages.reverse()
+
+    summary["messages"] = [serialize_message(message) for message in messages]
+    summary["has_more"] = has_more
     return summary
 
 
@@ -4,8 +4,8 @@ from sqlalchemy.future import select
 from app.db.session import get_db
 from app.core.security import get_current_user
 from app.models.document import Document
-from app.services.vector_store import qdrant_client, COLLECTION_NAME
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from app.services.cache_invalidation import notify_doc_changed
+from app.services.rag import delete_document_vectors
 
 router = APIRouter()
 
@@ -43,16 +43,12 @@ async def delete_document(
         raise HTTPException(status_code=404, detail="Document not found")
 
     await db.delete(doc)
+    await notify_doc_changed(db, doc_id)
     await db.commit()
 
-    # Delete all vectors for this document from Qdrant
+    # Delete all vectors for this document from Qdrant (also drops cached retrievals and its lexical index rows)
     try:
-        await qdrant_client.delete(
-            collection_name=COLLECTION_NAME,
-            points_selector=Filter(
-                must=[FieldCondition(key="source", match=MatchValue(value=doc_id))]
-            ),
-        )
+        await delete_document_vectors(doc_id, user)
     except Exception:
         # Log but don't fail the request — Postgres record is already deleted
         import logging
@@ -1,14 +1,48 @@
-from fastapi import APIRouter
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.params import Depends
 from app.core.security import get_current_user
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.document import Document
 from app.db.session import get_db
 from sqlalchemy.future import select
-from app.services.rag import _processing_errors
+from app.services.ingestion_queue import get_job_error, get_job_errors
 
 router = APIRouter()
 
+MAX_STATUS_IDS = 500  # one bulk upload's worth
+
+
+@router.get("/")
+async def get_statuses(
+    doc_ids: List[str] = Query(...),
+    user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Status of many documents at once (e.g. the doc_ids of a bulk upload), plus totals per status."""
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if len(doc_ids) > MAX_STATUS_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_IDS} doc_ids per request")
+    result = await db.execute(
+        select(Document.doc_id, Document.status)
+        .where(Document.doc_id.in_(doc_ids), Document.user_email == user)
+    )
+    found = dict(result.all())
+    failed = [doc_id for doc_id, status in found.items() if status == "failed"]
+    errors = await get_job_errors(db, failed)
+
+    statuses: dict = {}
+    counts: dict[str, int] = {}
+    for doc_id in doc_ids:
+        status = found.get(doc_id, "not_found")
+        entry: dict = {"status": status}
+        if doc_id in errors:
+            entry["error_detail"] = errors[doc_id]
+        statuses[doc_id] = entry
+        counts[status] = counts.get(status, 0) + 1
+    return {"documents": statuses, "counts": counts}
+
+
 @router.get("/{doc_id}")
 async def get_status(
     doc_id: str,
@@ -22,7 +56,7 @@ async def get_status(
     status = doc.status if doc else "not_found"
     response: dict = {"status": status}
     if status == "failed":
-        error = _processing_errors.get(doc_id)
+        error = await get_job_error(db, doc_id)
         if error:
             response["error_detail"] = error
     return response
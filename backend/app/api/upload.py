@@ -1,13 +1,19 @@
-from fastapi import APIRouter, File, UploadFile, BackgroundTasks, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
+import asyncio
+import logging
 import os
 import tempfile
 import aiofiles
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from app.utils.parser import parse_pdf, parse_markdown, parse_text, parse_html
-from app.services.rag import embed_and_store
-from app.utils.compression import compress_text
+from app.utils.archives import ArchiveError, ArchiveLimitError, extract_archive, is_archive
+from app.utils.parser import SUPPORTED_EXTENSIONS
+from app.utils.parse_pool import ParseTimeoutError, parse_pool
+from app.utils.upload_stream import StreamedUpload, UploadStreamError, UploadTooLarge
+from app.services.ingestion_queue import PAYLOAD_PDF, PAYLOAD_TEXT, build_job, has_active_job, job_priority, notify_workers
 from app.models.document import Document
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.core.security import get_current_user
 from app.db.session import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -18,103 +24,420 @@ from app.models.user import SubscriptionLevel
 import uuid
 import time
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
 CHUNK_SIZE = 1024 * 1024  # 1MB read chunks
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB max upload size
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers around the file in the request body
 
+# Upload endpoints read the body themselves (see _read_upload, StreamedUpload.files); describe it for the docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
 
-@router.post("/")
+BULK_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            }
+        },
+    }
+}
+
+
+async def _payload_from_path(path: str, filename: str) -> tuple[bytes, str]:
+    """Turn a saved upload into an ingestion job payload and its format."""
+    if filename.lower().endswith(".pdf"):
+        # PDFs are extracted page-parallel by the ingestion worker, which
+        # streams pages into chunking/embedding as they come off the pool
+        async with aiofiles.open(path, "rb") as f:
+            return await f.read(), PAYLOAD_PDF
+
+    # Parsing (and gzipping) runs in the process pool, off the event loop
+    try:
+        with metrics.timer("parse.wall"):
+            payload = await parse_pool.parse(path, filename)
+    except ParseTimeoutError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return payload, PAYLOAD_TEXT
+
+
+async def _save_stream(upload: StreamedUpload, path: str, max_size: int) -> bool:
+    """Copy the current file of a streamed upload to path; False (rest skipped) once it exceeds max_size."""
+    async with aiofiles.open(path, "wb") as out:
+        try:
+            async for chunk in upload.chunks(max_size):
+                await out.write(chunk)
+        except UploadTooLarge:
+            return False
+    return True
+
+
+async def _read_upload(request: Request) -> tuple[str, bytes, str]:
+    """
+    Read the "file" field straight off the request stream and turn it into
+    (filename, ingestion job payload, payload format). Text formats are
+    parsed and gzipped as the bytes arrive (ParsePool.stream); PDFs are kept
+    as raw bytes for the worker, which extracts them page-parallel. Nothing
+    is written to disk, the type is checked before any file bytes are read,
+    and an oversized upload is rejected as soon as it crosses MAX_FILE_SIZE.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail="File too large. Maximum size is 10MB.")
+
+    upload = StreamedUpload(request, "file", MAX_FILE_SIZE)
+    try:
+        filename = await upload.open()
+        if not filename:
+            raise HTTPException(status_code=400, detail="File is missing or invalid")
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise HTTPException(status_code=415, detail="Unsupported file type. Allowed: PDF, MD, TXT, HTML")
+
+        if filename.lower().endswith(".pdf"):
+            data = bytearray()
+            async for block in upload.chunks():
+                data += block
+            return filename, bytes(data), PAYLOAD_PDF
+
+        # Extraction and gzip run off the event loop, a CHUNK_SIZE of input at a time,
+        # under the parse pool's concurrency limit and timeout
+        parse = parse_pool.stream(filename)
+        pending = bytearray()
+        async for block in upload.chunks():
+            pending += block
+            if len(pending) >= CHUNK_SIZE:
+                await parse.feed(bytes(pending))
+                pending.clear()
+        await parse.feed(bytes(pending), final=True)
+        metrics.observe("parse.cpu", parse.cpu)
+        return filename, parse.finish(), PAYLOAD_TEXT
+    except ParseTimeoutError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large. Maximum size is 10MB.")
+    except UploadStreamError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _upload_limit(db: AsyncSession, user: str) -> tuple[User, float, int]:
+    """
+    Lock the user's row and return it with their plan's document limit and
+    current document count. Holding the lock until commit serialises
+    concurrent uploads, so the count can't go stale before the insert.
+    """
+    user_result = await db.execute(select(User).where(User.email == user).with_for_update())
+    user_obj = user_result.scalar_one_or_none()
+    if not user_obj:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Determine upload limit by plan
+    upload_limit = 3 if user_obj.subscription == SubscriptionLevel.free else float("inf")
+
+    # Count user uploads
+    doc_count_result = await db.execute(
+        select(func.count()).select_from(Document).where(Document.user_email == user)
+    )
+    return user_obj, upload_limit, doc_count_result.scalar()
+
+
+@router.post("/", openapi_extra=UPLOAD_REQUEST_BODY)
 @limiter.limit("5/minute")
 async def upload_file(
     request: Request,
-    file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None,
     user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    if not file or not file.filename:
-        raise HTTPException(status_code=400, detail="File is missing or invalid")
-
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized user")
 
-    filename = file.filename.lower()
-    temp_file_path = tempfile.mktemp(suffix=filename)
+    start_time = time.time()
+    filename, payload, payload_format = await _read_upload(request)
+
+    doc_id = str(uuid.uuid4())
+
+    user_obj, upload_limit, upload_count = await _upload_limit(db, user)
+    if upload_count >= upload_limit:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Upload limit reached. Plan: {user_obj.subscription}, Limit: {upload_limit}",
+        )
+
+    # Store document record and its ingestion job atomically
+    document = Document(
+        doc_id=doc_id,
+        filename=filename,
+        user_email=user,
+        status="processing",
+    )
+    db.add(document)
+    db.add(
+        build_job(
+            doc_id=doc_id,
+            user_email=user,
+            payload=payload,
+            payload_format=payload_format,
+            priority=job_priority(user_obj.subscription),
+        )
+    )
+    await db.commit()
+    notify_workers()
+
+    elapsed = round(time.time() - start_time, 2)
+    return {
+        "filename": filename,
+        "doc_id": doc_id,
+        "status": "Processing embeddings in background",
+        "upload_time_sec": elapsed,
+    }
+
+
+@router.put("/{doc_id}", openapi_extra=UPLOAD_REQUEST_BODY)
+@limiter.limit("5/minute")
+async def replace_file(
+    request: Request,
+    doc_id: str,
+    user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Replace a document's content, keeping its doc_id (and the conversations
+    scoped to it). Re-ingestion is incremental: only chunks whose content
+    changed are embedded, chunks that disappeared are deleted from Qdrant.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized user")
 
     start_time = time.time()
+    filename, payload, payload_format = await _read_upload(request)
+
+    # Lock the row so two replaces of the same document can't both enqueue
+    result = await db.execute(
+        select(Document)
+        .where(Document.doc_id == doc_id, Document.user_email == user)
+        .with_for_update()
+    )
+    document = result.scalar_one_or_none()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if await has_active_job(db, doc_id):
+        raise HTTPException(status_code=409, detail="Document is still being processed")
+
+    user_result = await db.execute(select(User.subscription).where(User.email == user))
+    subscription = user_result.scalar_one_or_none()
+
+    document.filename = filename
+    document.status = "processing"
+    db.add(
+        build_job(
+            doc_id=doc_id,
+            user_email=user,
+            payload=payload,
+            payload_format=payload_format,
+            priority=job_priority(subscription),
+        )
+    )
+    await db.commit()
+    notify_workers()
+
+    elapsed = round(time.time() - start_time, 2)
+    return {
+        "filename": filename,
+        "doc_id": doc_id,
+        "status": "Processing embeddings in background",
+        "upload_time_sec": elapsed,
+    }
+
 
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+
+def _bulk_overhead() -> int:
+    """Multipart framing a bulk request may add on top of BULK_UPLOAD_MAX_BYTES of files."""
+    return MULTIPART_OVERHEAD + settings.BULK_UPLOAD_MAX_FILES * 1024
+
+
+async def _collect_bulk_files(upload: StreamedUpload, workdir: str) -> tuple[list[tuple[str, str]], list[dict]]:
+    """
+    Save the streamed files into workdir, expanding archives. Returns (display
+    name, path) of each accepted file and {filename, error} of each rejected
+    one. Limits on the whole request (file count, total bytes) reject it
+    outright, as soon as they are crossed.
+    """
+    max_files = settings.BULK_UPLOAD_MAX_FILES
+    max_bytes = settings.BULK_UPLOAD_MAX_BYTES
+    total_error = f"Upload too large. Maximum total size is {max_bytes // (1024 * 1024)}MB."
+    accepted: list[tuple[str, str]] = []
+    rejected: list[dict] = []
+    total = 0
+    index = 0
     try:
-        async with aiofiles.open(temp_file_path, 'wb') as temp_file:
-            while chunk := await file.read(CHUNK_SIZE):
-                await temp_file.write(chunk)
-
-        # Enforce file size limit
-        if os.path.getsize(temp_file_path) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail="File too large. Maximum size is 10MB.",
-            )
+        async for filename in upload.files():
+            if not filename:
+                continue
+            index += 1
+            lowered = filename.lower()
+            path = os.path.join(workdir, f"upload-{index}")
 
-        if filename.endswith(".pdf"):
-            text = parse_pdf(temp_file_path)
-        elif filename.endswith((".md", ".txt", ".html", ".htm")):
-            async with aiofiles.open(temp_file_path, "rb") as f:
-                raw = await f.read()
-            if filename.endswith((".html", ".htm")):
-                text = parse_html(raw)
-            elif filename.endswith(".txt"):
-                text = parse_text(raw)
-            else:
-                text = parse_markdown(raw)
-        else:
-            raise HTTPException(status_code=415, detail="Unsupported file type. Allowed: PDF, MD, TXT, HTML")
+            if is_archive(lowered):
+                if not await _save_stream(upload, path, max_bytes - total):
+                    raise _too_large(total_error)
+                member_dir = os.path.join(workdir, f"archive-{index}")
+                os.mkdir(member_dir)
+                try:
+                    members = await asyncio.to_thread(
+                        extract_archive,
+                        path,
+                        lowered,
+                        member_dir,
+                        extensions=SUPPORTED_EXTENSIONS,
+                        max_member_size=MAX_FILE_SIZE,
+                        max_members=max_files - len(accepted) - len(rejected),
+                        max_total_size=max_bytes - total,
+                    )
+                except ArchiveLimitError as e:
+                    raise _too_large(str(e))
+                except ArchiveError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                finally:
+                    os.remove(path)
+                for member in members:
+                    name = f"{filename}/{member.name}"
+                    if member.path:
+                        accepted.append((name, member.path))
+                        total += os.path.getsize(member.path)
+                    else:
+                        rejected.append({"filename": name, "error": member.error})
+                continue
+
+            if len(accepted) + len(rejected) >= max_files:
+                raise _too_large(f"Too many files. Maximum is {max_files} per upload.")
+            if not lowered.endswith(SUPPORTED_EXTENSIONS):
+                # Its bytes are skipped, never stored
+                rejected.append({"filename": filename, "error": "Unsupported file type"})
+                continue
+            # Parsers dispatch on the extension
+            path += os.path.splitext(lowered)[1]
+            if not await _save_stream(upload, path, MAX_FILE_SIZE):
+                rejected.append({"filename": filename, "error": "File too large"})
+                continue
+            total += os.path.getsize(path)
+            if total > max_bytes:
+                raise _too_large(total_error)
+            accepted.append((filename, path))
+    except UploadTooLarge:
+        # The request's file bytes, skipped ones included, crossed max_bytes
+        raise _too_large(total_error)
+    except UploadStreamError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return accepted, rejected
 
-        doc_id = str(uuid.uuid4())
-        compressed_text = compress_text(text)
 
-        # Get user subscription from DB
-        user_result = await db.execute(select(User).where(User.email == user))
-        user_obj = user_result.scalar_one_or_none()
-        if not user_obj:
-            raise HTTPException(status_code=404, detail="User not found")
+async def _bulk_payload(semaphore: asyncio.Semaphore, name: str, path: str) -> tuple[bytes, str] | str:
+    """Payload and format for one file, or the reason it can't be ingested."""
+    async with semaphore:
+        try:
+            return await _payload_from_path(path, name)
+        except HTTPException as e:
+            return e.detail
+        except Exception as e:
+            logger.warning(f"[Upload] parsing {name} failed: {e}")
+            return "Could not parse file"
 
-        # Determine upload limit by plan
-        upload_limit = 3 if user_obj.subscription == SubscriptionLevel.free else float("inf")
 
-        # Count user uploads
-        doc_count_result = await db.execute(
-            select(func.count()).select_from(Document).where(Document.user_email == user)
+@router.post("/bulk", openapi_extra=BULK_UPLOAD_REQUEST_BODY)
+@limiter.limit("5/minute")
+async def upload_files(
+    request: Request,
+    user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upload many files at once: any mix of supported documents and .zip /
+    .tar.gz archives of them (a notes folder, say). Files are parsed
+    concurrently in the parse pool; every accepted file becomes a Document
+    plus an ingestion job, all inserted in one transaction after a single
+    quota check, so a batch is either queued entirely or not at all.
+    Workers then ingest the jobs in parallel. Unsupported, oversized or
+    unparseable files are reported under "rejected" without failing the rest.
+    Track progress per doc_id with GET /status/?doc_ids=...
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized user")
+
+    max_bytes = settings.BULK_UPLOAD_MAX_BYTES
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + _bulk_overhead():
+        raise _too_large(f"Upload too large. Maximum total size is {max_bytes // (1024 * 1024)}MB.")
+
+    start_time = time.time()
+    upload = StreamedUpload(request, "files", MAX_FILE_SIZE, max_total=max_bytes)
+    with tempfile.TemporaryDirectory(prefix="pka-bulk-") as workdir:
+        accepted, rejected = await _collect_bulk_files(upload, workdir)
+        semaphore = asyncio.Semaphore(settings.BULK_UPLOAD_PARSE_CONCURRENCY)
+        results = await asyncio.gather(*(_bulk_payload(semaphore, name, path) for name, path in accepted))
+
+    parsed: list[tuple[str, bytes, str]] = []
+    for (name, _), result in zip(accepted, results):
+        if isinstance(result, str):
+            rejected.append({"filename": name, "error": result})
+        else:
+            parsed.append((name, *result))
+    if not parsed:
+        raise HTTPException(status_code=400, detail={"message": "No files could be ingested", "rejected": rejected})
+
+    user_obj, upload_limit, upload_count = await _upload_limit(db, user)
+    if upload_count + len(parsed) > upload_limit:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Upload limit reached. Plan: {user_obj.subscription}, Limit: {upload_limit}, "
+            f"documents: {upload_count}, in this upload: {len(parsed)}",
         )
-        upload_count = doc_count_result.scalar()
 
-        if upload_count >= upload_limit:
-            raise HTTPException(
-                status_code=403,
-                detail=f"Upload limit reached. Plan: {user_obj.subscription}, Limit: {upload_limit}",
+    priority = job_priority(user_obj.subscription)
+    documents = []
+    for name, payload, payload_format in parsed:
+        doc_id = str(uuid.uuid4())
+        db.add(Document(doc_id=doc_id, filename=name, user_email=user, status="processing"))
+        db.add(
+            build_job(
+                doc_id=doc_id,
+                user_email=user,
+                payload=payload,
+                payload_format=payload_format,
+                priority=priority,
             )
-
-        # Store document record
-        document = Document(
-            doc_id=doc_id,
-            filename=file.filename,
-            user_email=user,
-            status="processing",
         )
-        db.add(document)
-        await db.commit()
-
-        background_tasks.add_task(embed_and_store, compressed_text, doc_id)
-
-        elapsed = round(time.time() - start_time, 2)
-        return {
-            "filename": file.filename,
-            "doc_id": doc_id,
-            "status": "Processing embeddings in background",
-            "upload_time_sec": elapsed,
-        }
-
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        documents.append({"filename": name, "doc_id": doc_id, "status": "processing"})
+    await db.commit()
+    notify_workers()
+    metrics.incr("upload.bulk_files", len(documents))
+
+    elapsed = round(time.time() - start_time, 2)
+    return {
+        "documents": documents,
+        "rejected": rejected,
+        "status": "Processing embeddings in background",
+        "upload_time_sec": elapsed,
+    }
@@ -21,6 +21,22 @@ class Settings(BaseSettings):
     QDRANT_URL: str
     QDRANT_API_KEY: str
 
+    # Qdrant collection — applied at startup, also to an existing collection (rebuilt in the background).
+    # Collection layout. The defaults are the layout collections were always created with; to save RAM,
+    # quantize ("scalar": int8, 4x smaller; "binary": 1 bit/dim, 32x, best at >=1024 dims) and move the
+    # float32 originals to disk, where they are only read to rescore
+    QDRANT_QUANTIZATION: str = "none"
+    QDRANT_VECTORS_ON_DISK: bool = False  # keep original vectors on disk (mmap) instead of RAM
+    QDRANT_ON_DISK_PAYLOAD: bool = True  # chunk text (Qdrant's default); payload indexes stay in RAM
+    # Bring an existing collection in line with the settings above at startup (segments are rebuilt in the
+    # background); otherwise differences are only logged
+    QDRANT_MIGRATE_COLLECTION: bool = False
+    QDRANT_HNSW_M: int = 16  # graph links per node; higher raises recall and memory
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100  # build-time beam width
+    QDRANT_HNSW_EF: int = 128  # search-time beam width
+    QDRANT_RESCORE: bool = True  # re-rank quantized candidates with the original vectors
+    QDRANT_OVERSAMPLING: float = 2.0  # quantized candidates fetched per result before rescoring; ~3.0 for binary
+
     # Embedding provider — works with any OpenAI-compatible API
     # Defaults: Jina AI (free 1M tokens/month, no credit card — jina.ai)
     # For OpenAI: set EMBEDDING_BASE_URL=https://api.openai.com/v1, EMBEDDING_MODEL=text-embedding-3-small, VECTOR_SIZE=1536
@@ -29,11 +45,117 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "jina-embeddings-v3"
     VECTOR_SIZE: int = 1024  # jina-embeddings-v3 default; use 1536 for OpenAI text-embedding-3-small
 
-    # Reranker — reuses EMBEDDING_API_KEY and EMBEDDING_BASE_URL (Jina provides both)
-    # Set RERANKING_ENABLED=false to disable if using a non-Jina embedding provider
+    # "openai" calls the API above; "local" runs a sentence-embedding model exported to ONNX on CPU
+    # (needs onnxruntime + tokenizers), no network. VECTOR_SIZE must match the model (384 for
+    # bge-small / all-MiniLM-L6-v2); switching models means re-ingesting into a fresh collection
+    EMBEDDING_PROVIDER: str = "openai"
+    EMBEDDING_LOCAL_MODEL_DIR: str = "/models/bge-small-en-v1.5"  # model.onnx + tokenizer.json
+    EMBEDDING_LOCAL_POOLING: str = "cls"  # "cls" for bge models, "mean" for MiniLM / e5
+    EMBEDDING_LOCAL_MAX_LENGTH: int = 512  # tokens per text
+    EMBEDDING_LOCAL_BATCH_SIZE: int = 32  # texts per inference, merged across concurrent requests
+    EMBEDDING_LOCAL_BATCH_WAIT_MS: float = 5.0  # how long a partial batch waits for more texts
+    EMBEDDING_LOCAL_WORKERS: int = 2  # batches run concurrently
+    EMBEDDING_LOCAL_THREADS: int = 2  # ONNX Runtime intra-op threads per batch
+
+    # Chunking — "structured" splits on headings/paragraphs/sentences/code fences and sizes by tokens;
+    # "fixed" is the legacy 500-char window with 50-char overlap
+    CHUNKER: str = "structured"
+    CHUNK_MAX_TOKENS: int = 256  # estimated for EMBEDDING_MODEL
+
+    # Duplicate chunks (boilerplate, running headers/footers) are collapsed before embedding
+    DEDUP_ENABLED: bool = True
+    # 1.0 collapses exact repeats only. Below 1 (e.g. 0.8, MinHash Jaccard over word 3-shingles) near-duplicates
+    # are collapsed too; they are not embedded, but their text stays searchable by BM25 and in the payload
+    DEDUP_SIMILARITY: float = 1.0
+    DEDUP_ACROSS_CORPUS: bool = False  # reuse vectors of identical chunks in the user's other documents
+
+    # Embedding cache — keyed by sha256(model, text); set a size to 0 to disable that tier
+    EMBEDDING_CACHE_MEMORY_MB: int = 64  # in-process LRU (~16k vectors at 1024 dims)
+    EMBEDDING_CACHE_DISK_MB: int = 1024  # SQLite file shared by all processes on the host
+    EMBEDDING_CACHE_PATH: str = "/tmp/pka-cache/embeddings.sqlite3"
+
+    # Embedding requests — batches are sized by estimated tokens and capped by item count
+    EMBEDDING_BATCH_MAX_TOKENS: int = 8000
+    EMBEDDING_BATCH_MAX_ITEMS: int = 96  # Jina AI per-request item limit
+    EMBEDDING_CONCURRENCY: int = 4  # max in-flight embedding requests per process
+    EMBEDDING_MAX_RETRIES: int = 5  # retries on 429/5xx/connection errors, with jittered backoff
+    # Chat query embeddings from concurrent requests are sent together as one call
+    QUERY_EMBED_BATCH_MAX_ITEMS: int = 32  # queries per call
+    QUERY_EMBED_BATCH_WAIT_MS: float = 3.0  # how long the first query waits for others; 0 disables waiting
+
+    # Document parsing runs in a process pool so pdfminer never blocks the event loop
+    PARSE_POOL_WORKERS: int = 2
+    PARSE_TIMEOUT_SECONDS: float = 60.0  # per file (per page range for PDFs); the pool is restarted on overrun
+    PDF_PAGES_PER_TASK: int = 8  # PDFs are extracted page-parallel in ranges of this size
+
+    # Bulk upload (POST /upload/bulk) — many files and/or .zip/.tar.gz archives per request
+    BULK_UPLOAD_MAX_FILES: int = 500  # counting archive members
+    BULK_UPLOAD_MAX_BYTES: int = 200 * 1024 * 1024  # total after extraction; each file is still capped at 10MB
+    BULK_UPLOAD_PARSE_CONCURRENCY: int = 8  # files handed to the parse pool at once
+
+    # Ingestion queue — jobs live in Postgres (ingestion_jobs), claimed with SKIP LOCKED
+    INGESTION_INLINE_WORKERS: int = 1  # workers inside the API process; set 0 when running worker.py separately
+    INGESTION_WORKER_CONCURRENCY: int = 2  # jobs processed concurrently per worker.py process
+    INGESTION_PER_USER_CONCURRENCY: int = 1  # max jobs of one user running at once across all workers
+    INGESTION_MAX_ATTEMPTS: int = 5
+    INGESTION_LEASE_SECONDS: int = 120  # renewed while a job runs; expired leases are reclaimed
+    INGESTION_POLL_INTERVAL_SECONDS: float = 2.0
+
+    # Retrieval cache — repeat questions over the same documents skip embedding + search
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 300
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 2000  # 0 disables the cache
+    # Invalidate when another process (worker.py, other API workers) re-indexes or deletes a document;
+    # uses Postgres LISTEN/NOTIFY and one extra connection per API process
+    RETRIEVAL_CACHE_LISTEN: bool = True
+
+    # Lexical search — per-user BM25 (SQLite FTS5) index of chunk text, fused with vector hits by
+    # reciprocal rank fusion. Local to the host like the embedding cache: API and ingestion workers
+    # must share LEXICAL_INDEX_DIR (same host or shared volume)
+    LEXICAL_SEARCH_ENABLED: bool = True
+    LEXICAL_INDEX_DIR: str = "/tmp/pka-cache/lexical"
+    LEXICAL_CANDIDATES: int = 20  # BM25 hits fused per query
+    RRF_K: int = 60  # reciprocal rank fusion constant; larger flattens the rank weighting
+
+    # Reranker — "jina" reuses EMBEDDING_API_KEY and EMBEDDING_BASE_URL (Jina provides both);
+    # "local" runs a cross-encoder exported to ONNX on CPU (needs onnxruntime + tokenizers), no network
+    # Set RERANKING_ENABLED=false to disable if using a non-Jina embedding provider without a local model
     RERANKING_ENABLED: bool = True
+    RERANKER_BACKEND: str = "jina"
     RERANKER_MODEL: str = "jina-reranker-v2-base-multilingual"
     RERANKER_MIN_SCORE: float = 0.1  # cross-encoder scores differ from cosine; 0.1 filters truly irrelevant
+    RERANKER_CACHE_MAX_ENTRIES: int = 20000  # (query, chunk) scores kept in process; 0 disables
+    RERANKER_LOCAL_MODEL_DIR: str = "/models/ms-marco-MiniLM-L-6-v2"  # model.onnx + tokenizer.json
+    RERANKER_LOCAL_MAX_LENGTH: int = 512  # tokens per (query, chunk) pair
+    RERANKER_LOCAL_BATCH_SIZE: int = 16
+    RERANKER_LOCAL_WORKERS: int = 2  # queries scored concurrently
+    RERANKER_LOCAL_THREADS: int = 2  # ONNX Runtime intra-op threads per query
+
+    # Outbound HTTP — one pooled HTTP/2 keep-alive client per upstream for the app's lifetime
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+    OPENROUTER_MAX_CONNECTIONS: int = 50
+    OPENROUTER_READ_TIMEOUT: float = 120.0  # max gap between streamed chunks
+    RERANKER_MAX_CONNECTIONS: int = 20
+    RERANKER_TIMEOUT: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+
+    # Chat streaming — deltas are merged into one SSE frame per time window or size cap
+    SSE_COALESCE_MS: int = 30  # 0 forwards every delta as its own frame
+    SSE_COALESCE_BYTES: int = 256
+
+    # Assistant replies are persisted off the stream path by a batched writer
+    MESSAGE_WRITER_MAX_BATCH: int = 100
+    MESSAGE_WRITER_FLUSH_MS: int = 50  # max delay before a finished answer is visible in history
+
+    # Prompt context — retrieved chunks are packed by estimated tokens, not by count
+    CONTEXT_MAX_TOKENS: int = 3000
+    CONTEXT_CANDIDATES: int = 12  # chunks retrieved per document-scope question for the packer to choose from
+
+    # Conversation memory — prior turns sent to the LLM and context reused for follow-ups
+    CHAT_HISTORY_TURNS: int = 6  # messages loaded per turn (user + assistant)
+    CHAT_HISTORY_MAX_TOKENS: int = 1500
+    CHAT_CONTEXT_REUSE_TTL_SECONDS: int = 600
+    CHAT_CONTEXT_REUSE_MAX_CONVERSATIONS: int = 1000  # 0 disables reuse
 
     # Cookie settings (use secure=True + samesite=None in production)
     COOKIE_SECURE: bool = False
@@ -0,0 +1,48 @@
+# app/core/metrics.py
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Minimal in-process counter/timer registry.
+    Values are per-process and reset on restart; exposed via GET /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._timings: dict[str, dict[str, float]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            t = self._timings.setdefault(name, {"count": 0, "total_sec": 0.0, "max_sec": 0.0})
+            t["count"] += 1
+            t["total_sec"] += seconds
+            t["max_sec"] = max(t["max_sec"], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {**t, "avg_sec": t["total_sec"] / t["count"] if t["count"] else 0.0}
+                    for name, t in self._timings.items()
+                },
+            }
+
+
+metrics = Metrics()
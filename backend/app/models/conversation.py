@@ -1,10 +1,14 @@
-from sqlalchemy import Column, DateTime, ForeignKey, String, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, func
 
 from app.db.base import Base
 
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Sidebar listing: WHERE user_email = ? ORDER BY updated_at DESC, id DESC
+        Index("ix_conversations_user_updated_id", "user_email", "updated_at", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     user_email = Column(String, ForeignKey("users.email"), nullable=False, index=True)
@@ -18,3 +22,7 @@ class Conversation(Base):
         onupdate=func.now(),
         nullable=False,
     )
+    # Denormalized from conversation_messages; maintained by record_messages()
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_preview = Column(String, nullable=True)
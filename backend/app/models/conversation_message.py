@@ -1,17 +1,20 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, func
 
 from app.db.base import Base
 
 
 class ConversationMessage(Base):
     __tablename__ = "conversation_messages"
+    __table_args__ = (
+        # History paging: WHERE conversation_id = ? ORDER BY created_at, id
+        Index("ix_conversation_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(
         String,
         ForeignKey("conversations.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     role = Column(String, nullable=False)
     content = Column(Text, nullable=False)
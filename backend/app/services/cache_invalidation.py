@@ -0,0 +1,96 @@
+# app/services/cache_invalidation.py
+"""
+Cross-process invalidation of the in-process retrieval caches
+(retrieval_cache and recent_context). Whoever changes a document's chunks —
+an ingestion worker finishing a job, the API deleting a document — calls
+notify_doc_changed() in the same transaction; Postgres delivers the doc_id
+to every API process listening on the channel once that transaction
+commits, and each drops its cached retrievals for the document.
+"""
+import asyncio
+import logging
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.conversation_memory import recent_context
+from app.services.retrieval_cache import retrieval_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "pka_doc_changed"
+
+
+async def notify_doc_changed(session: AsyncSession, doc_id: str) -> None:
+    """Announce that doc_id's chunks changed; sent when the caller's transaction commits."""
+    await session.execute(select(func.pg_notify(CHANNEL, doc_id)))
+
+
+def _invalidate(doc_id: str) -> None:
+    retrieval_cache.invalidate_doc(doc_id)
+    recent_context.invalidate_doc(doc_id)
+
+
+class InvalidationListener:
+    """
+    Holds one dedicated asyncpg connection LISTENing on CHANNEL, reconnecting
+    after reconnect_seconds when it drops. Notifications sent while it was
+    disconnected are lost, so every reconnect clears both caches.
+    Started in main.lifespan.
+    """
+
+    def __init__(self, database_url: str, reconnect_seconds: float = 5.0):
+        # asyncpg takes a plain postgresql:// DSN, not SQLAlchemy's postgresql+asyncpg://
+        self._dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._reconnect_seconds = reconnect_seconds
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    @staticmethod
+    def _on_notify(connection, pid: int, channel: str, doc_id: str) -> None:
+        _invalidate(doc_id)
+        metrics.incr("cache_invalidation.received")
+
+    async def _run(self) -> None:
+        connected_before = False
+        while True:
+            lost = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(self._dsn)
+            except Exception as e:
+                logger.warning(f"[CacheInvalidation] could not connect, retrying in {self._reconnect_seconds:g}s: {e}")
+                await asyncio.sleep(self._reconnect_seconds)
+                continue
+            try:
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                if connected_before:
+                    # Changes made while disconnected were never announced to us
+                    retrieval_cache.clear()
+                    recent_context.clear()
+                connected_before = True
+                await lost.wait()
+                logger.warning("[CacheInvalidation] connection lost, reconnecting")
+            except Exception as e:
+                logger.warning(f"[CacheInvalidation] listener failed: {e}")
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self._reconnect_seconds)
+
+
+invalidation_listener = InvalidationListener(settings.DATABASE_URL)
@@ -0,0 +1,92 @@
+# app/services/context_packer.py
+from typing import Any, List
+
+from app.utils.tokens import estimate_tokens
+
+MAX_OVERLAP_CHARS = 400  # longest chunk overlap looked for when stitching neighbours
+MIN_OVERLAP_CHARS = 8  # shorter suffix/prefix matches are coincidence, not chunk overlap
+SEPARATOR = "\n\n---\n\n"  # how query_llm joins context pieces
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_group(matches: List[dict[str, Any]]) -> List[dict[str, Any]]:
+    """Stitch consecutive chunks of one document into single passages."""
+    merged: List[dict[str, Any]] = []
+    for match in sorted(matches, key=lambda m: m["chunk"]):
+        last = merged[-1] if merged else None
+        if last is not None and match["chunk"] == last["chunk_end"] + 1:
+            text = match["text"]
+            cut = _overlap(last["text"], text)
+            # Structured chunks don't overlap and are trimmed: restore a paragraph break
+            last["text"] += text[cut:] if cut else f"\n\n{text}"
+            last["chunk_end"] = match["chunk"]
+            last["score"] = max(last["score"], match["score"])
+        else:
+            merged.append({
+                "text": match["text"],
+                "score": match["score"],
+                "doc_id": match.get("doc_id"),
+                "chunk": match["chunk"],
+                "chunk_end": match["chunk"],
+            })
+    return merged
+
+
+def pack_context(matches: List[dict[str, Any]], model: str, max_tokens: int) -> List[dict[str, Any]]:
+    """
+    Choose context for the prompt by size instead of by count.
+
+    Candidates are taken greedily by score while their estimated tokens (for
+    model's tokenizer) fit max_tokens; a chunk that doesn't fit is skipped so
+    smaller, lower-ranked ones can still use the remaining budget. Exact
+    duplicates are dropped, consecutive chunks of the same document are
+    merged with their shared overlap removed, and passages are returned best
+    score first. Each passage has text, score, doc_id, chunk and chunk_end.
+    """
+    selected: List[dict[str, Any]] = []
+    seen_texts: set[str] = set()
+    used = 0
+    separator_tokens = estimate_tokens(SEPARATOR, model)
+    for match in sorted(matches, key=lambda m: m.get("score", 0.0), reverse=True):
+        text = match.get("text") or ""
+        key = " ".join(text.split())
+        if not key or key in seen_texts:
+            continue
+        cost = estimate_tokens(text, model) + separator_tokens
+        if used + cost > max_tokens:
+            continue
+        seen_texts.add(key)
+        selected.append(match)
+        used += cost
+
+    if not selected and matches:
+        # Even the best chunk is over budget: send a truncated copy rather than nothing
+        best = max(matches, key=lambda m: m.get("score", 0.0))
+        chars = int(max_tokens * len(best["text"]) / estimate_tokens(best["text"], model))
+        selected.append({**best, "text": best["text"][:chars]})
+
+    groups: dict[Any, List[dict[str, Any]]] = {}
+    passages: List[dict[str, Any]] = []
+    for match in selected:
+        if isinstance(match.get("chunk"), int):
+            groups.setdefault(match.get("doc_id"), []).append(match)
+        else:
+            passages.append({
+                "text": match["text"],
+                "score": match.get("score", 0.0),
+                "doc_id": match.get("doc_id"),
+                "chunk": None,
+                "chunk_end": None,
+            })
+    for group in groups.values():
+        passages.extend(_merge_group(group))
+
+    passages.sort(key=lambda p: p["score"], reverse=True)
+    return passages
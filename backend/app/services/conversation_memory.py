@@ -0,0 +1,166 @@
+# app/services/conversation_memory.py
+"""
+Conversation memory for chat turns.
+
+- load_recent_turns: last K messages of a conversation (newest page of the
+  (conversation_id, created_at, id) index).
+- condense_query: turns a follow-up like "and the second one?" into a
+  standalone retrieval query using the previous user question. Heuristic on
+  purpose: no extra LLM round trip before retrieval.
+- recent_context: chunks retrieved for the previous turn, reused instead of
+  embedding + searching again for follow-ups that bring no new content
+  terms ("tell me more", "and the second one?"). A follow-up that names
+  something new ("what about the refund policy?") is retrieved afresh.
+- build_history: prior turns for the LLM prompt, newest first up to a token
+  budget.
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.conversation_message import ConversationMessage
+from app.utils.tokens import estimate_tokens
+
+Turn = tuple[str, str]  # (role, content)
+
+_WORD = re.compile(r"[a-z0-9']+")
+_FOLLOW_UP_OPENERS = (
+    "and ", "but ", "also ", "so ", "then ", "what about", "how about", "what else",
+    "tell me more", "elaborate", "continue", "go on",
+)
+# "this" is left out: "what does this document say about X" is standalone
+_REFERENCES = {
+    "it", "its", "that", "these", "those", "they", "them", "their",
+    "he", "she", "him", "his", "her", "one", "ones", "former", "latter", "same", "else",
+}
+# Words that carry no topic of their own: a follow-up made only of these (plus
+# _REFERENCES and words of the previous question) can reuse the previous context
+_FILLER = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "do", "does", "did", "can", "could",
+    "would", "should", "will", "may", "might", "must", "i", "me", "my", "you", "your", "we", "us", "our",
+    "what", "which", "who", "whom", "whose", "how", "why", "when", "where", "and", "but", "also", "so",
+    "then", "or", "if", "of", "in", "on", "at", "to", "for", "from", "with", "by", "as", "about", "this",
+    "there", "here", "more", "tell", "explain", "elaborate", "continue", "go", "say", "said", "mean",
+    "please", "again", "detail", "details", "further", "else", "other", "another", "first", "second",
+    "third", "last", "next", "previous", "part", "point", "one", "ones", "all", "any", "some", "each",
+    "not", "no", "yes", "ok", "okay", "thanks", "really", "just", "why's", "what's", "that's", "it's",
+}
+MAX_FOLLOW_UP_WORDS = 10
+MAX_CONDENSED_PREFIX_CHARS = 300
+
+
+async def load_recent_turns(db: AsyncSession, conversation_id: str, limit: int) -> List[Turn]:
+    if limit <= 0:
+        return []
+    result = await db.execute(
+        select(ConversationMessage.role, ConversationMessage.content)
+        .where(ConversationMessage.conversation_id == conversation_id)
+        .order_by(ConversationMessage.created_at.desc(), ConversationMessage.id.desc())
+        .limit(limit)
+    )
+    return [(role, content) for role, content in reversed(result.all())]
+
+
+def _last_user_question(turns: List[Turn]) -> Optional[str]:
+    for role, content in reversed(turns):
+        if role == "user":
+            return content
+    return None
+
+
+def is_follow_up(question: str, turns: List[Turn]) -> bool:
+    """A short question that leans on earlier turns (opener or back-reference)."""
+    if _last_user_question(turns) is None:
+        return False
+    normalized = " ".join(question.lower().split())
+    if normalized.startswith(_FOLLOW_UP_OPENERS):
+        return True
+    words = _WORD.findall(normalized)
+    return len(words) <= MAX_FOLLOW_UP_WORDS and any(word in _REFERENCES for word in words)
+
+
+def can_reuse_context(question: str, turns: List[Turn]) -> bool:
+    """A follow-up whose every content term already appeared in the previous question."""
+    if not is_follow_up(question, turns):
+        return False
+    known = _FILLER | _REFERENCES | set(_WORD.findall(_last_user_question(turns).lower()))
+    return all(word in known for word in _WORD.findall(question.lower()))
+
+
+def condense_query(question: str, turns: List[Turn]) -> str:
+    """Standalone retrieval query: previous user question + follow-up."""
+    if not is_follow_up(question, turns):
+        return question
+    previous = " ".join(_last_user_question(turns).split())[:MAX_CONDENSED_PREFIX_CHARS]
+    return f"{previous} {question}"
+
+
+def build_history(turns: List[Turn], max_tokens: int) -> List[dict[str, str]]:
+    """OpenAI-style messages for prior turns, keeping the newest that fit max_tokens."""
+    history: List[dict[str, str]] = []
+    used = 0
+    for role, content in reversed(turns):
+        cost = estimate_tokens(content)
+        if used + cost > max_tokens:
+            break
+        used += cost
+        history.append({"role": "assistant" if role == "ai" else "user", "content": content})
+    history.reverse()
+    return history
+
+
+class RecentContext:
+    """
+    Per-conversation TTL + LRU store of the last retrieved context chunks.
+    An entry is only reused for the same document set it was retrieved from,
+    and is dropped when one of those documents is deleted or re-indexed.
+    """
+
+    def __init__(self, ttl_seconds: float, max_conversations: int):
+        self._ttl = ttl_seconds
+        self._max = max_conversations
+        self._entries: "OrderedDict[str, tuple[float, tuple[str, ...], List[dict[str, Any]]]]" = OrderedDict()
+
+    def get(self, conversation_id: str, doc_ids: Iterable[str]) -> Optional[List[dict[str, Any]]]:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return None
+        expires, entry_doc_ids, matches = entry
+        if expires < time.monotonic() or entry_doc_ids != tuple(sorted(set(doc_ids))):
+            del self._entries[conversation_id]
+            return None
+        self._entries.move_to_end(conversation_id)
+        metrics.incr("conversation_memory.context_reused")
+        return [dict(match) for match in matches]
+
+    def put(self, conversation_id: str, doc_ids: Iterable[str], matches: List[dict[str, Any]]) -> None:
+        if self._max <= 0 or not matches:
+            return
+        self._entries.pop(conversation_id, None)
+        self._entries[conversation_id] = (
+            time.monotonic() + self._ttl,
+            tuple(sorted(set(doc_ids))),
+            [dict(match) for match in matches],
+        )
+        while len(self._entries) > self._max:
+            self._entries.popitem(last=False)
+
+    def invalidate_doc(self, doc_id: str) -> None:
+        stale = [cid for cid, (_, doc_ids, _) in self._entries.items() if doc_id in doc_ids]
+        for conversation_id in stale:
+            del self._entries[conversation_id]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+recent_context = RecentContext(
+    ttl_seconds=settings.CHAT_CONTEXT_REUSE_TTL_SECONDS,
+    max_conversations=settings.CHAT_CONTEXT_REUSE_MAX_CONVERSATIONS,
+)
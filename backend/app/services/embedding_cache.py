@@ -0,0 +1,237 @@
+# app/services/embedding_cache.py
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+# embedding_meta holds the total size of the vectors in one row, kept current
+# by triggers in the same transaction as every insert, update and eviction
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS embeddings ("
+    " key TEXT PRIMARY KEY,"
+    " vector BLOB NOT NULL,"
+    " size INTEGER NOT NULL,"
+    " last_used REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)",
+    "CREATE TABLE IF NOT EXISTS embedding_meta (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL)",
+    # Files written before embedding_meta existed are summed once
+    "INSERT OR IGNORE INTO embedding_meta (id, total_bytes) SELECT 0, COALESCE(SUM(size), 0) FROM embeddings",
+    "CREATE TRIGGER IF NOT EXISTS embeddings_ai AFTER INSERT ON embeddings BEGIN"
+    " UPDATE embedding_meta SET total_bytes = total_bytes + new.size WHERE id = 0; END",
+    "CREATE TRIGGER IF NOT EXISTS embeddings_ad AFTER DELETE ON embeddings BEGIN"
+    " UPDATE embedding_meta SET total_bytes = total_bytes - old.size WHERE id = 0; END",
+    "CREATE TRIGGER IF NOT EXISTS embeddings_au AFTER UPDATE OF size ON embeddings BEGIN"
+    " UPDATE embedding_meta SET total_bytes = total_bytes + new.size - old.size WHERE id = 0; END",
+)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by sha256(model, text).
+
+    Tier 1 — in-process LRU bounded by bytes (vectors held as float32 arrays).
+    Tier 2 — SQLite file on local disk bounded by bytes, evicting least
+    recently used rows. Survives restarts and is shared by every process
+    on the host (API workers and ingestion workers).
+
+    Either tier is disabled by setting its size to 0 (or the path to "").
+    """
+
+    def __init__(self, path: str, memory_max_bytes: int, disk_max_bytes: int):
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_max_bytes = memory_max_bytes
+        self._disk_max_bytes = disk_max_bytes
+        self._path = path if path and disk_max_bytes > 0 else ""
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+
+    # ---------- disk tier ----------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if not self._path:
+            return None
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self._path, check_same_thread=False, timeout=10)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                # One transaction, so no other process writes between summing and adding the triggers
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+                self._disk_bytes = self._stored_bytes(conn)
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"[EmbeddingCache] disk tier disabled, could not open {self._path}: {e}")
+                self._path = ""
+                return None
+        return self._conn
+
+    @staticmethod
+    def _stored_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT total_bytes FROM embedding_meta WHERE id = 0").fetchone()[0]
+
+    def _disk_get(self, keys: Sequence[str]) -> dict[str, array]:
+        found: dict[str, array] = {}
+        with self._disk_lock:
+            conn = self._connect()
+            if conn is None:
+                return found
+            try:
+                # Stay well under SQLite's bound-parameter limit
+                for i in range(0, len(keys), 500):
+                    part = keys[i : i + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                    ).fetchall()
+                    for key, blob in rows:
+                        vec = array("f")
+                        vec.frombytes(blob)
+                        found[key] = vec
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, k) for k in found],
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[EmbeddingCache] disk read failed: {e}")
+        return found
+
+    def _disk_put(self, items: Sequence[tuple[str, array]]) -> None:
+        with self._disk_lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                now = time.time()
+                rows = [(k, v.tobytes(), v.itemsize * len(v), now) for k, v in items]
+                # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete fires no trigger
+                conn.executemany(
+                    "INSERT INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (key) DO UPDATE SET vector = excluded.vector, size = excluded.size,"
+                    " last_used = excluded.last_used",
+                    rows,
+                )
+                # Other processes write to the same file: read their total inside this write transaction
+                self._disk_bytes = self._stored_bytes(conn)
+                if self._disk_bytes > self._disk_max_bytes:
+                    self._disk_evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[EmbeddingCache] disk write failed: {e}")
+
+    def _disk_evict(self, conn: sqlite3.Connection) -> None:
+        # Evict down to 90% so we don't pay for an eviction on every insert
+        target = int(self._disk_max_bytes * 0.9)
+        evicted = 0
+        while self._disk_bytes > target:
+            rows = conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used ASC LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            batch = []
+            for key, size in rows:
+                batch.append((key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= target:
+                    break
+            conn.executemany("DELETE FROM embeddings WHERE key = ?", batch)
+            evicted += len(batch)
+        metrics.incr("embedding_cache.disk_evictions", evicted)
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[array]:
+        vec = self._memory.get(key)
+        if vec is not None:
+            self._memory.move_to_end(key)
+        return vec
+
+    def _memory_put(self, key: str, vec: array) -> None:
+        if self._memory_max_bytes <= 0:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.itemsize * len(old)
+        self._memory[key] = vec
+        self._memory_bytes += vec.itemsize * len(vec)
+        while self._memory_bytes > self._memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.itemsize * len(evicted)
+            metrics.incr("embedding_cache.memory_evictions")
+
+    # ---------- public API ----------
+
+    async def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors aligned with texts; None marks a miss."""
+        keys = [cache_key(model, t) for t in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        disk_lookup: dict[str, list[int]] = {}
+
+        for i, key in enumerate(keys):
+            vec = self._memory_get(key)
+            if vec is not None:
+                results[i] = vec.tolist()
+                metrics.incr("embedding_cache.memory_hits")
+            else:
+                disk_lookup.setdefault(key, []).append(i)
+
+        if disk_lookup and self._path:
+            found = await asyncio.to_thread(self._disk_get, list(disk_lookup))
+            for key, vec in found.items():
+                self._memory_put(key, vec)
+                for i in disk_lookup[key]:
+                    results[i] = vec.tolist()
+                metrics.incr("embedding_cache.disk_hits", len(disk_lookup[key]))
+
+        metrics.incr("embedding_cache.misses", sum(1 for r in results if r is None))
+        return results
+
+    async def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[List[float]]) -> None:
+        items = []
+        for text, vector in zip(texts, vectors):
+            key = cache_key(model, text)
+            vec = array("f", vector)
+            self._memory_put(key, vec)
+            items.append((key, vec))
+        if items and self._path:
+            await asyncio.to_thread(self._disk_put, items)
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    path=settings.EMBEDDING_CACHE_PATH,
+    memory_max_bytes=settings.EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_max_bytes=settings.EMBEDDING_CACHE_DISK_MB * 1024 * 1024,
+)
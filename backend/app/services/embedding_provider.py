@@ -0,0 +1,186 @@
+# app/services/embedding_provider.py
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Protocol
+
+import numpy as np
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.utils.batching import MicroBatcher
+from app.utils.onnx import OnnxModel, load_onnx_model
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(Protocol):
+    # Identifies the vector space: embedding_cache keys include it
+    model: str
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Vectors for texts, in input order."""
+        ...
+
+    async def warm_up(self) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Honour Retry-After when the provider sends it, else full-jitter exponential backoff."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), 60.0)
+        except ValueError:
+            pass
+    return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+
+class OpenAICompatibleProvider:
+    """Any OpenAI-compatible /embeddings API (Jina by default, see EMBEDDING_BASE_URL)."""
+
+    def __init__(self, model: str, api_key: str, base_url: str, concurrency: int, max_retries: int):
+        self.model = model
+        self._client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,  # retries are handled by embed with jittered backoff
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._max_retries = max_retries
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One provider call under the in-flight semaphore, retrying 429/5xx and connection errors."""
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await self._client.embeddings.create(input=texts, model=self.model)
+                return [item.embedding for item in response.data]
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                if attempt >= self._max_retries:
+                    raise
+                delay = _retry_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"[Embed] {type(e).__name__}, retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def warm_up(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+
+class LocalOnnxProvider:
+    """
+    Sentence-embedding model (e.g. bge-small / e5 / MiniLM exported to ONNX)
+    run on CPU with ONNX Runtime. Texts from concurrent callers — chat
+    queries and ingestion batches alike — are merged by a MicroBatcher into
+    batches of up to batch_size, each run on a small thread pool
+    (onnxruntime releases the GIL). Within a batch, texts are sorted by
+    length before padding so short queries don't pay for long chunks.
+    warm_up() loads the model and runs one inference at startup so the
+    first request doesn't pay for it.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        pooling: str,
+        max_length: int,
+        batch_size: int,
+        batch_wait_ms: float,
+        workers: int,
+        threads: int,
+    ):
+        if pooling not in ("mean", "cls"):
+            raise ValueError(f"Unknown pooling '{pooling}'")
+        self.model = f"local:{os.path.basename(os.path.normpath(model_dir))}"
+        self._model_dir = model_dir
+        self._pooling = pooling
+        self._max_length = max_length
+        self._batch_size = batch_size
+        self._threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedder")
+        self._onnx: Optional[OnnxModel] = None
+        self._load_lock = threading.Lock()
+        self._batcher: MicroBatcher[str, List[float]] = MicroBatcher(
+            self._run_batch, max_items=batch_size, max_wait_ms=batch_wait_ms, max_concurrency=workers
+        )
+
+    def _load(self) -> OnnxModel:
+        with self._load_lock:
+            if self._onnx is None:
+                start = time.perf_counter()
+                self._onnx = load_onnx_model(self._model_dir, self._max_length, self._threads)
+                logger.info(f"[Embed] loaded {self._model_dir} in {time.perf_counter() - start:.2f}s")
+        return self._onnx
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        onnx = self._onnx or self._load()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self._batch_size):
+            part = order[start : start + self._batch_size]
+            outputs, mask = onnx.run([texts[i] for i in part])
+            hidden = outputs[0]  # (batch, tokens, dim)
+            if self._pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                weights = mask[..., None].astype(hidden.dtype)
+                pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for i, vector in zip(part, pooled):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    async def _run_batch(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        vectors = await loop.run_in_executor(self._executor, self._encode, texts)
+        metrics.observe("embedding.local_batch", time.perf_counter() - start)
+        metrics.incr("embedding.local_texts", len(texts))
+        return vectors
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return await self._batcher.submit_many(texts)
+
+    async def warm_up(self) -> None:
+        await self.embed(["warm up"])
+
+    async def aclose(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_provider(name: str) -> EmbeddingProvider:
+    if name == "openai":
+        return OpenAICompatibleProvider(
+            model=settings.EMBEDDING_MODEL,
+            api_key=settings.EMBEDDING_API_KEY,
+            base_url=settings.EMBEDDING_BASE_URL,
+            concurrency=settings.EMBEDDING_CONCURRENCY,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+        )
+    if name == "local":
+        return LocalOnnxProvider(
+            model_dir=settings.EMBEDDING_LOCAL_MODEL_DIR,
+            pooling=settings.EMBEDDING_LOCAL_POOLING,
+            max_length=settings.EMBEDDING_LOCAL_MAX_LENGTH,
+            batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+            batch_wait_ms=settings.EMBEDDING_LOCAL_BATCH_WAIT_MS,
+            workers=settings.EMBEDDING_LOCAL_WORKERS,
+            threads=settings.EMBEDDING_LOCAL_THREADS,
+        )
+    raise ValueError(f"Unknown embedding provider '{name}'")
+
+
+embedding_provider = build_provider(settings.EMBEDDING_PROVIDER)
@@ -0,0 +1,72 @@
+# app/services/http_clients.py
+import logging
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER = "openrouter"
+RERANKER = "reranker"
+
+
+def _build(name: str) -> httpx.AsyncClient:
+    if name == OPENROUTER:
+        base_url = settings.OPENROUTER_BASE_URL
+        max_connections = settings.OPENROUTER_MAX_CONNECTIONS
+        # Streams can idle between tokens; read timeout applies per chunk, not per response
+        timeout = httpx.Timeout(
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            read=settings.OPENROUTER_READ_TIMEOUT,
+            write=settings.HTTP_CONNECT_TIMEOUT,
+            pool=settings.HTTP_CONNECT_TIMEOUT,
+        )
+    elif name == RERANKER:
+        base_url = settings.EMBEDDING_BASE_URL
+        max_connections = settings.RERANKER_MAX_CONNECTIONS
+        timeout = httpx.Timeout(settings.RERANKER_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+    else:
+        raise KeyError(f"Unknown upstream '{name}'")
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    try:
+        return httpx.AsyncClient(base_url=base_url, http2=True, limits=limits, timeout=timeout)
+    except ImportError:
+        # http2=True needs the 'h2' package (httpx[http2]); keep-alive still applies without it
+        logger.warning(f"[HTTP] h2 not installed, '{name}' client falling back to HTTP/1.1")
+        return httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout)
+
+
+class HTTPClients:
+    """
+    App-lifetime registry of pooled httpx clients, one per upstream, so chat
+    turns reuse warm TCP+TLS (HTTP/2) connections instead of handshaking on
+    every call. Opened in main.lifespan and closed on shutdown; get() also
+    creates clients lazily for processes without a lifespan (worker.py).
+    """
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def start(self) -> None:
+        for name in (OPENROUTER, RERANKER):
+            self.get(name)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = _build(name)
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HTTPClients()
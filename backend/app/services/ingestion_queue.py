@@ -0,0 +1,397 @@
+# app/services/ingestion_queue.py
+"""
+Durable ingestion queue backed by the ingestion_jobs table.
+
+Uploads enqueue a job in the same transaction as their Document row; workers
+(inline in the API process and/or `python worker.py`) claim jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, hold a lease they renew while working,
+and either finish the job or reschedule it with exponential backoff —
+unless the error would recur on every attempt (e.g. a file without
+extractable text), in which case the job fails at once.
+A job whose lease expires (worker crashed or was redeployed) becomes
+claimable again, so documents never stay in "processing" forever.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import tempfile
+import uuid
+from datetime import timedelta
+
+from pdfminer.psexceptions import PSException
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.document import Document
+from app.models.ingestion_job import IngestionJob
+from app.models.user import SubscriptionLevel
+from app.services.cache_invalidation import notify_doc_changed
+from app.services.conversation_memory import recent_context
+from app.services.rag import aiter_blocks, delete_document_vectors, ingest_document
+from app.services.retrieval_cache import retrieval_cache
+from app.utils.compression import iter_decompressed_text
+from app.utils.parse_pool import parse_pool
+from app.utils.parser import UnprocessableDocumentError
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_PRO = 10
+PRIORITY_FREE = 0
+
+# Failures that would recur on every attempt: no extractable text, unsupported
+# content, corrupt or encrypted PDFs (pdfminer errors all derive from PSException).
+# Anything else — HTTP, Qdrant, DB, malformed provider responses, parse timeouts —
+# is retried.
+PERMANENT_ERRORS = (UnprocessableDocumentError, PSException)
+
+# Wakes inline workers immediately after an enqueue instead of waiting a poll interval
+_wakeup = asyncio.Event()
+
+
+def job_priority(subscription: SubscriptionLevel | None) -> int:
+    return PRIORITY_PRO if subscription == SubscriptionLevel.pro else PRIORITY_FREE
+
+
+PAYLOAD_TEXT = "text/gzip"  # gzip-compressed extracted text
+PAYLOAD_PDF = "application/pdf"  # raw PDF bytes, extracted page-parallel by the worker
+
+
+def build_job(
+    *,
+    doc_id: str,
+    user_email: str,
+    payload: bytes,
+    payload_format: str = PAYLOAD_TEXT,
+    priority: int = PRIORITY_FREE,
+) -> IngestionJob:
+    """Create a job row; the caller adds it to the session that inserts the Document."""
+    return IngestionJob(
+        doc_id=doc_id,
+        user_email=user_email,
+        payload=payload,
+        payload_format=payload_format,
+        status="queued",
+        priority=priority,
+        attempts=0,
+        max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+    )
+
+
+async def has_active_job(db: AsyncSession, doc_id: str) -> bool:
+    """Whether doc_id has a job that is queued or being worked on."""
+    result = await db.execute(
+        select(IngestionJob.id)
+        .where(IngestionJob.doc_id == doc_id, IngestionJob.status.in_(("queued", "running")))
+        .limit(1)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+def notify_workers() -> None:
+    _wakeup.set()
+
+
+def _retry_backoff(attempts: int) -> timedelta:
+    base = min(600.0, 10.0 * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=base + random.uniform(0, base / 2))
+
+
+async def claim_job(worker_id: str) -> IngestionJob | None:
+    """
+    Claim the highest-priority runnable job and lease it to worker_id.
+
+    Runnable means queued with run_after in the past, or running with an
+    expired lease. Jobs of users who already have
+    INGESTION_PER_USER_CONCURRENCY live leases are skipped, so one user's
+    bulk upload can't monopolise the pool (the cap is best-effort under
+    concurrent claims, which is fine for fairness).
+    """
+    now = func.now()
+    running = aliased(IngestionJob)
+    active_for_user = (
+        select(func.count())
+        .select_from(running)
+        .where(
+            running.user_email == IngestionJob.user_email,
+            running.status == "running",
+            running.lease_expires_at >= now,
+        )
+        .scalar_subquery()
+    )
+    candidate = (
+        select(IngestionJob.id)
+        .where(
+            or_(
+                and_(IngestionJob.status == "queued", IngestionJob.run_after <= now),
+                and_(IngestionJob.status == "running", IngestionJob.lease_expires_at < now),
+            ),
+            active_for_user < settings.INGESTION_PER_USER_CONCURRENCY,
+        )
+        .order_by(IngestionJob.priority.desc(), IngestionJob.run_after.asc(), IngestionJob.id.asc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == candidate)
+            .values(
+                status="running",
+                attempts=IngestionJob.attempts + 1,
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=settings.INGESTION_LEASE_SECONDS),
+            )
+            .returning(IngestionJob)
+            .execution_options(synchronize_session=False)
+        )
+        job = result.scalar_one_or_none()
+        await session.commit()
+        return job
+
+
+async def _renew_lease(job_id: int, worker_id: str, work: asyncio.Task, lost: asyncio.Event) -> None:
+    """Extend the lease every third of its length; on losing it, set lost and cancel work."""
+    interval = settings.INGESTION_LEASE_SECONDS / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    update(IngestionJob)
+                    .where(IngestionJob.id == job_id, IngestionJob.lease_owner == worker_id)
+                    .values(lease_expires_at=func.now() + timedelta(seconds=settings.INGESTION_LEASE_SECONDS))
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"[Ingestion] lease renewal failed for job {job_id}: {e}")
+            continue
+        if result.rowcount == 0:
+            # Another worker has reclaimed the job; stop embedding and upserting alongside it
+            logger.warning(f"[Ingestion] lost lease on job {job_id}, abandoning it")
+            lost.set()
+            work.cancel()
+            return
+
+
+async def _drop_if_deleted(job: IngestionJob) -> bool:
+    """
+    Called when an update guarded by our lease matched no row. Either another
+    worker holds the lease (it owns the document now), or the job row is gone:
+    jobs cascade with their Document, so the document was deleted while we
+    were writing its chunks — remove whatever we stored, including anything
+    upserted after the delete already cleared the document's vectors.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(IngestionJob.id).where(IngestionJob.id == job.id))
+        if result.scalar_one_or_none() is not None:
+            return False
+    logger.info(f"[Ingestion] doc_id={job.doc_id} was deleted during job {job.id}, dropping its chunks")
+    await delete_document_vectors(job.doc_id, job.user_email)
+    return True
+
+
+async def _finish_job(job: IngestionJob, worker_id: str) -> None:
+    async with AsyncSessionLocal() as session:
+        claimed = await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job.id, IngestionJob.lease_owner == worker_id)
+            .values(status="done", payload=None, lease_owner=None, lease_expires_at=None, last_error=None)
+        )
+        if claimed.rowcount == 0:
+            await session.commit()
+            if not await _drop_if_deleted(job):
+                # Lease was lost: the job's new owner decides the Document's status
+                logger.warning(f"[Ingestion] lost lease on job {job.id} before finishing, leaving doc_id={job.doc_id}")
+            return
+        result = await session.execute(
+            update(Document).where(Document.doc_id == job.doc_id).values(status="done")
+        )
+        await notify_doc_changed(session, job.doc_id)
+        await session.commit()
+    # A replaced document keeps its doc_id: drop answers built from its old chunks
+    # (other processes do the same on the notification)
+    retrieval_cache.invalidate_doc(job.doc_id)
+    recent_context.invalidate_doc(job.doc_id)
+    if result.rowcount == 0:
+        # Document was deleted while we were embedding it — drop the orphaned vectors
+        await delete_document_vectors(job.doc_id, job.user_email)
+
+
+def is_permanent_error(e: Exception) -> bool:
+    return isinstance(e, PERMANENT_ERRORS)
+
+
+async def _fail_job(job: IngestionJob, worker_id: str, reason: str, permanent: bool = False) -> None:
+    final = permanent or job.attempts >= job.max_attempts
+    async with AsyncSessionLocal() as session:
+        if final:
+            claimed = await session.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job.id, IngestionJob.lease_owner == worker_id)
+                .values(status="failed", payload=None, lease_owner=None, lease_expires_at=None, last_error=reason)
+            )
+            if claimed.rowcount:
+                await session.execute(
+                    update(Document).where(Document.doc_id == job.doc_id).values(status="failed")
+                )
+                # A failed re-ingestion may have replaced some of the document's chunks already
+                await notify_doc_changed(session, job.doc_id)
+        else:
+            claimed = await session.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job.id, IngestionJob.lease_owner == worker_id)
+                .values(
+                    status="queued",
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    last_error=reason,
+                    run_after=func.now() + _retry_backoff(job.attempts),
+                )
+            )
+        await session.commit()
+    if not claimed.rowcount:
+        await _drop_if_deleted(job)
+
+
+def _error_reason(e: Exception) -> str:
+    cause = getattr(e, "__cause__", None) or getattr(e, "__context__", None)
+    return str(cause) if cause and str(cause) else (str(e) or type(e).__name__)
+
+
+async def _corpus_doc_ids(job: IngestionJob) -> list[str] | None:
+    if not settings.DEDUP_ACROSS_CORPUS:
+        return None
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Document.doc_id).where(
+                Document.user_email == job.user_email,
+                Document.status == "done",
+                Document.doc_id != job.doc_id,
+            )
+        )
+        return list(result.scalars().all())
+
+
+async def _ingest_payload(job: IngestionJob) -> None:
+    corpus_doc_ids = await _corpus_doc_ids(job)
+    if job.payload_format == PAYLOAD_PDF:
+        # pdfminer needs a seekable file; pool processes open it by path
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(job.payload)
+            pages = (text async for _, text in parse_pool.iter_pdf_pages(path))
+            await ingest_document(
+                job.doc_id, pages, paged=True, corpus_doc_ids=corpus_doc_ids, user_email=job.user_email
+            )
+        finally:
+            os.remove(path)
+    else:
+        await ingest_document(
+            job.doc_id,
+            aiter_blocks(iter_decompressed_text(job.payload)),
+            corpus_doc_ids=corpus_doc_ids,
+            user_email=job.user_email,
+        )
+
+
+async def process_job(job: IngestionJob, worker_id: str) -> None:
+    if job.attempts > job.max_attempts or not job.payload:
+        # Lease expired on its last attempt (worker died mid-job) — give up
+        await _fail_job(job, worker_id, job.last_error or "Ingestion worker stopped before finishing")
+        return
+
+    work = asyncio.create_task(_ingest_payload(job))
+    lease_lost = asyncio.Event()
+    renewer = asyncio.create_task(_renew_lease(job.id, worker_id, work, lease_lost))
+    try:
+        with metrics.timer("ingestion.job"):
+            await work
+    except asyncio.CancelledError:
+        if not lease_lost.is_set():
+            raise  # the worker itself is stopping
+        metrics.incr("ingestion.leases_lost")
+        await _drop_if_deleted(job)
+        return
+    except Exception as e:
+        reason = _error_reason(e)
+        permanent = is_permanent_error(e)
+        logger.exception(
+            f"[FAILED] ingestion job {job.id} (attempt {job.attempts}{', permanent' if permanent else ''}) "
+            f"for doc_id={job.doc_id}: {e}"
+        )
+        metrics.incr("ingestion.failures")
+        await _fail_job(job, worker_id, reason, permanent=permanent)
+        return
+    finally:
+        renewer.cancel()
+        work.cancel()
+
+    await _finish_job(job, worker_id)
+    metrics.incr("ingestion.completed")
+
+
+async def run_worker(name: str | None = None) -> None:
+    """Claim and process jobs until cancelled."""
+    worker_id = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    logger.info(f"[Ingestion] worker {worker_id} started")
+    while True:
+        try:
+            job = await claim_job(worker_id)
+        except Exception as e:
+            logger.warning(f"[Ingestion] worker {worker_id} could not claim a job: {e}")
+            job = None
+
+        if job is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.INGESTION_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await process_job(job, worker_id)
+        except Exception as e:
+            # Lease will expire and another worker will retry the job
+            logger.exception(f"[Ingestion] worker {worker_id} crashed on job {job.id}: {e}")
+
+
+def start_workers(count: int) -> list[asyncio.Task]:
+    return [asyncio.create_task(run_worker()) for _ in range(count)]
+
+
+async def stop_workers(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def get_job_error(db: AsyncSession, doc_id: str) -> str | None:
+    result = await db.execute(
+        select(IngestionJob.last_error)
+        .where(IngestionJob.doc_id == doc_id)
+        .order_by(IngestionJob.id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_job_errors(db: AsyncSession, doc_ids: list[str]) -> dict[str, str]:
+    """last_error of the latest job of each doc_id that has one."""
+    if not doc_ids:
+        return {}
+    result = await db.execute(
+        select(IngestionJob.doc_id, IngestionJob.last_error)
+        .where(IngestionJob.doc_id.in_(doc_ids))
+        .distinct(IngestionJob.doc_id)
+        .order_by(IngestionJob.doc_id, IngestionJob.id.desc())
+    )
+    return {doc_id: error for doc_id, error in result.all() if error}
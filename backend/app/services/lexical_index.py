@@ -0,0 +1,230 @@
+# app/services/lexical_index.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# "_" joins words so identifiers like ERR_CONN_RESET stay one token
+_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '_'"
+_TERM = re.compile(r"\w+")
+MAX_QUERY_TERMS = 32
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    " id INTEGER PRIMARY KEY,"
+    " point_id TEXT NOT NULL UNIQUE,"
+    " doc_id TEXT NOT NULL,"
+    " chunk INTEGER,"
+    " text TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_chunks_doc_id ON chunks (doc_id)",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+    f"text, content='chunks', content_rowid='id', tokenize=\"{_TOKENIZER}\")",
+    "CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN"
+    " INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN"
+    " INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN"
+    " INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);"
+    " INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text); END",
+)
+
+
+@dataclass(slots=True)
+class LexicalHit:
+    point_id: str  # Qdrant point id of the chunk
+    doc_id: str
+    chunk: int
+    text: str
+    score: float  # BM25, higher is better
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query matching any of the query's terms, each quoted so no term is read as syntax."""
+    terms = list(dict.fromkeys(t.lower() for t in _TERM.findall(query)))[:MAX_QUERY_TERMS]
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+class _UserDb:
+    """
+    One user's index file. Writes go through writer under write_lock; searches
+    use a separate reader connection, which WAL lets proceed while a write
+    is in progress, so neither waits on the other or on other users.
+    """
+
+    __slots__ = ("writer", "reader", "write_lock", "read_lock")
+
+    def __init__(self, writer: sqlite3.Connection, reader: sqlite3.Connection):
+        self.writer = writer
+        self.reader = reader
+        self.write_lock = threading.Lock()
+        self.read_lock = threading.Lock()
+
+
+class LexicalIndex:
+    """
+    Per-user BM25 index over chunk text: one SQLite file per user with an
+    FTS5 table, on local disk next to the embedding cache. Rows are keyed by
+    the chunk's Qdrant point id, so lexical hits can be fused with vector
+    hits. Written by ingestion, read at query time; every operation is a
+    local, blocking SQLite call run in a thread. Failures are logged and
+    degrade retrieval to vector-only rather than failing requests.
+    """
+
+    def __init__(self, directory: str, enabled: bool, max_open: int = 64):
+        self._dir = directory if enabled and directory else ""
+        self._max_open = max_open
+        self._lock = threading.Lock()  # guards _dbs only, never held during a query
+        self._dbs: "OrderedDict[str, _UserDb]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._dir)
+
+    def _path(self, user_email: str) -> str:
+        name = hashlib.sha256(user_email.lower().encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self._dir, f"{name}.sqlite3")
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _db(self, user_email: str) -> "_UserDb":
+        with self._lock:
+            db = self._dbs.get(user_email)
+            if db is not None:
+                self._dbs.move_to_end(user_email)
+                return db
+            os.makedirs(self._dir, exist_ok=True)
+            path = self._path(user_email)
+            writer = self._open(path)
+            for statement in _SCHEMA:
+                writer.execute(statement)
+            writer.commit()
+            db = self._dbs[user_email] = _UserDb(writer, self._open(path))
+            # An evicted db still in use by another thread is closed once that thread drops it
+            while len(self._dbs) > self._max_open:
+                self._dbs.popitem(last=False)
+            return db
+
+    def _upsert(self, user_email: str, rows: Sequence[tuple[str, str, int, str]]) -> None:
+        db = self._db(user_email)
+        with db.write_lock:
+            db.writer.executemany(
+                "INSERT INTO chunks (point_id, doc_id, chunk, text) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (point_id) DO UPDATE SET doc_id = excluded.doc_id, chunk = excluded.chunk,"
+                " text = excluded.text WHERE chunks.chunk IS NOT excluded.chunk OR chunks.text != excluded.text",
+                rows,
+            )
+            db.writer.commit()
+
+    def _append(self, user_email: str, rows: Sequence[tuple[str, str]]) -> None:
+        db = self._db(user_email)
+        with db.write_lock:
+            db.writer.executemany(
+                "UPDATE chunks SET text = text || ? WHERE point_id = ?", [(extra, point_id) for point_id, extra in rows]
+            )
+            db.writer.commit()
+
+    def _delete_except(self, user_email: str, doc_id: str, keep: Optional[set[str]]) -> int:
+        db = self._db(user_email)
+        with db.write_lock:
+            conn = db.writer
+            if keep is None:
+                deleted = conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,)).rowcount
+            else:
+                stale = [
+                    (point_id,)
+                    for (point_id,) in conn.execute("SELECT point_id FROM chunks WHERE doc_id = ?", (doc_id,))
+                    if point_id not in keep
+                ]
+                conn.executemany("DELETE FROM chunks WHERE point_id = ?", stale)
+                deleted = len(stale)
+            conn.commit()
+            return deleted
+
+    def _search(self, user_email: str, expression: str, doc_ids: Sequence[str], limit: int) -> List[LexicalHit]:
+        db = self._db(user_email)
+        with db.read_lock:
+            conn = db.reader
+            placeholders = ",".join("?" * len(doc_ids))
+            rows = conn.execute(
+                "SELECT c.point_id, c.doc_id, c.chunk, c.text, bm25(chunks_fts) AS rank"
+                " FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid"
+                f" WHERE chunks_fts MATCH ? AND c.doc_id IN ({placeholders})"
+                " ORDER BY rank LIMIT ?",
+                (expression, *doc_ids, limit),
+            ).fetchall()
+        # FTS5's bm25() is negated so that ascending order is best first
+        return [LexicalHit(point_id, doc_id, chunk, text, -rank) for point_id, doc_id, chunk, text, rank in rows]
+
+    # ---------- public API ----------
+
+    async def add_chunks(self, user_email: str, rows: Sequence[tuple[str, str, int, str]]) -> None:
+        """Index (point_id, doc_id, chunk, text) rows, replacing rows with the same point id."""
+        if not self.enabled or not rows:
+            return
+        try:
+            await asyncio.to_thread(self._upsert, user_email, rows)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"[LexicalIndex] write failed for {len(rows)} chunks: {e}")
+
+    async def append_text(self, user_email: str, rows: Sequence[tuple[str, str]]) -> None:
+        """Make extra text findable through an indexed chunk: (point_id, extra) rows, appended to its text."""
+        if not self.enabled or not rows:
+            return
+        try:
+            await asyncio.to_thread(self._append, user_email, rows)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"[LexicalIndex] append failed for {len(rows)} chunks: {e}")
+
+    async def remove_doc(self, user_email: str, doc_id: str, keep: Optional[Iterable[str]] = None) -> None:
+        """Drop a document's rows, or only those whose point id is not in keep."""
+        if not self.enabled:
+            return
+        try:
+            deleted = await asyncio.to_thread(
+                self._delete_except, user_email, doc_id, None if keep is None else set(keep)
+            )
+            metrics.incr("lexical_index.rows_deleted", deleted)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"[LexicalIndex] delete failed for doc_id={doc_id}: {e}")
+
+    async def search(self, user_email: str, query: str, doc_ids: Sequence[str], limit: int) -> List[LexicalHit]:
+        """Best BM25 matches for query among doc_ids, best first."""
+        expression = match_expression(query)
+        if not self.enabled or not expression or not doc_ids or limit <= 0:
+            return []
+        try:
+            with metrics.timer("lexical_index.search"):
+                return await asyncio.to_thread(self._search, user_email, expression, list(doc_ids), limit)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"[LexicalIndex] search failed: {e}")
+            return []
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int) -> dict[str, float]:
+    """RRF: each id scores sum(1 / (k + rank)) over the rankings it appears in (rank from 1)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+lexical_index = LexicalIndex(
+    directory=settings.LEXICAL_INDEX_DIR,
+    enabled=settings.LEXICAL_SEARCH_ENABLED,
+)
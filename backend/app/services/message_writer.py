@@ -0,0 +1,163 @@
+# app/services/message_writer.py
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.conversation import Conversation
+from app.models.conversation_message import ConversationMessage
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 120
+
+
+@dataclass(slots=True)
+class PendingMessage:
+    conversation_id: str
+    role: str
+    content: str
+    sources: list[dict] | None = None
+
+
+def message_preview(content: str) -> str:
+    normalized = " ".join(content.split())
+    if len(normalized) <= PREVIEW_LENGTH:
+        return normalized
+    return f"{normalized[:PREVIEW_LENGTH - 3].rstrip()}..."
+
+
+async def record_messages(session: AsyncSession, messages: list[PendingMessage]) -> dict[str, int]:
+    """
+    Add message rows and bump the denormalized counters of their
+    conversations (one UPDATE ... RETURNING per conversation) in the
+    caller's transaction. Returns the new message_count per conversation.
+    """
+    session.add_all(
+        ConversationMessage(
+            conversation_id=m.conversation_id,
+            role=m.role,
+            content=m.content,
+            sources_json=json.dumps(m.sources) if m.sources else None,
+        )
+        for m in messages
+    )
+    added: dict[str, int] = {}
+    last: dict[str, PendingMessage] = {}
+    for m in messages:
+        added[m.conversation_id] = added.get(m.conversation_id, 0) + 1
+        last[m.conversation_id] = m
+
+    counts: dict[str, int] = {}
+    for conversation_id, n in added.items():
+        result = await session.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(
+                message_count=Conversation.message_count + n,
+                last_message_at=func.now(),
+                last_message_preview=message_preview(last[conversation_id].content),
+                updated_at=func.now(),
+            )
+            .returning(Conversation.message_count)
+            .execution_options(synchronize_session=False)
+        )
+        count = result.scalar_one_or_none()
+        if count is not None:
+            counts[conversation_id] = count
+    return counts
+
+
+class MessageWriter:
+    """
+    Buffers messages written at the end of chat streams and inserts them in
+    batches: one session and one commit per flush instead of one per stream.
+    A batch is flushed once it holds max_batch messages or flush_ms after its
+    first message. Started in main.lifespan; aclose() drains the queue so
+    nothing submitted before shutdown is lost.
+    """
+
+    def __init__(self, max_batch: int, flush_ms: int):
+        self._max_batch = max(1, max_batch)
+        self._flush_interval = max(0, flush_ms) / 1000
+        self._queue: asyncio.Queue[PendingMessage | None] | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        sources: list[dict] | None = None,
+    ) -> None:
+        self.start()
+        self._queue.put_nowait(PendingMessage(conversation_id, role, content, sources))
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._max_batch:
+                remaining = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(
+                        self._queue.get(), remaining
+                    )
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[PendingMessage]) -> None:
+        try:
+            with metrics.timer("message_writer.flush"):
+                await self._write(batch)
+            metrics.incr("message_writer.messages", len(batch))
+        except Exception as e:
+            # One bad row (e.g. conversation deleted mid-stream) must not drop the rest
+            logger.warning(f"[MessageWriter] batch of {len(batch)} failed, retrying one by one: {e}")
+            for message in batch:
+                try:
+                    await self._write([message])
+                    metrics.incr("message_writer.messages")
+                except Exception as e:
+                    metrics.incr("message_writer.dropped")
+                    logger.error(f"[MessageWriter] dropped message for conversation {message.conversation_id}: {e}")
+
+    @staticmethod
+    async def _write(batch: list[PendingMessage]) -> None:
+        async with AsyncSessionLocal() as session:
+            await record_messages(session, batch)
+            await session.commit()
+
+
+message_writer = MessageWriter(
+    max_batch=settings.MESSAGE_WRITER_MAX_BATCH,
+    flush_ms=settings.MESSAGE_WRITER_FLUSH_MS,
+)
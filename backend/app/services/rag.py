@@ -3,175 +3,568 @@ import json
 import asyncio
 import logging
 import uuid
-from typing import Any, AsyncGenerator, List
+from collections.abc import AsyncIterable
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Iterable, List, TypeVar
 
-from openai import AsyncOpenAI
-from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue, MatchAny
-from sqlalchemy import update
+from qdrant_client.models import (
+    PointStruct, PointIdsList, Filter, FieldCondition, HasIdCondition, MatchValue, MatchAny,
+    OverwritePayloadOperation, SearchRequest, SetPayload, SetPayloadOperation,
+)
 
-from app.utils.compression import decompress_text
-from app.models.document import Document
+from app.utils.batching import MicroBatcher
+from app.utils.chunking import Chunk, FixedSizeChunker, aiter_chunks, iter_chunks
+from app.utils.dedup import ChunkDeduper, content_hash, normalize_text
+from app.utils.parser import UnprocessableDocumentError
+from app.utils.tokens import estimate_tokens
 from app.core.config import settings
-from app.db.session import AsyncSessionLocal
-from app.services.vector_store import qdrant_client, COLLECTION_NAME
+from app.core.metrics import metrics
+from app.services.conversation_memory import recent_context
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_provider import embedding_provider
+from app.services.http_clients import OPENROUTER, http_clients
+from app.services.lexical_index import LexicalHit, lexical_index, reciprocal_rank_fusion
+from app.services.reranker import reranker
+from app.services.retrieval_cache import retrieval_cache
+from app.services.vector_store import qdrant_client, COLLECTION_NAME, SEARCH_PARAMS
 
 logger = logging.getLogger(__name__)
 
-# Stores the last error reason per doc_id so the status endpoint can expose it.
-# Cleared when a document succeeds or the server restarts.
-_processing_errors: dict[str, str] = {}
-
-openai_client = AsyncOpenAI(
-    api_key=settings.EMBEDDING_API_KEY,
-    base_url=settings.EMBEDDING_BASE_URL,
-)
+T = TypeVar("T")
 
-EMBED_MODEL = settings.EMBEDDING_MODEL
 MIN_CONTEXT_SCORE = 0.35
+MAX_DUPLICATE_REFERENCES = 50  # per original chunk; duplicate_count keeps the full total
+POINT_ID_NAMESPACE = uuid.UUID("6f1c7d2e-3b8a-5e4f-9a61-0d2c4b7e8f13")  # never change: ids of stored chunks derive from it
 
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    chunks: List[str] = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
-
-
-async def embed_texts(texts: List[str], batch_size: int = 96) -> List[List[float]]:
-    """Embed texts in batches to respect Jina AI's per-request item limit."""
-    embeddings: List[List[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        response = await openai_client.embeddings.create(input=batch, model=EMBED_MODEL)
-        embeddings.extend(item.embedding for item in response.data)
-    return embeddings
+@dataclass(slots=True)
+class StreamEvent:
+    """
+    One chat stream event. Generators yield these and the HTTP layer
+    serializes each exactly once (chat.encode_sse), so nothing downstream
+    has to re-parse JSON frames to read the answer back.
+    kind is "start", "delta", "sources", "error" or "rate_limit".
+    """
 
+    kind: str
+    data: Any = None
 
-async def embed_and_store(compressed_text: bytes, doc_id: str):
+
+def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    return [chunk.text for chunk in iter_chunks([text], FixedSizeChunker(chunk_size, overlap))]
+
+
+async def aiter_blocks(blocks: Iterable[str]) -> AsyncGenerator[str, None]:
+    """Adapt a synchronous block iterator (e.g. decompression) to the async pipeline."""
+    for block in blocks:
+        yield block
+
+
+async def _token_batches(items: AsyncIterable[T], text_of: Callable[[T], str]) -> AsyncGenerator[tuple[int, List[T]], None]:
+    """Split items into (offset, batch) pairs bounded by estimated tokens and item count."""
+    offset = 0
+    batch: List[T] = []
+    tokens = 0
+    async for item in items:
+        t = estimate_tokens(text_of(item))
+        if batch and (len(batch) >= settings.EMBEDDING_BATCH_MAX_ITEMS or tokens + t > settings.EMBEDDING_BATCH_MAX_TOKENS):
+            yield offset, batch
+            offset += len(batch)
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += t
+    if batch:
+        yield offset, batch
+
+
+async def _embed_batch(offset: int, batch: List[T], text_of: Callable[[T], str]) -> tuple[int, List[T], List[List[float]]]:
+    texts = [text_of(item) for item in batch]
+    vectors = await embedding_cache.get_many(embedding_provider.model, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        fetched = await embedding_provider.embed(missing)
+        await embedding_cache.put_many(embedding_provider.model, missing, fetched)
+        by_text = dict(zip(missing, fetched))
+        vectors = [v if v is not None else by_text[t] for t, v in zip(texts, vectors)]
+    return offset, batch, vectors
+
+
+def _identity(text: str) -> str:
+    return text
+
+
+async def iter_embedded_batches(
+    items: Iterable[T] | AsyncIterable[T],
+    text_of: Callable[[T], str] = _identity,
+) -> AsyncGenerator[tuple[int, List[T], List[List[float]]], None]:
     """
-    Decompress, chunk, embed via OpenAI, and upsert into Qdrant.
-    Updates Document status to 'done' on success or 'failed' on error.
+    Pipelined embedding: keeps up to EMBEDDING_CONCURRENCY requests in flight
+    (shared process-wide) and yields (offset, batch, vectors) for each batch as
+    soon as it completes — completion order, not input order — so callers can
+    upsert finished batches while later ones are still on the wire.
+    items may be a lazy (async) iterator; it is only advanced when a batch
+    slot frees up, which bounds how much of a document is in memory at once.
+    text_of extracts the text to embed from each item.
+    Cached vectors are served from embedding_cache and never hit the provider.
     """
+    if not isinstance(items, AsyncIterable):
+        items = aiter_blocks(items)
+    window = settings.EMBEDDING_CONCURRENCY * 2
+    batches = _token_batches(items, text_of)
+    pending: set[asyncio.Task] = set()
+    exhausted = False
     try:
-        text = decompress_text(compressed_text)
-        if not text or not text.strip():
-            raise ValueError(f"No extractable text found in document {doc_id}")
+        while True:
+            while not exhausted and len(pending) < window:
+                nxt = await anext(batches, None)
+                if nxt is None:
+                    exhausted = True
+                    break
+                pending.add(asyncio.create_task(_embed_batch(*nxt, text_of)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
 
-        chunks = chunk_text(text)
-        if not chunks:
-            raise ValueError(f"Text chunking produced no chunks for document {doc_id}")
 
-        embeddings = await embed_texts(chunks)
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts, returning vectors in input order."""
+    embeddings: List[List[float]] = [[] for _ in texts]
+    async for offset, _, vectors in iter_embedded_batches(texts):
+        embeddings[offset : offset + len(vectors)] = vectors
+    return embeddings
 
-        points = [
-            PointStruct(
-                id=str(uuid.uuid4()),
-                vector=embedding,
-                payload={"source": doc_id, "chunk": i, "text": chunk},
-            )
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
-        ]
 
-        for i in range(0, len(points), 50):
-            await qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points[i : i + 50])
+async def _embed_query_batch(queries: List[str]) -> List[List[float]]:
+    metrics.incr("embedding.query_batches")
+    metrics.incr("embedding.queries", len(queries))
+    return await embed_texts(queries)
 
-        async with AsyncSessionLocal() as session:
-            await session.execute(
-                update(Document).where(Document.doc_id == doc_id).values(status="done")
-            )
-            await session.commit()
 
-        _processing_errors.pop(doc_id, None)
-        logger.info(f"[OK] Stored {len(points)} embeddings for doc_id={doc_id}")
+# Coalesces the single-query embedding calls of concurrent chat requests
+_query_batcher: MicroBatcher[str, List[float]] = MicroBatcher(
+    _embed_query_batch,
+    max_items=settings.QUERY_EMBED_BATCH_MAX_ITEMS,
+    max_wait_ms=settings.QUERY_EMBED_BATCH_WAIT_MS,
+    max_concurrency=settings.EMBEDDING_CONCURRENCY,
+)
 
-    except Exception as e:
-        cause = getattr(e, "__cause__", None) or getattr(e, "__context__", None)
-        reason = str(cause) if cause and str(cause) else (str(e) or type(e).__name__)
-        _processing_errors[doc_id] = reason
-        logger.exception(f"[FAILED] embed/store for doc_id={doc_id}: {e}")
+
+async def embed_query(query: str) -> List[float]:
+    """Embed one chat query, batched with queries of other in-flight requests."""
+    return await _query_batcher.submit(query)
+
+
+async def _seed_vectors_from_corpus(
+    items: AsyncIterable[T], text_of: Callable[[T], str], corpus_doc_ids: List[str], batch_size: int = 64
+) -> AsyncGenerator[T, None]:
+    """
+    Pass items through unchanged, first copying the stored vectors of chunks
+    with the same content_hash in the user's other documents into
+    embedding_cache, so iter_embedded_batches doesn't embed them again.
+    """
+
+    async def seed(batch: List[T]) -> None:
+        texts = {content_hash(text_of(item)): text_of(item) for item in batch}
+        found: dict[str, Any] = {}
+        missing = set(texts)
         try:
-            async with AsyncSessionLocal() as session:
-                await session.execute(
-                    update(Document).where(Document.doc_id == doc_id).values(status="failed")
+            # A hash stored in many documents can fill a page on its own: query again for
+            # the hashes still missing until a page comes back short (nothing more matches)
+            while missing:
+                limit = len(missing) * 2
+                records, _ = await qdrant_client.scroll(
+                    collection_name=COLLECTION_NAME,
+                    scroll_filter=Filter(
+                        must=[
+                            FieldCondition(key="source", match=MatchAny(any=corpus_doc_ids)),
+                            FieldCondition(key="content_hash", match=MatchAny(any=list(missing))),
+                        ]
+                    ),
+                    limit=limit,
+                    with_payload=["content_hash"],
+                    with_vectors=True,
                 )
-                await session.commit()
-        except Exception as db_err:
-            logger.exception(f"[FAILED] Could not update status to 'failed' for doc_id={doc_id}: {db_err}")
+                before = len(missing)
+                for r in records:
+                    if r.payload and r.vector and r.payload["content_hash"] in missing:
+                        found[r.payload["content_hash"]] = r.vector
+                        missing.discard(r.payload["content_hash"])
+                if len(records) < limit or len(missing) == before:
+                    break
+        except Exception as e:
+            logger.warning(f"[Dedup] corpus lookup failed, embedding the rest of the batch normally: {e}")
+        if found:
+            metrics.incr("ingestion.corpus_duplicate_chunks", len(found))
+            await embedding_cache.put_many(embedding_provider.model, [texts[h] for h in found], list(found.values()))
+
+    batch: List[T] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            await seed(batch)
+            for queued in batch:
+                yield queued
+            batch = []
+    if batch:
+        await seed(batch)
+        for queued in batch:
+            yield queued
+
+
+async def _store_duplicate_references(references: dict[str, List[dict]], counts: dict[str, int]) -> None:
+    operations = [
+        SetPayloadOperation(
+            set_payload=SetPayload(
+                payload={"duplicates": refs, "duplicate_count": counts[point_id]},
+                points=[point_id],
+            )
+        )
+        for point_id, refs in references.items()
+    ]
+    for i in range(0, len(operations), 256):
+        await qdrant_client.batch_update_points(
+            collection_name=COLLECTION_NAME, update_operations=operations[i : i + 256]
+        )
+
+
+def chunk_point_id(doc_id: str, text: str) -> str:
+    """Deterministic point id: the same content in the same document always maps to the same point."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{doc_id}:{content_hash(text)}"))
+
+
+async def _existing_point_ids(doc_id: str) -> set[str]:
+    ids: set[str] = set()
+    offset = None
+    while True:
+        records, offset = await qdrant_client.scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=Filter(must=[FieldCondition(key="source", match=MatchValue(value=doc_id))]),
+            limit=1024,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(str(r.id) for r in records)
+        if offset is None:
+            return ids
 
 
-async def get_context_chunks(doc_id: str, query: str, top_k: int = 3) -> List[dict[str, Any]]:
+async def _delete_points(point_ids: List[str]) -> None:
+    for i in range(0, len(point_ids), 1024):
+        await qdrant_client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=PointIdsList(points=point_ids[i : i + 1024]),
+        )
+
+
+async def ingest_document(
+    doc_id: str,
+    blocks: AsyncIterable[str],
+    paged: bool = False,
+    corpus_doc_ids: List[str] | None = None,
+    user_email: str | None = None,
+) -> int:
     """
-    Retrieve top-k most relevant chunks for doc_id using OpenAI embeddings + Qdrant.
+    Stream blocks → chunk → dedup → diff → embed → upsert into Qdrant.
+    Each stage pulls from the previous one lazily, so peak memory is bounded
+    by the embedding window rather than the document size. Payloads record
+    character offsets, the heading path and content_hash of each chunk (see
+    app.utils.chunking); when paged is set (PDF sources) also its page.
+
+    Point ids are derived from (doc_id, content hash), so ingestion is
+    incremental: chunks whose point already exists only get their payload
+    (position, offsets, page) rewritten, only new chunks are embedded, and
+    points no longer produced by the document are deleted at the end. The
+    same call therefore handles first ingestion, retries after a partial
+    attempt and replacing a document's content.
+
+    Exact and near-duplicate chunks (DEDUP_ENABLED) are not embedded: they
+    are recorded under the original point's "duplicates" payload instead.
+    A near-duplicate's text is kept there and appended to the original's
+    lexical row, so terms only it contains still find the original.
+    With corpus_doc_ids, chunks identical to ones already stored for those
+    documents reuse their vectors rather than being embedded again.
+    With user_email, the stored chunks are also kept in the user's lexical
+    (BM25) index, under the same point ids.
+    Returns the number of stored chunks; raises on failure so the ingestion
+    queue can retry. Document status is owned by the queue.
     """
-    try:
-        query_embeddings = await embed_texts([query])
-        query_vector = query_embeddings[0]
+    existing = await _existing_point_ids(doc_id)
+    seen: set[str] = set()
+    deduper: ChunkDeduper[str] = ChunkDeduper(settings.DEDUP_SIMILARITY)
+    references: dict[str, List[dict]] = {}
+    duplicate_counts: dict[str, int] = {}
+    refreshed: List[OverwritePayloadOperation] = []
+    lexical_rows: List[tuple[str, str, int, str]] = []
+    reused = 0
+
+    def payload_of(position: int, chunk: Chunk) -> dict[str, Any]:
+        payload = {
+            "source": doc_id,
+            "chunk": position,
+            "text": chunk.text,
+            "start": chunk.start,
+            "end": chunk.end,
+            "content_hash": content_hash(chunk.text),
+        }
+        if chunk.section:
+            payload["section"] = chunk.section
+        if paged:
+            payload["page"] = chunk.page
+        return payload
+
+    async def flush_refreshed() -> None:
+        await qdrant_client.batch_update_points(collection_name=COLLECTION_NAME, update_operations=refreshed)
+        refreshed.clear()
+
+    async def index_lexically(point_id: str, position: int, chunk: Chunk) -> None:
+        if user_email is None:
+            return
+        lexical_rows.append((point_id, doc_id, position, chunk.text))
+        if len(lexical_rows) >= 256:
+            await lexical_index.add_chunks(user_email, lexical_rows)
+            lexical_rows.clear()
+
+    async def new_chunks() -> AsyncGenerator[tuple[int, str, Chunk], None]:
+        nonlocal reused
+        position = 0
+        async for chunk in aiter_chunks(blocks):
+            # Whitespace-only chunks carry nothing retrievable; don't pay to embed them
+            if not chunk.text.strip():
+                continue
+            point_id = chunk_point_id(doc_id, chunk.text)
+            original = None
+            if point_id in seen:
+                original = point_id  # exact repeat within this document
+            elif settings.DEDUP_ENABLED:
+                original = deduper.check(point_id, chunk.text)
+
+            if original is not None:
+                duplicate_counts[original] = duplicate_counts.get(original, 0) + 1
+                refs = references.setdefault(original, [])
+                if len(refs) < MAX_DUPLICATE_REFERENCES:
+                    ref = {"chunk": position, "start": chunk.start, "end": chunk.end}
+                    if paged:
+                        ref["page"] = chunk.page
+                    if original != point_id:
+                        # Near-duplicate: its differing identifiers/numbers must stay retrievable
+                        ref["text"] = chunk.text
+                    refs.append(ref)
+            elif point_id in existing:
+                # Unchanged content: keep the vector, refresh position/offsets
+                seen.add(point_id)
+                reused += 1
+                refreshed.append(
+                    OverwritePayloadOperation(
+                        overwrite_payload=SetPayload(payload=payload_of(position, chunk), points=[point_id])
+                    )
+                )
+                if len(refreshed) >= 256:
+                    await flush_refreshed()
+                await index_lexically(point_id, position, chunk)
+            else:
+                seen.add(point_id)
+                await index_lexically(point_id, position, chunk)
+                yield position, point_id, chunk
+            position += 1
+
+    def text_of(item: tuple[int, str, Chunk]) -> str:
+        return item[2].text
+
+    items = new_chunks()
+    if corpus_doc_ids:
+        items = _seed_vectors_from_corpus(items, text_of, corpus_doc_ids)
+
+    embedded = 0
+    async for _, batch, vectors in iter_embedded_batches(items, text_of=text_of):
+        points = [
+            PointStruct(id=point_id, vector=embedding, payload=payload_of(position, chunk))
+            for (position, point_id, chunk), embedding in zip(batch, vectors)
+        ]
+        await qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points)
+        embedded += len(points)
+    if refreshed:
+        await flush_refreshed()
+
+    stored = embedded + reused
+    if not stored:
+        raise UnprocessableDocumentError(f"No extractable text found in document {doc_id}")
+
+    stale = list(existing - seen)
+    if stale:
+        await _delete_points(stale)
+    if user_email is not None:
+        await lexical_index.add_chunks(user_email, lexical_rows)
+        await lexical_index.append_text(
+            user_email,
+            [
+                (point_id, "".join(f"\n\n{ref['text']}" for ref in refs if "text" in ref))
+                for point_id, refs in references.items()
+                if any("text" in ref for ref in refs)
+            ],
+        )
+        await lexical_index.remove_doc(user_email, doc_id, keep=seen)
+    if references:
+        await _store_duplicate_references(references, duplicate_counts)
+
+    collapsed = sum(duplicate_counts.values())
+    metrics.incr("ingestion.chunks_embedded", embedded)
+    metrics.incr("ingestion.chunks_reused", reused)
+    metrics.incr("ingestion.chunks_deleted", len(stale))
+    metrics.incr("ingestion.duplicate_chunks", collapsed)
+    logger.info(
+        f"[OK] Stored {stored} chunks for doc_id={doc_id}: {embedded} embedded, {reused} unchanged,"
+        f" {len(stale)} removed, {collapsed} duplicates collapsed"
+    )
+    return stored
+
+
+async def delete_document_vectors(doc_id: str, user_email: str | None = None) -> None:
+    retrieval_cache.invalidate_doc(doc_id)
+    recent_context.invalidate_doc(doc_id)
+    if user_email is not None:
+        await lexical_index.remove_doc(user_email, doc_id)
+    await qdrant_client.delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=Filter(
+            must=[FieldCondition(key="source", match=MatchValue(value=doc_id))]
+        ),
+    )
+
+
+def _match_of(hit) -> dict[str, Any]:
+    return {
+        "text": hit.payload["text"],
+        "score": getattr(hit, "score", 0.0) or 0.0,
+        "doc_id": hit.payload.get("source"),
+        "chunk": hit.payload.get("chunk"),
+    }
+
 
+async def _hybrid_search(
+    query: str, query_vector: List[float], doc_ids: List[str], limit: int, user_email: str | None
+) -> List[dict[str, Any]]:
+    """
+    Dense ANN hits from Qdrant, fused with BM25 hits from the user's lexical
+    index by reciprocal rank fusion and returned in fused order. Lexical hits
+    are scored against the query vector in the same Qdrant round trip
+    (search_batch with a has_id filter), so every match keeps a cosine
+    "score" comparable with MIN_CONTEXT_SCORE, and hits whose point no
+    longer exists are dropped. Without user_email (or with LEXICAL_SEARCH_ENABLED
+    off) this is a plain vector search.
+    """
+    source = (
+        FieldCondition(key="source", match=MatchValue(value=doc_ids[0]))
+        if len(doc_ids) == 1
+        else FieldCondition(key="source", match=MatchAny(any=doc_ids))
+    )
+    lexical: List[LexicalHit] = []
+    if user_email is not None:
+        lexical = await lexical_index.search(user_email, query, doc_ids, settings.LEXICAL_CANDIDATES)
+    if not lexical:
         results = await qdrant_client.search(
             collection_name=COLLECTION_NAME,
             query_vector=query_vector,
-            query_filter=Filter(
-                must=[FieldCondition(key="source", match=MatchValue(value=doc_id))]
-            ),
-            limit=top_k,
+            query_filter=Filter(must=[source]),
+            search_params=SEARCH_PARAMS,
+            limit=limit,
         )
-        return [
-            {
-                "text": hit.payload["text"],
-                "score": getattr(hit, "score", 0.0) or 0.0,
-                "chunk": hit.payload.get("chunk"),
-            }
-            for hit in results
-            if hit.payload and "text" in hit.payload
-        ]
+        return [_match_of(hit) for hit in results if hit.payload and "text" in hit.payload]
+
+    lexical_ids = [hit.point_id for hit in lexical]
+    dense, rescored = await qdrant_client.search_batch(
+        collection_name=COLLECTION_NAME,
+        requests=[
+            SearchRequest(
+                vector=query_vector, filter=Filter(must=[source]), params=SEARCH_PARAMS, limit=limit, with_payload=True
+            ),
+            SearchRequest(
+                vector=query_vector,
+                filter=Filter(must=[source, HasIdCondition(has_id=lexical_ids)]),
+                params=SEARCH_PARAMS,
+                limit=len(lexical_ids),
+                with_payload=True,
+            ),
+        ],
+    )
+    hits = {str(hit.id): hit for hit in (*rescored, *dense) if hit.payload and "text" in hit.payload}
+    fused = reciprocal_rank_fusion(
+        [
+            [str(hit.id) for hit in dense],
+            [point_id for point_id in lexical_ids if point_id in hits],
+        ],
+        settings.RRF_K,
+    )
+    ranked = sorted((point_id for point_id in fused if point_id in hits), key=fused.get, reverse=True)
+    dense_ids = {str(hit.id) for hit in dense}
+    metrics.incr("retrieval.lexical_only_hits", sum(1 for point_id in ranked[:limit] if point_id not in dense_ids))
+    return [_match_of(hits[point_id]) for point_id in ranked[:limit]]
+
+
+async def get_context_chunks(
+    doc_id: str, query: str, top_k: int = 3, user_email: str | None = None
+) -> List[dict[str, Any]]:
+    """
+    Retrieve top-k most relevant chunks for doc_id using OpenAI embeddings + Qdrant,
+    fused with BM25 matches from user_email's lexical index (see _hybrid_search).
+    Repeat questions are answered from retrieval_cache without any network call.
+    """
+    cache_key = retrieval_cache.key(query, [doc_id], top_k, reranker=False)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        query_vector = await embed_query(query)
+
+        matches = await _hybrid_search(query, query_vector, [doc_id], top_k, user_email)
+        retrieval_cache.put(cache_key, matches)
+        return matches
 
     except Exception as e:
         logger.exception(f"[FAILED] Retrieval for doc_id={doc_id}, query='{query}': {e}")
         return []
 
 
+def _drop_duplicate_texts(chunks: List[dict[str, Any]]) -> List[dict[str, Any]]:
+    """Keep the first (best-scored) of chunks whose normalized text is identical."""
+    seen: set[str] = set()
+    unique = []
+    for chunk in chunks:
+        key = normalize_text(chunk["text"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(chunk)
+    return unique
+
+
 async def _rerank(query: str, chunks: List[dict], top_n: int) -> List[dict]:
     """
-    Cross-encoder re-ranking via Jina Reranker API.
-    Returns chunks re-ordered by relevance_score (descending), capped at top_n.
-    Reuses EMBEDDING_API_KEY and EMBEDDING_BASE_URL — Jina exposes both
-    embeddings and reranking under the same key and base URL.
+    Cross-encoder re-ranking with the configured backend (RERANKER_BACKEND:
+    Jina's /rerank API or a local ONNX model), through the score cache.
+    Returns chunks re-ordered by relevance score (descending), capped at top_n.
     """
-    import httpx
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(
-            f"{settings.EMBEDDING_BASE_URL}/rerank",
-            headers={"Authorization": f"Bearer {settings.EMBEDDING_API_KEY}"},
-            json={
-                "model": settings.RERANKER_MODEL,
-                "query": query,
-                "documents": [c["text"] for c in chunks],
-                "top_n": top_n,
-            },
-        )
-        resp.raise_for_status()
-        data = resp.json()
-
-    return [
-        {**chunks[r["index"]], "score": r["relevance_score"]}
-        for r in data["results"]
-    ]
+    return await reranker.rerank(query, chunks, top_n)
 
 
 async def get_workspace_context_chunks(
-    doc_ids: List[str], query: str, max_total: int = 20
+    doc_ids: List[str], query: str, max_total: int = 20, user_email: str | None = None
 ) -> List[dict[str, Any]]:
     """
     Three-phase retrieval for workspace mode.
 
-    Phase 1 — ANN candidate pool: fetch min(4 * n_docs, 80) chunks via Qdrant
-    so every document gets a realistic chance to surface relevant content.
+    Phase 1 — Hybrid candidate pool: fetch min(4 * n_docs, 80) chunks via
+    Qdrant ANN fused with BM25 matches from user_email's lexical index, so
+    every document gets a realistic chance to surface relevant content and
+    exact identifiers/names aren't lost to embedding similarity.
 
-    Phase 2 — Cross-encoder re-ranking (when RERANKING_ENABLED): the Jina
-    reranker re-scores all candidates by reading query + chunk together,
+    Phase 2 — Cross-encoder re-ranking (when RERANKING_ENABLED): the
+    reranker (Jina API or local ONNX model) re-scores all candidates by reading query + chunk together,
     producing accuracy far beyond bi-encoder cosine similarity. Falls back
     gracefully to bi-encoder scores if the reranker call fails.
 
@@ -181,34 +574,24 @@ async def get_workspace_context_chunks(
     """
     if not doc_ids:
         return []
+
+    cache_key = retrieval_cache.key(query, doc_ids, max_total, reranker=settings.RERANKING_ENABLED)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        query_embeddings = await embed_texts([query])
-        query_vector = query_embeddings[0]
+        query_vector = await embed_query(query)
 
         candidate_k = min(4 * len(doc_ids), 80)
-        results = await qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_vector,
-            query_filter=Filter(
-                must=[FieldCondition(key="source", match=MatchAny(any=doc_ids))]
-            ),
-            limit=candidate_k,
-        )
-
-        candidates: list[dict] = [
-            {
-                "text": hit.payload["text"],
-                "score": getattr(hit, "score", 0.0) or 0.0,
-                "doc_id": hit.payload.get("source"),
-                "chunk": hit.payload.get("chunk"),
-            }
-            for hit in results
-            if hit.payload and "text" in hit.payload
-        ]
+        candidates = await _hybrid_search(query, query_vector, doc_ids, candidate_k, user_email)
 
         if not candidates:
             return []
 
+        # The same passage stored under several documents only needs one slot
+        candidates = _drop_duplicate_texts(candidates)
+
         # Phase 2 — cross-encoder re-ranking
         using_reranker = False
         if settings.RERANKING_ENABLED:
@@ -223,7 +606,9 @@ async def get_workspace_context_chunks(
         # Phase 3 — diversity enforcement using whichever scores are available
         score_threshold = settings.RERANKER_MIN_SCORE if using_reranker else MIN_CONTEXT_SCORE
 
-        # candidates is already sorted by score (Qdrant ANN or reranker both return sorted)
+        # candidates is already ranked (reranker scores, or fused vector + lexical rank);
+        # keep that order so exact lexical matches aren't pushed out by cosine alone
+        position = {id(c): i for i, c in enumerate(candidates)}
         by_doc: dict[str, list] = {}
         for c in candidates:
             by_doc.setdefault(c["doc_id"], []).append(c)
@@ -239,10 +624,15 @@ async def get_workspace_context_chunks(
             else:
                 remainder.extend(chunks)
 
-        remainder.sort(key=lambda x: x["score"], reverse=True)
+        remainder.sort(key=lambda x: position[id(x)])
         selected.extend(remainder[: max(0, max_total - len(selected))])
         selected.sort(key=lambda x: x["score"], reverse=True)
-        return selected[:max_total]
+        selected = selected[:max_total]
+
+        # Don't pin a degraded (reranker-fallback) result for the whole TTL
+        if using_reranker == settings.RERANKING_ENABLED:
+            retrieval_cache.put(cache_key, selected)
+        return selected
 
     except Exception as e:
         logger.exception(f"[FAILED] Workspace retrieval for query='{query}': {e}")
@@ -257,10 +647,105 @@ def has_sufficient_context(matches: List[dict[str, Any]], min_score: float = MIN
     return best_score >= min_score
 
 
-async def stream_text_response(message: str) -> AsyncGenerator[str, None]:
-    yield 'data: {"choices":[{"delta":{"content":""}}]}\n\n'
-    yield f'data: {json.dumps({"choices": [{"delta": {"content": message}}]})}\n\n'
-    yield "data: [DONE]\n\n"
+async def stream_text_response(message: str) -> AsyncGenerator[StreamEvent, None]:
+    yield StreamEvent("start")
+    yield StreamEvent("delta", message)
+
+
+async def _iter_stream_deltas(response) -> AsyncGenerator[str, None]:
+    """Parse an OpenAI-style SSE response body into content deltas."""
+    async for line in response.aiter_lines():
+        logger.debug("LLM STREAM LINE: %s", line)
+
+        if not line or not line.startswith("data: "):
+            continue
+
+        data = line[len("data: "):].strip()
+
+        if data == "[DONE]":
+            return
+
+        try:
+            parsed = json.loads(data)
+            content = None
+
+            choices = parsed.get("choices") or []
+            if choices:
+                first = choices[0]
+                delta = first.get("delta") or {}
+                if isinstance(delta, dict) and "content" in delta:
+                    content = delta["content"]
+                else:
+                    message = first.get("message") or {}
+                    if isinstance(message, dict) and "content" in message:
+                        val = message["content"]
+                        if isinstance(val, str):
+                            content = val
+                        elif isinstance(val, dict) and "text" in val:
+                            content = val["text"]
+
+            if content is None:
+                if "text" in parsed and isinstance(parsed["text"], str):
+                    content = parsed["text"]
+                elif "content" in parsed and isinstance(parsed["content"], str):
+                    content = parsed["content"]
+
+            if content:
+                yield content
+
+        except json.JSONDecodeError:
+            logger.debug("Failed to json-decode stream fragment; skipping.")
+            continue
+        except Exception as e:
+            logger.exception("Error processing stream chunk: %s", e)
+            continue
+
+
+async def coalesce_deltas(
+    deltas: AsyncIterator[str], window_ms: int, max_bytes: int
+) -> AsyncGenerator[str, None]:
+    """
+    Merge content deltas into fewer SSE frames. A frame is flushed when
+    window_ms has passed since its first delta or once it holds max_bytes,
+    whichever comes first; the next delta is read ahead while the current
+    frame is being written. window_ms <= 0 forwards every delta immediately.
+    """
+    if window_ms <= 0:
+        async for delta in deltas:
+            yield delta
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    buf: List[str] = []
+    size = 0
+    deadline = 0.0
+    nxt = asyncio.ensure_future(deltas.__anext__())
+    try:
+        while True:
+            timeout = max(0.0, deadline - loop.time()) if buf else None
+            done, _ = await asyncio.wait({nxt}, timeout=timeout)
+            if not done:
+                yield "".join(buf)
+                buf, size = [], 0
+                continue
+            try:
+                delta = nxt.result()
+            except StopAsyncIteration:
+                break
+            nxt = asyncio.ensure_future(deltas.__anext__())
+            if not buf:
+                deadline = loop.time() + window
+            buf.append(delta)
+            size += len(delta.encode("utf-8"))
+            if max_bytes > 0 and size >= max_bytes:
+                yield "".join(buf)
+                buf, size = [], 0
+        if buf:
+            yield "".join(buf)
+    finally:
+        if not nxt.done():
+            nxt.cancel()
 
 
 async def query_llm(
@@ -269,14 +754,13 @@ async def query_llm(
     api_key: str,
     model_name: str,
     sources: List[dict] | None = None,
-) -> AsyncGenerator[str, None]:
+    history: List[dict[str, str]] | None = None,
+) -> AsyncGenerator[StreamEvent, None]:
     """
-    Calls OpenRouter with streaming and yields OpenAI-style SSE events.
-    If sources is provided, emits a sources SSE event before [DONE].
+    Calls OpenRouter with streaming and yields StreamEvents.
+    history holds prior turns as role/content messages (see conversation_memory.build_history).
+    If sources is provided, emits a sources event last.
     """
-    import httpx
-
-    url = "https://openrouter.ai/api/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
@@ -296,6 +780,7 @@ async def query_llm(
                     "and fenced code blocks when showing code."
                 ),
             },
+            *(history or []),
             {
                 "role": "user",
                 "content": (
@@ -309,78 +794,32 @@ async def query_llm(
     }
 
     # Signal to frontend that AI has started
-    yield 'data: {"choices":[{"delta":{"content":""}}]}\n\n'
+    yield StreamEvent("start")
 
     try:
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream("POST", url, headers=headers, json=payload) as response:
-                if response.status_code == 429:
-                    yield 'data: {"rate_limit": true}\n\n'
-                    return
-
-                if response.status_code < 200 or response.status_code >= 300:
-                    try:
-                        body_text = await response.aread()
-                        err_text = body_text.decode() if isinstance(body_text, (bytes, bytearray)) else str(body_text)
-                    except Exception:
-                        err_text = f"HTTP {response.status_code} (no body)"
-                    error_event = {"error": f"Upstream API error: {err_text}"}
-                    yield f"data: {json.dumps(error_event)}\n\n"
-                    return
-
-                async for line in response.aiter_lines():
-                    logger.debug("LLM STREAM LINE: %s", line)
-
-                    if not line or not line.startswith("data: "):
-                        continue
-
-                    data = line[len("data: "):].strip()
-
-                    if data == "[DONE]":
-                        return
-
-                    try:
-                        parsed = json.loads(data)
-                        content = None
-
-                        choices = parsed.get("choices") or []
-                        if choices:
-                            first = choices[0]
-                            delta = first.get("delta") or {}
-                            if isinstance(delta, dict) and "content" in delta:
-                                content = delta["content"]
-                            else:
-                                message = first.get("message") or {}
-                                if isinstance(message, dict) and "content" in message:
-                                    val = message["content"]
-                                    if isinstance(val, str):
-                                        content = val
-                                    elif isinstance(val, dict) and "text" in val:
-                                        content = val["text"]
-
-                        if content is None:
-                            if "text" in parsed and isinstance(parsed["text"], str):
-                                content = parsed["text"]
-                            elif "content" in parsed and isinstance(parsed["content"], str):
-                                content = parsed["content"]
-
-                        if content:
-                            event = {"choices": [{"delta": {"content": content}}]}
-                            yield f"data: {json.dumps(event)}\n\n"
-                            await asyncio.sleep(0.02)
-
-                    except json.JSONDecodeError:
-                        logger.debug("Failed to json-decode stream fragment; skipping.")
-                        continue
-                    except Exception as e:
-                        logger.exception("Error processing stream chunk: %s", e)
-                        continue
+        client = http_clients.get(OPENROUTER)
+        async with client.stream("POST", "/chat/completions", headers=headers, json=payload) as response:
+            if response.status_code == 429:
+                yield StreamEvent("rate_limit")
+            elif response.status_code < 200 or response.status_code >= 300:
+                try:
+                    body_text = await response.aread()
+                    err_text = body_text.decode() if isinstance(body_text, (bytes, bytearray)) else str(body_text)
+                except Exception:
+                    err_text = f"HTTP {response.status_code} (no body)"
+                yield StreamEvent("error", f"Upstream API error: {err_text}")
+            else:
+                async for content in coalesce_deltas(
+                    _iter_stream_deltas(response),
+                    window_ms=settings.SSE_COALESCE_MS,
+                    max_bytes=settings.SSE_COALESCE_BYTES,
+                ):
+                    yield StreamEvent("delta", content)
 
     except Exception as e:
         logger.exception("Unexpected error in LLM stream: %s", e)
-        error_event = {"error": f"Stream error: {str(e)}"}
-        yield f"data: {json.dumps(error_event)}\n\n"
-    finally:
-        if sources:
-            yield f"data: {json.dumps({'sources': sources})}\n\n"
-        yield "data: [DONE]\n\n"
+        yield StreamEvent("error", f"Stream error: {str(e)}")
+
+    # Not in a finally: yielding while the client disconnects would raise in aclose()
+    if sources:
+        yield StreamEvent("sources", sources)
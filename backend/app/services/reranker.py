@@ -0,0 +1,175 @@
+# app/services/reranker.py
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.http_clients import RERANKER, http_clients
+from app.services.retrieval_cache import normalize_question
+from app.utils.dedup import content_hash
+from app.utils.onnx import OnnxModel, load_onnx_model
+
+logger = logging.getLogger(__name__)
+
+
+class RerankerBackend(Protocol):
+    name: str
+
+    async def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        """Relevance of each text to query, aligned with texts; higher is better."""
+        ...
+
+
+class JinaReranker:
+    """
+    Cross-encoder re-ranking via Jina Reranker API.
+    Reuses EMBEDDING_API_KEY and EMBEDDING_BASE_URL — Jina exposes both
+    embeddings and reranking under the same key and base URL.
+    """
+
+    def __init__(self, model: str):
+        self.name = f"jina:{model}"
+        self._model = model
+
+    async def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        resp = await http_clients.get(RERANKER).post(
+            "/rerank",
+            headers={"Authorization": f"Bearer {settings.EMBEDDING_API_KEY}"},
+            json={
+                "model": self._model,
+                "query": query,
+                "documents": list(texts),
+                "top_n": len(texts),
+            },
+        )
+        resp.raise_for_status()
+        scores = [0.0] * len(texts)
+        for result in resp.json()["results"]:
+            scores[result["index"]] = result["relevance_score"]
+        return scores
+
+
+class LocalCrossEncoderReranker:
+    """
+    Cross-encoder (e.g. ms-marco-MiniLM-L-6-v2 exported to ONNX) run on CPU
+    with ONNX Runtime. Pairs are scored in batches on a dedicated thread pool
+    (onnxruntime releases the GIL), so the event loop never blocks. Scores
+    are sigmoid probabilities, comparable with Jina's relevance_score.
+    The model is loaded once, by warm_up() at startup or on first use.
+    """
+
+    def __init__(self, model_dir: str, max_length: int, batch_size: int, workers: int, threads: int):
+        self.name = f"local:{model_dir}"
+        self._model_dir = model_dir
+        self._max_length = max_length
+        self._batch_size = batch_size
+        self._threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reranker")
+        self._model: Optional[OnnxModel] = None
+        self._load_lock = threading.Lock()
+
+    def _load(self) -> OnnxModel:
+        with self._load_lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = load_onnx_model(self._model_dir, self._max_length, self._threads)
+                logger.info(f"[Reranker] loaded {self._model_dir} in {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    def _score_sync(self, query: str, texts: List[str]) -> List[float]:
+        model = self._model or self._load()
+        scores: List[float] = []
+        for i in range(0, len(texts), self._batch_size):
+            outputs, _ = model.run([(query, text) for text in texts[i : i + self._batch_size]])
+            logits = outputs[0]
+            if logits.ndim == 2 and logits.shape[1] > 1:
+                # Two-class head: softmax probability of "relevant"
+                exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+                batch = exp[:, -1] / exp.sum(axis=1)
+            else:
+                batch = 1.0 / (1.0 + np.exp(-logits.reshape(-1)))
+            scores.extend(float(s) for s in batch)
+        return scores
+
+    async def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        loop = asyncio.get_running_loop()
+        with metrics.timer("reranker.local"):
+            return await loop.run_in_executor(self._executor, self._score_sync, query, list(texts))
+
+    async def warm_up(self) -> None:
+        await self.score("warm up", ["warm up"])
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Reranker:
+    """
+    Front for the configured backend with an LRU cache of scores keyed by
+    (backend, normalized query, chunk content hash): repeated and follow-up
+    questions over the same documents only score chunks not seen before.
+    """
+
+    def __init__(self, backend: RerankerBackend, cache_max_entries: int):
+        self.backend = backend
+        self._cache_max = cache_max_entries
+        self._cache: "OrderedDict[tuple[str, str, str], float]" = OrderedDict()
+
+    async def rerank(self, query: str, chunks: List[dict[str, Any]], top_n: int) -> List[dict[str, Any]]:
+        """Chunks re-scored by relevance to query, best first, capped at top_n."""
+        question = normalize_question(query)
+        keys = [(self.backend.name, question, content_hash(chunk["text"])) for chunk in chunks]
+        scores: List[Optional[float]] = [self._cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        metrics.incr("reranker.cache_hits", len(chunks) - len(missing))
+        if missing:
+            fresh = await self.backend.score(query, [chunks[i]["text"] for i in missing])
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+                self._remember(keys[i], score)
+        ranked = sorted(
+            ({**chunk, "score": score} for chunk, score in zip(chunks, scores)),
+            key=lambda c: c["score"],
+            reverse=True,
+        )
+        return ranked[:top_n]
+
+    def _remember(self, key: tuple[str, str, str], score: float) -> None:
+        if self._cache_max <= 0:
+            return
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_max:
+            self._cache.popitem(last=False)
+
+    async def warm_up(self) -> None:
+        if hasattr(self.backend, "warm_up"):
+            await self.backend.warm_up()
+
+    def shutdown(self) -> None:
+        if hasattr(self.backend, "shutdown"):
+            self.backend.shutdown()
+
+
+def build_backend(name: str) -> RerankerBackend:
+    if name == "jina":
+        return JinaReranker(settings.RERANKER_MODEL)
+    if name == "local":
+        return LocalCrossEncoderReranker(
+            model_dir=settings.RERANKER_LOCAL_MODEL_DIR,
+            max_length=settings.RERANKER_LOCAL_MAX_LENGTH,
+            batch_size=settings.RERANKER_LOCAL_BATCH_SIZE,
+            workers=settings.RERANKER_LOCAL_WORKERS,
+            threads=settings.RERANKER_LOCAL_THREADS,
+        )
+    raise ValueError(f"Unknown reranker backend '{name}'")
+
+
+reranker = Reranker(build_backend(settings.RERANKER_BACKEND), settings.RERANKER_CACHE_MAX_ENTRIES)
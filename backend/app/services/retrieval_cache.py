@@ -0,0 +1,81 @@
+# app/services/retrieval_cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+CacheKey = tuple[str, tuple[str, ...], int, bool]
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class RetrievalCache:
+    """
+    In-process TTL + LRU cache of retrieval results (post-rerank context chunks).
+
+    Keyed by (normalized question, sorted doc_ids, top_k, reranker on/off), so
+    a workspace whose document set changes naturally misses. Entries are also
+    indexed by doc_id and dropped by invalidate_doc() when a document is
+    deleted, re-indexed or finishes ingesting — in this process directly, in
+    any other process through cache_invalidation (Postgres LISTEN/NOTIFY).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, tuple[float, List[dict[str, Any]]]]" = OrderedDict()
+        self._by_doc: dict[str, set[CacheKey]] = {}
+
+    @staticmethod
+    def key(question: str, doc_ids: Iterable[str], top_k: int, reranker: bool) -> CacheKey:
+        return normalize_question(question), tuple(sorted(set(doc_ids))), top_k, reranker
+
+    def get(self, key: CacheKey) -> Optional[List[dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            metrics.incr("retrieval_cache.misses")
+            return None
+        self._entries.move_to_end(key)
+        metrics.incr("retrieval_cache.hits")
+        # Callers may annotate results; never hand out the cached dicts themselves
+        return [dict(chunk) for chunk in entry[1]]
+
+    def put(self, key: CacheKey, chunks: List[dict[str, Any]]) -> None:
+        if self._max_entries <= 0 or not chunks:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self._ttl, [dict(chunk) for chunk in chunks])
+        for doc_id in key[1]:
+            self._by_doc.setdefault(doc_id, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_doc(self, doc_id: str) -> None:
+        for key in self._by_doc.pop(doc_id, set()):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_doc.clear()
+
+    def _remove(self, key: CacheKey) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        for doc_id in key[1]:
+            keys = self._by_doc.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_doc[doc_id]
+
+
+retrieval_cache = RetrievalCache(
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+    max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+)
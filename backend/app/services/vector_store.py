@@ -1,6 +1,17 @@
+import logging
+from typing import Any, Optional
+
 from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    BinaryQuantization, BinaryQuantizationConfig, CollectionParamsDiff, Disabled, Distance,
+    HnswConfigDiff, QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig,
+    ScalarType, SearchParams, VectorParams, VectorParamsDiff,
+)
+
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 qdrant_client = AsyncQdrantClient(
     url=settings.QDRANT_URL,
     api_key=settings.QDRANT_API_KEY,
@@ -9,3 +20,120 @@ qdrant_client = AsyncQdrantClient(
 
 COLLECTION_NAME = "user_notes"
 VECTOR_SIZE = settings.VECTOR_SIZE
+# Keyword payload indexes: 'source' (required for filtered search)
+# and 'content_hash' (cross-document duplicate lookup at ingestion)
+PAYLOAD_INDEXES = ("source", "content_hash")
+
+
+def _quantization_config() -> Optional[ScalarQuantization | BinaryQuantization]:
+    """Quantized copy of every vector, kept in RAM and searched first; None for plain float32."""
+    kind = settings.QDRANT_QUANTIZATION
+    if kind == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown QDRANT_QUANTIZATION '{kind}'")
+
+
+def _hnsw_config() -> HnswConfigDiff:
+    return HnswConfigDiff(m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT)
+
+
+# Passed to every search: candidates come from the quantized index, oversampled,
+# then rescored against the original vectors (read from disk when on_disk)
+SEARCH_PARAMS = SearchParams(
+    hnsw_ef=settings.QDRANT_HNSW_EF,
+    quantization=QuantizationSearchParams(
+        rescore=settings.QDRANT_RESCORE,
+        oversampling=settings.QDRANT_OVERSAMPLING,
+    ),
+)
+
+
+def _mode(config: Any) -> str:
+    if isinstance(config, ScalarQuantization):
+        return "scalar"
+    if isinstance(config, BinaryQuantization):
+        return "binary"
+    return "none"
+
+
+async def ensure_collection() -> None:
+    """
+    Create the collection as configured in Settings. An existing one is
+    brought in line with them only with QDRANT_MIGRATE_COLLECTION set.
+    Quantization, on-disk vectors/payload and HNSW parameters can all be
+    changed on a live collection: Qdrant rebuilds the affected segments in
+    the background while it keeps serving searches. The vector size and
+    distance cannot change; a mismatch means re-ingesting into a new
+    collection.
+    """
+    existing = await qdrant_client.get_collections()
+    if COLLECTION_NAME not in [c.name for c in existing.collections]:
+        await qdrant_client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config=VectorParams(
+                size=VECTOR_SIZE, distance=Distance.COSINE, on_disk=settings.QDRANT_VECTORS_ON_DISK
+            ),
+            hnsw_config=_hnsw_config(),
+            quantization_config=_quantization_config(),
+            on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD,
+        )
+        logger.info(
+            f"Created Qdrant collection '{COLLECTION_NAME}' "
+            f"(quantization={settings.QDRANT_QUANTIZATION}, vectors_on_disk={settings.QDRANT_VECTORS_ON_DISK})"
+        )
+    else:
+        await _migrate_collection()
+
+    for field_name in PAYLOAD_INDEXES:
+        try:
+            await qdrant_client.create_payload_index(
+                collection_name=COLLECTION_NAME,
+                field_name=field_name,
+                field_schema="keyword",
+            )
+            logger.info(f"Payload index on '{field_name}' ensured")
+        except Exception as e:
+            # Index may already exist — not an error
+            logger.info(f"Payload index on '{field_name}' already exists or skipped: {e}")
+
+
+async def _migrate_collection() -> None:
+    config = (await qdrant_client.get_collection(COLLECTION_NAME)).config
+    vectors = config.params.vectors
+    if isinstance(vectors, VectorParams) and vectors.size != VECTOR_SIZE:
+        raise RuntimeError(
+            f"Qdrant collection '{COLLECTION_NAME}' holds {vectors.size}-dim vectors but VECTOR_SIZE={VECTOR_SIZE}"
+        )
+
+    changes: dict[str, Any] = {}
+    quantization = _quantization_config()
+    if _mode(config.quantization_config) != settings.QDRANT_QUANTIZATION:
+        changes["quantization_config"] = quantization if quantization is not None else Disabled.DISABLED
+    if isinstance(vectors, VectorParams) and bool(vectors.on_disk) != settings.QDRANT_VECTORS_ON_DISK:
+        changes["vectors_config"] = {"": VectorParamsDiff(on_disk=settings.QDRANT_VECTORS_ON_DISK)}
+    hnsw = config.hnsw_config
+    if (hnsw.m, hnsw.ef_construct) != (settings.QDRANT_HNSW_M, settings.QDRANT_HNSW_EF_CONSTRUCT):
+        changes["hnsw_config"] = _hnsw_config()
+    if bool(config.params.on_disk_payload) != settings.QDRANT_ON_DISK_PAYLOAD:
+        changes["collection_params"] = CollectionParamsDiff(on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD)
+
+    if not changes:
+        logger.info(f"Qdrant collection '{COLLECTION_NAME}' already exists")
+        return
+    if not settings.QDRANT_MIGRATE_COLLECTION:
+        logger.warning(
+            f"Qdrant collection '{COLLECTION_NAME}' differs from Settings ({', '.join(sorted(changes))}); "
+            f"set QDRANT_MIGRATE_COLLECTION=true to migrate it"
+        )
+        return
+    await qdrant_client.update_collection(collection_name=COLLECTION_NAME, **changes)
+    logger.info(
+        f"Updated Qdrant collection '{COLLECTION_NAME}' ({', '.join(sorted(changes))}); "
+        f"segments are rebuilt in the background"
+    )
@@ -0,0 +1,126 @@
+# app/utils/archives.py
+"""
+Extraction of .zip / .tar.gz uploads for bulk ingestion. Members are copied
+to caller-chosen paths (never to their archive path, so "../" entries can't
+escape the work directory) with per-member and total size caps enforced
+while copying, so a compression bomb is stopped after reading at most the
+caps' worth of bytes.
+"""
+import os
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from typing import IO, Iterator
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar.gz", ".tgz")
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    """The archive as a whole is unreadable."""
+
+
+class ArchiveLimitError(ArchiveError):
+    """The archive has too many members or expands past the size cap."""
+
+
+@dataclass(slots=True)
+class ArchiveMember:
+    name: str  # path inside the archive
+    path: str | None = None  # extracted copy; None when the member was rejected
+    error: str | None = None
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_hidden(name: str) -> bool:
+    # Dotfiles and macOS resource forks (__MACOSX/._notes.md) are never user content
+    # ("./notes.md" from `tar -C dir .` is not hidden)
+    return any(part.startswith(".") or part == "__MACOSX" for part in name.split("/") if part not in ("", "."))
+
+
+def _open_members(archive_path: str, filename: str) -> Iterator[tuple[str, int, IO[bytes]]]:
+    """(name, declared size, open stream) for each regular file in the archive."""
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                with zf.open(info) as stream:
+                    yield info.filename, info.file_size, stream
+        return
+    with tarfile.open(archive_path, mode="r:gz") as tf:
+        for info in tf:
+            if not info.isfile():
+                continue  # directories, links and devices
+            stream = tf.extractfile(info)
+            if stream is not None:
+                with stream:
+                    yield info.name, info.size, stream
+
+
+def _copy_capped(stream: IO[bytes], path: str, cap: int) -> int:
+    """Copy stream to path, stopping once more than cap bytes have been read."""
+    written = 0
+    with open(path, "wb") as out:
+        while written <= cap:
+            block = stream.read(min(COPY_BLOCK_SIZE, cap + 1 - written))
+            if not block:
+                break
+            out.write(block)
+            written += len(block)
+    return written
+
+
+def extract_archive(
+    archive_path: str,
+    filename: str,
+    dest_dir: str,
+    *,
+    extensions: tuple[str, ...],
+    max_member_size: int,
+    max_members: int,
+    max_total_size: int,
+) -> list[ArchiveMember]:
+    """
+    Extract the members of a supported type into dest_dir. Members over
+    max_member_size or of another type are returned with an error instead;
+    exceeding max_members or max_total_size raises ArchiveLimitError. Blocking —
+    run it in a thread.
+    """
+    members: list[ArchiveMember] = []
+    total = 0
+    try:
+        for name, size, stream in _open_members(archive_path, filename):
+            if _is_hidden(name):
+                continue
+            if len(members) >= max_members:
+                raise ArchiveLimitError(f"{filename} has more than {max_members} files")
+            member = ArchiveMember(name.removeprefix("./"))
+            members.append(member)
+            if not name.lower().endswith(extensions):
+                member.error = "Unsupported file type"
+                continue
+            if size > max_member_size:
+                member.error = "File too large"
+                continue
+            # Keep the extension: parsers dispatch on it
+            path = os.path.join(dest_dir, f"member-{len(members)}{os.path.splitext(name)[1].lower()}")
+            remaining = max_total_size - total
+            written = _copy_capped(stream, path, min(max_member_size, remaining))
+            if written > max_member_size:
+                # Declared size lied
+                os.remove(path)
+                member.error = "File too large"
+                continue
+            if written > remaining:
+                raise ArchiveLimitError(f"{filename} expands to more than {max_total_size // (1024 * 1024)}MB")
+            total += written
+            member.path = path
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, RuntimeError, NotImplementedError) as e:
+        # RuntimeError: encrypted zip member; NotImplementedError: unsupported compression
+        raise ArchiveError(f"Could not read archive {filename}: {e}") from e
+    return members
+
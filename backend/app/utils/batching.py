@@ -0,0 +1,80 @@
+# app/utils/batching.py
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesces items submitted by concurrent coroutines into batched calls of
+    fn(items) -> results (aligned with items). A batch is sent once it holds
+    max_items, or max_wait_ms after its first item arrived, whichever comes
+    first; with max_wait_ms=0 it still picks up everything submitted in the
+    same event-loop iteration. At most max_concurrency batches run at once;
+    further full batches wait for a slot while new items keep joining the
+    next one. A failing call fails only the items of its batch.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[T]], Awaitable[List[R]]],
+        max_items: int,
+        max_wait_ms: float,
+        max_concurrency: int = 1,
+    ):
+        self._fn = fn
+        self._max_items = max(1, max_items)
+        self._max_wait = max(0.0, max_wait_ms) / 1000
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._pending: List[tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items: List[T]) -> List[R]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._pending.append((item, future))
+            futures.append(future)
+            if len(self._pending) >= self._max_items:
+                self._flush()
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[: self._max_items], self._pending[self._max_items :]
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple[T, asyncio.Future]]) -> None:
+        async with self._semaphore:
+            # Callers that gave up (cancelled) don't need their item computed
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                return
+            try:
+                results = await self._fn([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                # Only reached with undone futures if this task itself was cancelled
+                for _, future in batch:
+                    if not future.done():
+                        future.cancel()
@@ -0,0 +1,280 @@
+# app/utils/chunking.py
+"""
+Streaming chunkers used by ingestion. A chunker is fed text blocks in order
+and returns the chunks completed so far; finish() flushes the rest. Select
+one with Settings.CHUNKER ("structured" or "fixed"), or add a factory to
+CHUNKERS.
+"""
+import re
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterable, Callable, Iterable, Iterator, List, Protocol
+
+from app.core.config import settings
+from app.utils.tokens import chars_per_token
+
+MIN_CHUNK_CHARS = 200
+
+_FENCE = re.compile(r"\s{0,3}(```|~~~)")
+_HEADING = re.compile(r"(#{1,6})\s+(.+?)(?:\s+#+)?$")
+# Sentence ends, plus hard line breaks inside a paragraph (PDF text wraps lines)
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n")
+_LINE_BREAK = re.compile(r"\n")
+
+
+@dataclass(slots=True)
+class Chunk:
+    text: str
+    start: int  # character offsets into the concatenated blocks
+    end: int
+    page: int  # 1-based; counts form feeds, which pdfminer emits after each page
+    section: str = ""  # heading path at the chunk's start, e.g. "Setup > Install"
+
+
+class Chunker(Protocol):
+    def feed(self, block: str) -> List[Chunk]: ...
+
+    def finish(self) -> List[Chunk]: ...
+
+
+class FixedSizeChunker:
+    """
+    Fixed-size character windows with overlap (the original chunk_text
+    behaviour). Holds at most one block plus one chunk.
+    """
+
+    def __init__(self, chunk_size: int = 500, overlap: int = 50):
+        self._size = chunk_size
+        self._step = chunk_size - overlap
+        self._buf = ""
+        self._base = 0  # document offset of _buf[0]
+        self._page = 1
+        self._counted = 0  # position in _buf up to which form feeds are counted
+
+    def _emit(self, pos: int) -> Chunk:
+        self._page += self._buf.count("\f", self._counted, pos)
+        self._counted = pos
+        text = self._buf[pos : pos + self._size]
+        return Chunk(text, self._base + pos, self._base + pos + len(text), self._page)
+
+    def feed(self, block: str) -> List[Chunk]:
+        self._buf += block
+        out = []
+        pos = 0
+        while len(self._buf) - pos >= self._size:
+            out.append(self._emit(pos))
+            pos += self._step
+        self._page += self._buf.count("\f", self._counted, pos)
+        self._buf = self._buf[pos:]
+        self._base += pos
+        self._counted = 0
+        return out
+
+    def finish(self) -> List[Chunk]:
+        out = []
+        pos = 0
+        while pos < len(self._buf):
+            out.append(self._emit(pos))
+            pos += self._step
+        self._buf = ""
+        return out
+
+
+def _hard_split(text: str, start: int, end: int, max_chars: int) -> Iterator[tuple[str, int]]:
+    """Cut text[start:end] at whitespace (or max_chars if there is none) into pieces <= max_chars."""
+    while end - start > max_chars:
+        cut = text.rfind(" ", start, start + max_chars)
+        cut = start + max_chars if cut <= start else cut + 1
+        yield text[start:cut], start
+        start = cut
+    if end > start:
+        yield text[start:end], start
+
+
+def _split(text: str, pattern: re.Pattern, max_chars: int) -> Iterator[tuple[str, int]]:
+    """Contiguous (piece, offset) pairs of text, broken after each pattern match."""
+    pos = 0
+    for match in pattern.finditer(text):
+        yield from _hard_split(text, pos, match.end(), max_chars)
+        pos = match.end()
+    yield from _hard_split(text, pos, len(text), max_chars)
+
+
+class StructuredChunker:
+    """
+    Splits on Markdown headings, code fences and blank-line paragraphs, and
+    on sentences only when a paragraph alone is too large, then packs the
+    pieces into chunks of at most max_tokens (estimated for model). Chunks do
+    not overlap; a heading starts a new chunk once the current one holds a
+    quarter of the budget. Every chunk is a contiguous, trimmed slice of the
+    document. Linear time; holds at most one paragraph plus one chunk.
+    """
+
+    def __init__(self, max_tokens: int, model: str | None = None):
+        self._max = max(MIN_CHUNK_CHARS, int(max_tokens * chars_per_token(model)))
+        self._min = self._max // 4
+        self._tail = ""  # incomplete last line
+        self._offset = 0  # document offset of _tail
+        self._in_code = False
+        self._headings: List[tuple[int, str]] = []
+        # Current paragraph / code block
+        self._block: List[str] = []
+        self._block_start = 0
+        self._block_len = 0
+        self._block_code = False
+        # Current chunk
+        self._parts: List[str] = []
+        self._start = 0
+        self._len = 0
+        self._page = 1  # page at the start of the next chunk
+        self._chunk_page = 1
+        self._section = ""
+        self._out: List[Chunk] = []
+
+    def feed(self, block: str) -> List[Chunk]:
+        text = self._tail + block
+        base = self._offset
+        pos = 0
+        # Overlong lines (minified or single-line text) are cut every `limit`
+        # chars from the line start, so chunks don't depend on block sizes
+        limit = self._max * 4
+        while True:
+            nl = text.find("\n", pos, pos + limit)
+            if nl >= 0:
+                end = nl + 1
+            elif len(text) - pos > limit:
+                end = pos + limit
+            else:
+                break
+            self._line(text[pos:end], base + pos)
+            pos = end
+        self._tail = text[pos:]
+        self._offset = base + pos
+        out, self._out = self._out, []
+        return out
+
+    def finish(self) -> List[Chunk]:
+        if self._tail:
+            self._line(self._tail, self._offset)
+            self._offset += len(self._tail)
+            self._tail = ""
+        self._end_block()
+        self._emit()
+        out, self._out = self._out, []
+        return out
+
+    def _line(self, line: str, start: int) -> None:
+        if self._in_code:
+            self._block_add(line, start)
+            if _FENCE.match(line):
+                self._in_code = False
+                self._end_block()
+            elif self._block_len >= self._max:
+                self._end_block()
+            return
+
+        if _FENCE.match(line):
+            self._end_block()
+            self._in_code = True
+            self._block_add(line, start)
+            return
+
+        stripped = line.strip()
+        heading = _HEADING.match(stripped) if stripped.startswith("#") else None
+        if heading:
+            self._end_block()
+            level = len(heading.group(1))
+            while self._headings and self._headings[-1][0] >= level:
+                self._headings.pop()
+            self._headings.append((level, heading.group(2)))
+            if self._len >= self._min:
+                self._emit()
+            self._add(line, start)
+            return
+
+        if not stripped:
+            self._end_block()
+            self._add(line, start)
+            return
+
+        self._block_add(line, start)
+        if self._block_len >= self._max:
+            self._end_block()
+
+    def _block_add(self, line: str, start: int) -> None:
+        if not self._block:
+            self._block_start = start
+            self._block_code = self._in_code
+        self._block.append(line)
+        self._block_len += len(line)
+
+    def _end_block(self) -> None:
+        if not self._block:
+            return
+        text = "".join(self._block)
+        start = self._block_start
+        self._block, self._block_len = [], 0
+        if len(text) <= self._max:
+            self._add(text, start)
+            return
+        pattern = _LINE_BREAK if self._block_code else _SENTENCE_BREAK
+        for piece, offset in _split(text, pattern, self._max):
+            self._add(piece, start + offset)
+
+    def _add(self, piece: str, start: int) -> None:
+        if not self._parts:
+            if not piece.strip():
+                self._page += piece.count("\f")
+                return
+            self._start = start
+            self._chunk_page = self._page
+            self._section = " > ".join(title for _, title in self._headings)
+        elif self._len + len(piece) > self._max and piece.strip():
+            self._emit()
+            self._add(piece, start)
+            return
+        self._parts.append(piece)
+        self._len += len(piece)
+
+    def _emit(self) -> None:
+        if not self._parts:
+            return
+        raw = "".join(self._parts)
+        text = raw.strip()
+        lead = len(raw) - len(raw.lstrip())
+        if text:
+            start = self._start + lead
+            self._out.append(
+                Chunk(text, start, start + len(text), self._chunk_page + raw.count("\f", 0, lead), self._section)
+            )
+        self._page = self._chunk_page + raw.count("\f")
+        self._parts, self._len = [], 0
+
+
+CHUNKERS: dict[str, Callable[[], Chunker]] = {
+    "structured": lambda: StructuredChunker(settings.CHUNK_MAX_TOKENS, settings.EMBEDDING_MODEL),
+    "fixed": FixedSizeChunker,
+}
+
+
+def get_chunker(name: str | None = None) -> Chunker:
+    name = name or settings.CHUNKER
+    try:
+        return CHUNKERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown chunker '{name}'") from None
+
+
+def iter_chunks(blocks: Iterable[str], chunker: Chunker | None = None) -> Iterator[Chunk]:
+    chunker = chunker or get_chunker()
+    for block in blocks:
+        yield from chunker.feed(block)
+    yield from chunker.finish()
+
+
+async def aiter_chunks(blocks: AsyncIterable[str], chunker: Chunker | None = None) -> AsyncGenerator[Chunk, None]:
+    chunker = chunker or get_chunker()
+    async for block in blocks:
+        for chunk in chunker.feed(block):
+            yield chunk
+    for chunk in chunker.finish():
+        yield chunk
@@ -1,7 +1,57 @@
+import codecs
 import gzip
+import io
+import zlib
+from typing import Iterable, Iterator
+
+BLOCK_SIZE = 64 * 1024
+
 
 def compress_text(text: str) -> bytes:
     return gzip.compress(text.encode("utf-8"))
 
+
 def decompress_text(compressed: bytes) -> str:
-    return gzip.decompress(compressed).decode("utf-8")
\ No newline at end of file
+    return gzip.decompress(compressed).decode("utf-8")
+
+
+def compress_blocks(blocks: Iterable[str]) -> bytes:
+    """Gzip a stream of text blocks without ever joining them into one string."""
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb") as gz:
+        for block in blocks:
+            gz.write(block.encode("utf-8"))
+    return buf.getvalue()
+
+
+class TextCompressor:
+    """Push-style compress_blocks: write text as it becomes available, take the gzip bytes at the end."""
+
+    def __init__(self):
+        self._buf = io.BytesIO()
+        self._gz = gzip.GzipFile(fileobj=self._buf, mode="wb")
+
+    def write(self, text: str) -> None:
+        if text:
+            self._gz.write(text.encode("utf-8"))
+
+    def finish(self) -> bytes:
+        self._gz.close()
+        return self._buf.getvalue()
+
+
+def iter_decompressed_text(compressed: bytes, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Inverse of compress_blocks: yield text in blocks of at most block_size decompressed bytes."""
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(compressed)
+    for i in range(0, len(view), block_size):
+        data = view[i : i + block_size]
+        while data:
+            out = decompressor.decompress(data, block_size)
+            data = decompressor.unconsumed_tail
+            if out:
+                yield decoder.decode(out)
+    tail = decoder.decode(decompressor.flush(), final=True)
+    if tail:
+        yield tail
@@ -0,0 +1,90 @@
+# app/utils/dedup.py
+"""
+Duplicate detection for chunks before they are embedded: exact matches by
+hash of the normalized text, near-duplicates (boilerplate pages, repeated
+sections with small edits) by MinHash over word 3-shingles, looked up
+through LSH bands so each check compares against a handful of candidates
+instead of every earlier chunk.
+"""
+import hashlib
+import re
+from typing import Generic, Hashable, Optional, TypeVar
+
+import numpy as np
+
+K = TypeVar("K", bound=Hashable)
+
+_WORD = re.compile(r"\w+")
+SHINGLE_WORDS = 3
+MIN_MINHASH_WORDS = 8  # below this shingle sets are too small to compare; only exact matches count
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs at Jaccard 0.8 become candidates with p > 0.99
+ROWS = NUM_PERM // BANDS
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(0x5EED)  # fixed seed: signatures must match across processes
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def content_hash(text: str) -> str:
+    """Stable id of a chunk's normalized content (stored in the Qdrant payload)."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+
+def minhash(words: list[str]) -> np.ndarray:
+    shingles = {
+        " ".join(words[i : i + SHINGLE_WORDS]).encode("utf-8")
+        for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    digests = b"".join(hashlib.blake2b(s, digest_size=4).digest() for s in shingles)
+    hashes = np.frombuffer(digests, dtype=">u4").astype(np.uint64)
+    # a, b and hashes are < 2^32, so a * h + b cannot overflow uint64
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+class ChunkDeduper(Generic[K]):
+    """
+    Remembers the chunks seen so far (keyed by the caller's id) and reports,
+    for each new one, the key of an earlier chunk it duplicates — identical
+    after normalization, or with estimated shingle Jaccard similarity of at
+    least `similarity`. similarity >= 1 keeps exact matching only.
+    """
+
+    def __init__(self, similarity: float = 0.8):
+        self._similarity = similarity
+        self._exact: dict[str, K] = {}
+        self._signatures: dict[K, np.ndarray] = {}
+        self._bands: list[dict[bytes, list[K]]] = [{} for _ in range(BANDS)]
+
+    def check(self, key: K, text: str) -> Optional[K]:
+        digest = content_hash(text)
+        original = self._exact.get(digest)
+        if original is None:
+            original = self._near(key, text)
+        # Exact repeats of a collapsed chunk resolve straight to its original
+        self._exact[digest] = key if original is None else original
+        return original
+
+    def _near(self, key: K, text: str) -> Optional[K]:
+        words = _WORD.findall(text.lower())
+        if self._similarity >= 1 or len(words) < MIN_MINHASH_WORDS:
+            return None
+        signature = minhash(words)
+        bands = [signature[i * ROWS : (i + 1) * ROWS].tobytes() for i in range(BANDS)]
+        checked = set()
+        for band, value in zip(self._bands, bands):
+            for other in band.get(value, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if np.count_nonzero(self._signatures[other] == signature) >= self._similarity * NUM_PERM:
+                    return other
+        self._signatures[key] = signature
+        for band, value in zip(self._bands, bands):
+            band.setdefault(value, []).append(key)
+        return None
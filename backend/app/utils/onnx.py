@@ -0,0 +1,58 @@
+# app/utils/onnx.py
+"""
+ONNX Runtime model loading for the local (CPU) backends. onnxruntime and
+tokenizers are optional dependencies, imported only when a local backend
+is configured, so the default remote setup doesn't need them installed.
+
+A model directory holds model.onnx plus the Hugging Face tokenizer.json it
+was exported with (e.g. `optimum-cli export onnx --model <name> <dir>`).
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import numpy as np
+
+MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+@dataclass(slots=True)
+class OnnxModel:
+    session: Any  # onnxruntime.InferenceSession; run() is thread-safe
+    tokenizer: Any  # tokenizers.Tokenizer, truncating and padding to the longest input
+    input_names: tuple[str, ...]
+
+    def run(self, inputs: Sequence[str | tuple[str, str]]) -> tuple[list[np.ndarray], np.ndarray]:
+        """Tokenize a batch (texts, or (query, passage) pairs) and run it; returns (outputs, attention_mask)."""
+        encodings = self.tokenizer.encode_batch(list(inputs))
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+        }
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        return self.session.run(None, feed), attention_mask
+
+
+def load_onnx_model(model_dir: str, max_length: int, threads: int) -> OnnxModel:
+    try:
+        import onnxruntime
+        from tokenizers import Tokenizer
+    except ImportError as e:
+        raise RuntimeError(
+            "Local models need the optional packages onnxruntime and tokenizers "
+            "(pip install onnxruntime tokenizers)"
+        ) from e
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    session = onnxruntime.InferenceSession(
+        os.path.join(model_dir, MODEL_FILE), options, providers=["CPUExecutionProvider"]
+    )
+    tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+    tokenizer.enable_truncation(max_length=max_length)
+    tokenizer.enable_padding()
+    return OnnxModel(session, tokenizer, tuple(i.name for i in session.get_inputs()))
@@ -0,0 +1,253 @@
+# app/utils/parse_pool.py
+import asyncio
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncGenerator
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.utils.compression import TextCompressor, compress_blocks
+from app.utils.parser import BLOCK_SIZE, StreamingTextParser, count_pdf_pages, iter_file_blocks, iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_POLL_SECONDS = 0.05  # how often a queued task is checked for having been dispatched
+# A dispatched task may still wait in the executor's call queue (max_workers + 1 slots)
+# behind two rounds of other tasks, each cut off by its own alarm
+BACKSTOP_FACTOR = 3
+
+
+class ParseTimeoutError(Exception):
+    pass
+
+
+def _run_with_deadline(timeout: float, fn, *args):
+    """
+    Runs in a pool process: fn(*args), interrupted with ParseTimeoutError once
+    it has run for timeout seconds. The clock starts when this worker picks
+    the task up, and an overrun fails only this task; the worker lives on.
+    """
+    if not hasattr(signal, "setitimer"):
+        return fn(*args)
+
+    def expire(signum, frame):
+        raise ParseTimeoutError(f"took longer than {timeout:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _parse_file(file_path: str, filename: str) -> tuple[bytes, float]:
+    """Runs in a pool process: parse and gzip in one pass, returning only the compressed bytes."""
+    start = time.perf_counter()
+    compressed = compress_blocks(iter_file_blocks(file_path, filename))
+    return compressed, time.perf_counter() - start
+
+
+def _extract_pdf_range(file_path: str, start: int, end: int) -> tuple[list[str], float]:
+    """Runs in a pool process: extract pages [start, end) of a PDF."""
+    t0 = time.perf_counter()
+    pages = list(iter_pdf_pages(file_path, page_numbers=range(start, end)))
+    return pages, time.perf_counter() - t0
+
+
+class StreamingParse:
+    """
+    Incremental parse of a text upload while it is still being received (see
+    ParsePool.stream). The parser's state lives across feed() calls, so the
+    steps can't run in a pool process; each runs in a thread instead, under
+    the pool's limits: at most max_workers steps at once across all uploads,
+    and one timeout budget shared by every step of the file. A step checks a
+    cancel flag between BLOCK_SIZE slices, so a parse that overruns or whose
+    request goes away stops within one slice rather than holding its thread.
+    """
+
+    def __init__(self, filename: str, semaphore: asyncio.Semaphore, timeout: float):
+        self._filename = filename
+        self._parser = StreamingTextParser(filename)
+        self._compressor = TextCompressor()
+        self._semaphore = semaphore
+        self._timeout = timeout
+        self._elapsed = 0.0
+        self._cancelled = threading.Event()
+        self.cpu = 0.0
+
+    def _step(self, data: bytes, final: bool) -> float:
+        start = time.perf_counter()
+        for i in range(0, len(data), BLOCK_SIZE):
+            if self._cancelled.is_set():
+                break
+            self._compressor.write(self._parser.feed(data[i : i + BLOCK_SIZE]))
+        if final and not self._cancelled.is_set():
+            self._compressor.write(self._parser.finish())
+        return time.perf_counter() - start
+
+    async def feed(self, data: bytes, final: bool = False) -> None:
+        """Parse and gzip the next bytes of the file; final=True after the last ones."""
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                self.cpu += await asyncio.wait_for(
+                    asyncio.to_thread(self._step, data, final), max(0.0, self._timeout - self._elapsed)
+                )
+            except asyncio.TimeoutError:
+                self._cancelled.set()
+                metrics.incr("parse.timeouts")
+                raise ParseTimeoutError(f"Parsing {self._filename} took longer than {self._timeout:g}s")
+            except asyncio.CancelledError:
+                self._cancelled.set()
+                raise
+            finally:
+                self._elapsed += time.monotonic() - start
+
+    def finish(self) -> bytes:
+        """The gzip-compressed text, once feed(..., final=True) has returned."""
+        return self._compressor.finish()
+
+
+class ParsePool:
+    """
+    Managed ProcessPoolExecutor for CPU-heavy document parsing, so pdfminer
+    never runs on the event loop. Uses the spawn start method so children
+    don't inherit the parent's event loop, threads or sockets.
+
+    Each task's timeout is enforced inside the child from when a worker
+    picks it up, so an overrun fails that task alone. Only a parse stuck
+    where the alarm can't interrupt it (inside C code) is caught by the
+    parent's backstop, which tears the pool down (children terminated) and
+    recreates it. Work that hasn't started yet is cancelled along with the
+    awaiting request.
+    """
+
+    def __init__(self, max_workers: int, timeout: float, pdf_pages_per_task: int):
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._pdf_pages_per_task = pdf_pages_per_task
+        self._executor: ProcessPoolExecutor | None = None
+        self._stream_slots = asyncio.Semaphore(max_workers)
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        if self._executor is not executor:
+            return  # another caller already replaced it
+        # No public API to kill running workers; terminate them directly
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.start()
+
+    def _submit(self, fn, *args) -> tuple[Future, ProcessPoolExecutor]:
+        self.start()
+        executor = self._executor
+        return executor.submit(_run_with_deadline, self._timeout, fn, *args), executor
+
+    async def _result(self, future: Future, executor: ProcessPoolExecutor, what: str):
+        waiter = asyncio.wrap_future(future)
+        try:
+            # The backstop runs from dispatch, not submission: a task queued behind
+            # other parses must not time out (and restart the pool under them) unstarted
+            while not future.running() and not future.done():
+                await asyncio.wait((waiter,), timeout=DISPATCH_POLL_SECONDS)
+            return await asyncio.wait_for(waiter, self._timeout * BACKSTOP_FACTOR)
+        except ParseTimeoutError:
+            metrics.incr("parse.timeouts")
+            logger.warning(f"[ParsePool] parsing {what} exceeded {self._timeout:g}s")
+            raise ParseTimeoutError(f"Parsing {what} took longer than {self._timeout:g}s") from None
+        except asyncio.TimeoutError:
+            metrics.incr("parse.timeouts")
+            logger.warning(f"[ParsePool] parsing {what} is stuck past {self._timeout:g}s, restarting pool")
+            self._restart(executor)
+            raise ParseTimeoutError(f"Parsing {what} took longer than {self._timeout:g}s")
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+        except asyncio.CancelledError:
+            if future.cancelled() and not asyncio.current_task().cancelling():
+                # Dropped from the queue by another caller's pool restart, not by our caller
+                raise BrokenProcessPool(f"Parse pool restarted before {what} ran") from None
+            raise
+        finally:
+            # Queued work is dropped along with an awaiting request that goes away
+            waiter.cancel()
+
+    async def parse(self, file_path: str, filename: str) -> bytes:
+        """Parse a file to gzip-compressed text in a pool process."""
+        for attempt in range(2):
+            future, executor = self._submit(_parse_file, file_path, filename)
+            try:
+                compressed, elapsed = await self._result(future, executor, filename)
+            except BrokenProcessPool:
+                # Pool was torn down under us by another caller's timeout
+                if attempt:
+                    raise
+                continue
+            metrics.observe("parse.cpu", elapsed)
+            return compressed
+        raise RuntimeError("unreachable")
+
+    def stream(self, filename: str) -> StreamingParse:
+        """Incremental parse of a text-format upload, fed as its bytes arrive."""
+        return StreamingParse(filename, self._stream_slots, self._timeout)
+
+    async def iter_pdf_pages(self, file_path: str) -> AsyncGenerator[tuple[int, str], None]:
+        """
+        Page-parallel PDF extraction: page ranges are extracted concurrently
+        across the pool and (page_number, text) pairs are yielded strictly in
+        order (1-based) as soon as each range is ready. At most max_workers
+        ranges are submitted ahead, so a slow consumer holds at most that many
+        ranges of extracted text and none waits in the queue behind its own
+        file's ranges. Each range gets its own timeout once it is dispatched.
+        """
+        future, executor = self._submit(count_pdf_pages, file_path)
+        total = await self._result(future, executor, file_path)
+
+        per_task = self._pdf_pages_per_task
+        ranges = iter([(start, min(start + per_task, total)) for start in range(0, total, per_task)])
+        pending: deque = deque()
+        try:
+            while True:
+                while len(pending) < self._max_workers:
+                    nxt = next(ranges, None)
+                    if nxt is None:
+                        break
+                    pending.append((nxt[0], *self._submit(_extract_pdf_range, file_path, *nxt)))
+                if not pending:
+                    return
+                start, future, executor = pending.popleft()
+                pages, elapsed = await self._result(future, executor, f"{file_path} pages {start + 1}+")
+                metrics.observe("parse.cpu", elapsed)
+                for i, text in enumerate(pages):
+                    yield start + i + 1, text
+        finally:
+            for _, future, _ in pending:
+                future.cancel()
+
+
+parse_pool = ParsePool(
+    max_workers=settings.PARSE_POOL_WORKERS,
+    timeout=settings.PARSE_TIMEOUT_SECONDS,
+    pdf_pages_per_task=settings.PDF_PAGES_PER_TASK,
+)
@@ -1,66 +1,259 @@
+import codecs
 import logging
-from pdfminer.high_level import extract_text as extract_pdf_text
+from io import StringIO
+from typing import Container, Iterator
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
 from html.parser import HTMLParser
 
 logger = logging.getLogger(__name__)
 
+BLOCK_SIZE = 64 * 1024  # bytes decoded per block when streaming text formats
+SUPPORTED_EXTENSIONS = (".pdf", ".md", ".txt", ".html", ".htm")
 
-def parse_pdf(file_path: str) -> str:
+
+class UnprocessableDocumentError(ValueError):
+    """The document itself can't be ingested (unsupported format, no text); retrying won't help."""
+
+
+def iter_pdf_pages(file_path: str, page_numbers: Container[int] | None = None) -> Iterator[str]:
+    """
+    Yield the text of each PDF page in order (each ends with a form feed,
+    exactly as pdfminer's extract_text would produce), so callers never
+    hold more than one page of extracted text at a time.
+    page_numbers (zero-based) restricts extraction to a subset of pages.
+    """
+    empty = True
     try:
-        text = extract_pdf_text(file_path) or ""
-        if not text.strip():
-            logger.warning(f"pdfminer returned empty text for {file_path} — may be a scanned/image PDF")
-        return text
+        with open(file_path, "rb") as fp, StringIO() as output:
+            rsrcmgr = PDFResourceManager(caching=True)
+            device = TextConverter(rsrcmgr, output, laparams=LAParams())
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
+            for page in PDFPage.get_pages(fp, page_numbers, caching=True):
+                interpreter.process_page(page)
+                text = output.getvalue()
+                output.seek(0)
+                output.truncate()
+                if text.strip():
+                    empty = False
+                yield text
     except Exception as e:
         logger.exception(f"PDF parsing failed for {file_path}: {e}")
         raise
+    if empty and page_numbers is None:
+        logger.warning(f"pdfminer returned empty text for {file_path} — may be a scanned/image PDF")
 
 
-def parse_markdown(file_bytes: bytes) -> str:
-    return file_bytes.decode("utf-8", errors="ignore")
+def count_pdf_pages(file_path: str) -> int:
+    """Walk the page tree without layout analysis — cheap compared to extraction."""
+    with open(file_path, "rb") as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp, caching=False))
 
 
-def parse_text(file_bytes: bytes) -> str:
-    for encoding in ("utf-8", "latin-1", "cp1252"):
+def parse_pdf(file_path: str) -> str:
+    return "".join(iter_pdf_pages(file_path))
+
+
+def _iter_decoded(file_bytes: bytes, encoding: str, errors: str = "strict") -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    view = memoryview(file_bytes)
+    for i in range(0, len(view), BLOCK_SIZE):
+        block = decoder.decode(view[i : i + BLOCK_SIZE])
+        if block:
+            yield block
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_markdown_blocks(file_bytes: bytes) -> Iterator[str]:
+    return _iter_decoded(file_bytes, "utf-8", errors="ignore")
+
+
+def iter_text_blocks(file_bytes: bytes) -> Iterator[str]:
+    # Validate the encoding in a discard pass so decoding stays streaming.
+    # latin-1 maps every byte, so the loop always settles on an encoding.
+    for encoding in ("utf-8", "latin-1"):
         try:
-            return file_bytes.decode(encoding)
+            for _ in _iter_decoded(file_bytes, encoding):
+                pass
         except UnicodeDecodeError:
             continue
+        return _iter_decoded(file_bytes, encoding)
+    return _iter_decoded(file_bytes, "utf-8", errors="ignore")
+
+
+def parse_markdown(file_bytes: bytes) -> str:
     return file_bytes.decode("utf-8", errors="ignore")
 
 
+def parse_text(file_bytes: bytes) -> str:
+    return "".join(iter_text_blocks(file_bytes))
+
+
 class _HTMLTextExtractor(HTMLParser):
     SKIP_TAGS = {"script", "style", "head", "meta", "link"}
 
     def __init__(self):
         super().__init__()
         self._parts: list[str] = []
+        # Text of the current node; a node may arrive over several feed() calls
+        self._pending: list[str] = []
         self._skip = False
         self._skip_depth = 0
 
+    def _flush(self):
+        if self._pending:
+            stripped = "".join(self._pending).strip()
+            self._pending = []
+            if stripped:
+                self._parts.append(stripped)
+
     def handle_starttag(self, tag, _attrs):
+        self._flush()
         if tag in self.SKIP_TAGS:
             self._skip = True
             self._skip_depth += 1
 
     def handle_endtag(self, tag):
+        self._flush()
         if tag in self.SKIP_TAGS and self._skip_depth > 0:
             self._skip_depth -= 1
             if self._skip_depth == 0:
                 self._skip = False
 
+    def handle_comment(self, _data):
+        self._flush()
+
+    def handle_decl(self, _decl):
+        self._flush()
+
+    def handle_pi(self, _data):
+        self._flush()
+
     def handle_data(self, data):
         if not self._skip:
-            stripped = data.strip()
-            if stripped:
-                self._parts.append(stripped)
+            self._pending.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
 
     def get_text(self) -> str:
+        self._flush()
         return "\n".join(self._parts)
 
+    def drain(self) -> list[str]:
+        """Return and clear the text nodes completed so far."""
+        parts, self._parts = self._parts, []
+        return parts
 
-def parse_html(file_bytes: bytes) -> str:
-    raw = file_bytes.decode("utf-8", errors="ignore")
+
+def iter_html_blocks(file_bytes: bytes) -> Iterator[str]:
+    """Feed the HTML parser block by block, yielding text as it is extracted."""
     extractor = _HTMLTextExtractor()
-    extractor.feed(raw)
-    return extractor.get_text()
+    first = True
+    for block in _iter_decoded(file_bytes, "utf-8", errors="ignore"):
+        extractor.feed(block)
+        parts = extractor.drain()
+        if parts:
+            yield ("" if first else "\n") + "\n".join(parts)
+            first = False
+    extractor.close()
+    parts = extractor.drain()
+    if parts:
+        yield ("" if first else "\n") + "\n".join(parts)
+
+
+def parse_html(file_bytes: bytes) -> str:
+    return "".join(iter_html_blocks(file_bytes))
+
+
+class _Utf8OrLatin1Decoder:
+    """
+    Incremental decoder for .txt uploads read off the network: UTF-8, switching
+    to Latin-1 from the first invalid byte on. (iter_text_blocks validates the
+    whole file first, which needs the bytes in hand; for Latin-1 files the two
+    agree, since the bytes before the first invalid one are ASCII in practice.)
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        try:
+            return self._decoder.decode(data, final)
+        except UnicodeDecodeError as e:
+            # e.object is the decoder's pending bytes + data
+            head = e.object[: e.start].decode("utf-8")
+            self._decoder = codecs.getincrementaldecoder("latin-1")()
+            return head + self._decoder.decode(e.object[e.start :], final)
+
+
+class StreamingTextParser:
+    """
+    Push-style counterpart of iter_file_blocks for the text formats: feed raw
+    bytes as they arrive and get back the text extracted so far, so an upload
+    can be parsed while it is still being received.
+    """
+
+    def __init__(self, filename: str):
+        name = filename.lower()
+        if name.endswith((".html", ".htm")):
+            self._html: _HTMLTextExtractor | None = _HTMLTextExtractor()
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        elif name.endswith(".txt"):
+            self._html = None
+            self._decoder = _Utf8OrLatin1Decoder()
+        elif name.endswith(".md"):
+            self._html = None
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        else:
+            raise UnprocessableDocumentError(f"Unsupported text format: {filename}")
+        self._first = True
+
+    def _html_text(self) -> str:
+        parts = self._html.drain()
+        if not parts:
+            return ""
+        text = ("" if self._first else "\n") + "\n".join(parts)
+        self._first = False
+        return text
+
+    def feed(self, data: bytes) -> str:
+        text = self._decoder.decode(data)
+        if self._html is None:
+            return text
+        if text:
+            self._html.feed(text)
+        return self._html_text()
+
+    def finish(self) -> str:
+        text = self._decoder.decode(b"", final=True)
+        if self._html is None:
+            return text
+        if text:
+            self._html.feed(text)
+        self._html.close()
+        return self._html_text()
+
+
+def iter_file_blocks(file_path: str, filename: str) -> Iterator[str]:
+    """Dispatch on the original filename's extension to the matching block parser."""
+    name = filename.lower()
+    if name.endswith(".pdf"):
+        yield from iter_pdf_pages(file_path)
+        return
+    if not name.endswith(SUPPORTED_EXTENSIONS):
+        raise UnprocessableDocumentError(f"Unsupported file type: {filename}")
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    if name.endswith((".html", ".htm")):
+        yield from iter_html_blocks(raw)
+    elif name.endswith(".txt"):
+        yield from iter_text_blocks(raw)
+    else:
+        yield from iter_markdown_blocks(raw)
@@ -0,0 +1,29 @@
+CHARS_PER_TOKEN = 4  # rough average for BPE/SentencePiece vocabularies on English text
+
+# Chars per token by OpenRouter model prefix; larger vocabularies pack more text per token
+MODEL_CHARS_PER_TOKEN = (
+    ("meta-llama/llama-3", 4.2),  # 128k-entry tiktoken-style vocab
+    ("openai/", 4.0),
+    ("qwen/", 3.8),
+    ("deepseek/", 3.8),
+    ("google/", 3.8),
+    ("mistralai/", 3.5),
+    ("anthropic/", 3.5),
+    ("meta-llama/", 3.5),  # Llama 2 era 32k SentencePiece vocab
+)
+
+
+def chars_per_token(model: str | None = None) -> float:
+    if model:
+        name = model.lower()
+        for prefix, ratio in MODEL_CHARS_PER_TOKEN:
+            if name.startswith(prefix):
+                return ratio
+    return CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str, model: str | None = None) -> int:
+    """Cheap tokenizer-free token estimate, good enough for request sizing."""
+    if model is None:
+        return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+    return max(1, int(len(text) / chars_per_token(model) + 0.999))
@@ -0,0 +1,145 @@
+# app/utils/upload_stream.py
+"""
+Reads the file field of a multipart/form-data request straight off the
+request stream, without Starlette's form parsing (which spools every file
+to a temporary file before the endpoint runs). The caller sees each part's
+filename before any of its bytes, then consumes the bytes as they arrive,
+so it can reject a file by name or size without storing it.
+"""
+from typing import AsyncGenerator, AsyncIterator
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+
+class UploadStreamError(ValueError):
+    """The request body is not a multipart form with the expected file field."""
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StreamedUpload:
+    """
+    Usage:
+        upload = StreamedUpload(request, "file", max_size)
+        filename = await upload.open()
+        async for data in upload.chunks():
+            ...
+    Other form fields before the file are skipped; anything after it is never read.
+    For a field repeated once per file, iterate files() instead of calling open();
+    bytes of a file whose chunks() aren't read are skipped. max_total caps the
+    file bytes of the whole request, read or skipped.
+    """
+
+    def __init__(self, request: Request, field: str, max_size: int, max_total: int | None = None):
+        self._request = request
+        self._field = field
+        self._max_size = max_size
+        self._max_total = max_total
+        self._events: list[tuple[str, object]] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._stream: AsyncIterator[tuple[str, object]] | None = None
+        self.filename: str | None = None
+        self.size = 0
+        self.received = 0  # file bytes of all parts so far
+
+    # python-multipart callbacks: buffer events until the current request chunk is parsed
+    def _on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        self._events.append(("headers", parse_options_header(self._disposition)[1]))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self.received += end - start
+        self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self) -> None:
+        self._events.append(("end", None))
+
+    async def _iter_events(self) -> AsyncGenerator[tuple[str, object], None]:
+        content_type, params = parse_options_header(self._request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadStreamError("Expected a multipart/form-data upload")
+        parser = MultipartParser(
+            params[b"boundary"],
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+            },
+        )
+        async for chunk in self._request.stream():
+            try:
+                parser.write(chunk)
+            except Exception as e:
+                raise UploadStreamError(f"Malformed multipart body: {e}") from e
+            if self._max_total is not None and self.received > self._max_total:
+                raise UploadTooLarge(f"Upload exceeds {self._max_total} bytes")
+            events, self._events = self._events, []
+            for event in events:
+                yield event
+        parser.finalize()
+        for event in self._events:
+            yield event
+
+    def _file_name(self, disposition: dict) -> str | None:
+        """Filename of a part of the file field, None for any other part."""
+        if disposition.get(b"name", b"").decode("utf-8", "replace") != self._field or b"filename" not in disposition:
+            return None
+        return disposition[b"filename"].decode("utf-8", "replace")
+
+    async def open(self) -> str:
+        """Read up to the file part's headers and return its filename ("" if the client sent none)."""
+        self._stream = self._iter_events()
+        async for kind, value in self._stream:
+            if kind == "headers" and (filename := self._file_name(value)) is not None:
+                self.filename = filename
+                return self.filename
+        raise UploadStreamError(f"No '{self._field}' file in the upload")
+
+    async def files(self) -> AsyncGenerator[str, None]:
+        """Filename of each file part of the field in turn; chunks() reads the current one."""
+        self._stream = self._iter_events()
+        async for kind, value in self._stream:
+            if kind == "headers" and (filename := self._file_name(value)) is not None:
+                self.filename = filename
+                self.size = 0
+                yield filename
+
+    async def chunks(self, max_size: int | None = None) -> AsyncGenerator[bytes, None]:
+        """
+        The current file's bytes as they arrive; raises UploadTooLarge as soon
+        as max_size (default: the constructor's) is crossed.
+        """
+        if self._stream is None:
+            raise RuntimeError("open() must be called first")
+        limit = self._max_size if max_size is None else max_size
+        async for kind, value in self._stream:
+            if kind == "end":
+                return
+            if kind == "data":
+                self.size += len(value)
+                if self.size > limit:
+                    raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+                yield value
+        raise UploadStreamError("Upload ended before the file was complete")
@@ -12,12 +12,20 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
-from qdrant_client.models import VectorParams, Distance
 
 from app.api import upload, chat, status, auth, documents, user_api_key, feedback, conversations
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.db.session import get_db
-from app.services.vector_store import qdrant_client, COLLECTION_NAME, VECTOR_SIZE
+from app.services.cache_invalidation import invalidation_listener
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_provider import embedding_provider
+from app.services.http_clients import http_clients
+from app.services.ingestion_queue import start_workers, stop_workers
+from app.services.message_writer import message_writer
+from app.services.reranker import reranker
+from app.utils.parse_pool import parse_pool
+from app.services.vector_store import ensure_collection
 
 load_dotenv()
 
@@ -30,32 +38,36 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Ensure Qdrant collection exists at startup
-    existing = await qdrant_client.get_collections()
-    existing_names = [c.name for c in existing.collections]
-    if COLLECTION_NAME not in existing_names:
-        await qdrant_client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
-        )
-        logger.info(f"Created Qdrant collection '{COLLECTION_NAME}'")
-    else:
-        logger.info(f"Qdrant collection '{COLLECTION_NAME}' already exists")
-
-    # Ensure payload index on 'source' field exists (required for filtered search)
-    try:
-        await qdrant_client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="source",
-            field_schema="keyword",
-        )
-        logger.info("Payload index on 'source' ensured")
-    except Exception as e:
-        # Index may already exist — not an error
-        logger.info(f"Payload index on 'source' already exists or skipped: {e}")
+    # Create the Qdrant collection, or migrate it to the configured quantization/storage/HNSW settings
+    await ensure_collection()
+
+    parse_pool.start()
+    http_clients.start()
+    message_writer.start()
+    if settings.RETRIEVAL_CACHE_LISTEN:
+        invalidation_listener.start()
+    # Load a local embedding model before serving; unlike the reranker there is no fallback
+    await embedding_provider.warm_up()
+    if settings.RERANKING_ENABLED:
+        # Load a local reranker model now rather than on the first workspace question
+        try:
+            await reranker.warm_up()
+        except Exception as e:
+            logger.error(f"Reranker warm-up failed, workspace chat will fall back to vector scores: {e}")
+
+    # Inline ingestion workers; scale out separately with `python worker.py`
+    workers = start_workers(settings.INGESTION_INLINE_WORKERS)
 
     yield
 
+    await stop_workers(workers)
+    await message_writer.aclose()
+    await invalidation_listener.aclose()
+    reranker.shutdown()
+    await embedding_provider.aclose()
+    await http_clients.aclose()
+    parse_pool.shutdown()
+
 
 limiter = Limiter(key_func=get_remote_address)
 
@@ -98,3 +110,10 @@ async def health(db: AsyncSession = Depends(get_db)):
         return {"status": "ok", "db": "connected"}
     except Exception:
         raise HTTPException(status_code=503, detail="Database unavailable")
+
+
+@app.get("/metrics", tags=["Health"])
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    snapshot["embedding_cache"] = embedding_cache.stats()
+    return snapshot
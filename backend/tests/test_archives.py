@@ -0,0 +1,124 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from app.utils.archives import ArchiveError, ArchiveLimitError, extract_archive
+
+EXTENSIONS = (".md", ".txt")
+MB = 1024 * 1024
+
+
+def _zip(path, files: dict[str, bytes]) -> str:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return str(path)
+
+
+def _tar_gz(path, files: dict[str, bytes], symlinks: dict[str, str] | None = None) -> str:
+    with tarfile.open(path, "w:gz") as tf:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+        for name, target in (symlinks or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tf.addfile(info)
+    return str(path)
+
+
+def _extract(archive: str, dest, **limits):
+    limits = {"max_member_size": MB, "max_members": 10, "max_total_size": 10 * MB, **limits}
+    return extract_archive(archive, os.path.basename(archive), str(dest), extensions=EXTENSIONS, **limits)
+
+
+@pytest.fixture
+def dest(tmp_path):
+    path = tmp_path / "out"
+    path.mkdir()
+    return path
+
+
+def test_members_are_extracted_inside_dest(tmp_path, dest):
+    archive = _zip(
+        tmp_path / "a.zip",
+        {
+            "notes/a.md": b"# A",
+            "../escape.txt": b"up",
+            "image.png": b"\x89PNG",
+            ".hidden.md": b"x",
+            "__MACOSX/._a.md": b"x",
+        },
+    )
+
+    members = _extract(archive, dest)
+
+    by_name = {m.name: m for m in members}
+    # "../" paths are skipped like other dot-prefixed names
+    assert set(by_name) == {"notes/a.md", "image.png"}
+    assert not (tmp_path / "escape.txt").exists()
+    assert by_name["image.png"].error == "Unsupported file type" and by_name["image.png"].path is None
+    path = by_name["notes/a.md"].path
+    assert os.path.dirname(path) == str(dest)
+    with open(path, "rb") as f:
+        assert f.read() == b"# A"
+
+
+@pytest.mark.parametrize("make", [_zip, _tar_gz])
+def test_member_count_cap(tmp_path, dest, make):
+    files = {f"{i}.md": b"x" for i in range(3)}
+    # Hidden files are skipped, not counted
+    files[".DS_Store"] = b"x"
+    archive = make(tmp_path / ("a.zip" if make is _zip else "a.tar.gz"), files)
+
+    assert len(_extract(archive, dest, max_members=3)) == 3
+    with pytest.raises(ArchiveLimitError):
+        _extract(archive, dest, max_members=2)
+
+
+@pytest.mark.parametrize("make", [_zip, _tar_gz])
+def test_total_size_cap(tmp_path, dest, make):
+    archive = make(tmp_path / ("a.zip" if make is _zip else "a.tar.gz"), {f"{i}.md": b"x" * 400 for i in range(3)})
+
+    assert all(m.path for m in _extract(archive, dest, max_total_size=1200))
+    with pytest.raises(ArchiveLimitError):
+        _extract(archive, dest, max_total_size=1199)
+
+
+def test_oversized_member_is_rejected_alone(tmp_path, dest):
+    archive = _zip(tmp_path / "a.zip", {"big.md": b"x" * 2000, "small.md": b"y"})
+
+    members = {m.name: m for m in _extract(archive, dest, max_member_size=1000)}
+
+    assert members["big.md"].error == "File too large" and members["big.md"].path is None
+    assert members["small.md"].path is not None
+
+
+def test_compression_bomb_stops_at_the_total_cap(tmp_path, dest):
+    archive = _zip(tmp_path / "bomb.zip", {"bomb.txt": b"\0" * (50 * MB)})
+    assert os.path.getsize(archive) < MB
+
+    with pytest.raises(ArchiveLimitError):
+        _extract(archive, dest, max_member_size=100 * MB, max_total_size=MB)
+
+    # At most one byte past the cap was ever written
+    assert all(os.path.getsize(dest / name) <= MB + 1 for name in os.listdir(dest))
+
+
+def test_links_in_tar_are_skipped(tmp_path, dest):
+    archive = _tar_gz(tmp_path / "a.tar.gz", {"a.md": b"# A"}, symlinks={"passwd.md": "/etc/passwd"})
+
+    assert [m.name for m in _extract(archive, dest)] == ["a.md"]
+
+
+def test_corrupt_archive(tmp_path, dest):
+    archive = tmp_path / "broken.zip"
+    archive.write_bytes(b"PK\x03\x04 not really a zip")
+
+    with pytest.raises(ArchiveError):
+        _extract(str(archive), dest)
@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+from app.utils.chunking import FixedSizeChunker, StructuredChunker, iter_chunks
+
+# StructuredChunker(1) packs at most MIN_CHUNK_CHARS (200) characters per chunk
+SMALL = 1
+
+
+def _blocks(text: str, sizes: list[int]) -> list[str]:
+    blocks, pos, i = [], 0, 0
+    while pos < len(text):
+        blocks.append(text[pos : pos + sizes[i % len(sizes)]])
+        pos += sizes[i % len(sizes)]
+        i += 1
+    return blocks
+
+
+def _random_document(rng: random.Random) -> str:
+    pieces = [
+        "Alpha beta gamma.", "Delta!", "epsilon?", "\n", "\n\n", "# Title\n", "## Part\n",
+        "```\n", "\f", "x" * 900, "   ", "- item\n",
+    ]
+    return " ".join(rng.choice(pieces) for _ in range(400))
+
+
+def _check_offsets_and_pages(document: str, chunks) -> None:
+    previous_end = 0
+    for chunk in chunks:
+        assert document[chunk.start : chunk.end] == chunk.text
+        assert chunk.start >= previous_end
+        assert chunk.page == document.count("\f", 0, chunk.start) + 1
+        previous_end = chunk.end
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_structured_chunks_are_trimmed_contiguous_slices(seed):
+    rng = random.Random(seed)
+    document = _random_document(rng)
+    sizes = [rng.randint(1, 300) for _ in range(50)]
+
+    chunks = list(iter_chunks(_blocks(document, sizes), StructuredChunker(SMALL)))
+
+    _check_offsets_and_pages(document, chunks)
+    for chunk in chunks:
+        assert chunk.text == chunk.text.strip()
+    # Nothing but whitespace is left out between chunks
+    covered = "".join(chunk.text for chunk in chunks)
+    assert "".join(covered.split()) == "".join(document.split())
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fixed_size_chunks_keep_offsets_and_pages(seed):
+    rng = random.Random(seed)
+    document = _random_document(rng)
+    sizes = [rng.randint(1, 300) for _ in range(50)]
+
+    chunks = list(iter_chunks(_blocks(document, sizes), FixedSizeChunker(chunk_size=500, overlap=50)))
+
+    assert [chunk.start for chunk in chunks] == list(range(0, len(document), 450))
+    for chunk in chunks:
+        assert document[chunk.start : chunk.end] == chunk.text
+        assert chunk.page == document.count("\f", 0, chunk.start) + 1
+        assert len(chunk.text) == min(500, len(document) - chunk.start)
+
+
+@pytest.mark.parametrize("chunker", [lambda: StructuredChunker(SMALL), FixedSizeChunker])
+def test_chunks_do_not_depend_on_block_boundaries(chunker):
+    document = _random_document(random.Random(99))
+
+    whole = list(iter_chunks([document], chunker()))
+    bytewise = list(iter_chunks(list(document), chunker()))
+
+    assert bytewise == whole
+
+
+def test_form_feeds_number_pages():
+    pages = [f"Page {n} text. " * 20 for n in range(1, 6)]
+    document = "\f".join(pages) + "\f"
+
+    chunks = list(iter_chunks([document], StructuredChunker(SMALL)))
+
+    for chunk in chunks:
+        assert chunk.text.startswith(f"Page {chunk.page} text.")
+    assert {chunk.page for chunk in chunks} == {1, 2, 3, 4, 5}
+
+
+def test_sections_follow_heading_levels():
+    body = "Some words here. " * 5 + "\n\n"
+    document = (
+        "# Setup\n\n" + body
+        + "## Install\n\n" + body
+        + "## Configure\n\n" + body
+        + "# Usage\n\n" + body
+    )
+
+    chunks = list(iter_chunks([document], StructuredChunker(SMALL)))
+
+    # Each section fits a chunk and holds more than a quarter of one, so each heading starts a chunk
+    assert [chunk.section for chunk in chunks] == ["Setup", "Setup > Install", "Setup > Configure", "Usage"]
+    assert [chunk.text.split("\n")[0] for chunk in chunks] == ["# Setup", "## Install", "## Configure", "# Usage"]
+
+
+def test_fenced_code_is_not_split_on_headings_or_blank_lines():
+    code = "```python\n# not a heading\n\nx = 1\n```\n"
+    document = "# Guide\n\nIntro.\n\n" + code + "\nAfter the code.\n"
+
+    chunks = list(iter_chunks([document], StructuredChunker(SMALL)))
+
+    assert [chunk.section for chunk in chunks] == ["Guide"]
+    assert code.strip() in chunks[0].text
+
+
+def test_oversized_code_block_is_split_on_lines():
+    lines = [f"value_{i} = {i}\n" for i in range(60)]
+    document = "```\n" + "".join(lines) + "```\n"
+
+    chunks = list(iter_chunks([document], StructuredChunker(SMALL)))
+
+    assert len(chunks) > 1
+    _check_offsets_and_pages(document, chunks)
+    for chunk in chunks:
+        assert len(chunk.text) <= 200
+        # Every cut falls at a line end
+        assert document[chunk.end] == "\n"
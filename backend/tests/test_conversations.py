@@ -0,0 +1,209 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.conversations import get_conversation, list_conversations
+from app.db.base import Base
+from app.models.conversation import Conversation
+from app.models.conversation_message import ConversationMessage
+from app.models.document import Document
+from app.models.user import User
+
+pytest.importorskip("aiosqlite")
+
+USER = "user@example.com"
+T0 = datetime(2025, 1, 1, 12, 0, 0)
+TABLES = [User.__table__, Document.__table__, Conversation.__table__, ConversationMessage.__table__]
+
+
+def _run(scenario):
+    """Run scenario(session) against a fresh in-memory database."""
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                await scenario(session)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def _conversation(id: str, updated_at: datetime, user: str = USER) -> Conversation:
+    return Conversation(
+        id=id, user_email=user, title=id, scope="workspace", created_at=T0, updated_at=updated_at
+    )
+
+
+async def _list_pages(session, limit: int, view: str = "full") -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        rows = await list_conversations(
+            response=response, cursor=cursor, limit=limit, view=view, user=USER, db=session
+        )
+        pages.append([row["id"] for row in rows])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+# ---------- conversation list (updated_at, id) cursor ----------
+
+
+async def _seed_conversations(session) -> list[str]:
+    """Seven conversations, three of them updated at the same instant; returns ids newest first."""
+    updated = {
+        "c1": T0,
+        "c2": T0 + timedelta(minutes=1),
+        "c3": T0 + timedelta(minutes=2),
+        "c4": T0 + timedelta(minutes=2),
+        "c5": T0 + timedelta(minutes=2),
+        "c6": T0 + timedelta(minutes=3),
+        "c7": T0 + timedelta(minutes=4),
+    }
+    session.add_all([_conversation(id, at) for id, at in updated.items()])
+    session.add(_conversation("other", T0 + timedelta(minutes=9), user="other@example.com"))
+    await session.commit()
+    return sorted(updated, key=lambda id: (updated[id], id), reverse=True)
+
+
+@pytest.mark.parametrize("view", ["full", "light"])
+@pytest.mark.parametrize("limit", [1, 2, 3, 6])
+def test_conversation_pages_cover_the_list_once_in_order(view, limit):
+    async def scenario(session):
+        expected = await _seed_conversations(session)
+
+        pages = await _list_pages(session, limit, view)
+
+        assert [id for page in pages for id in page] == expected
+        assert all(len(page) == limit for page in pages[:-1])
+        assert 1 <= len(pages[-1]) <= limit
+
+    _run(scenario)
+
+
+def test_conversation_page_of_exactly_the_remaining_rows_has_no_cursor():
+    async def scenario(session):
+        expected = await _seed_conversations(session)
+
+        pages = await _list_pages(session, limit=len(expected))
+
+        assert pages == [expected]
+
+    _run(scenario)
+
+
+def test_conversation_list_without_limit_is_complete():
+    async def scenario(session):
+        expected = await _seed_conversations(session)
+        response = Response()
+
+        rows = await list_conversations(
+            response=response, cursor=None, limit=None, view="full", user=USER, db=session
+        )
+
+        assert [row["id"] for row in rows] == expected
+        assert "X-Next-Cursor" not in response.headers
+
+    _run(scenario)
+
+
+def test_invalid_conversation_cursor_is_rejected():
+    async def scenario(session):
+        with pytest.raises(HTTPException) as error:
+            await list_conversations(
+                response=Response(), cursor="not-a-cursor", limit=2, view="full", user=USER, db=session
+            )
+        assert error.value.status_code == 400
+
+    _run(scenario)
+
+
+# ---------- message history before_id / after_id ----------
+
+
+async def _seed_messages(session) -> list[int]:
+    """Messages whose id order differs from their time order, with ties; returns ids oldest first."""
+    session.add(_conversation("c1", T0))
+    offsets = [0, 2, 1, 1, 3, 3, 5]  # minutes after T0, in insertion (id) order
+    messages = [
+        ConversationMessage(
+            conversation_id="c1", role="user", content=f"m{i}", created_at=T0 + timedelta(minutes=minutes)
+        )
+        for i, minutes in enumerate(offsets)
+    ]
+    session.add_all(messages)
+    session.add(_conversation("c2", T0))
+    session.add(ConversationMessage(conversation_id="c2", role="user", content="elsewhere", created_at=T0))
+    await session.commit()
+    return [m.id for m in sorted(messages, key=lambda m: (m.created_at, m.id))]
+
+
+async def _history(session, **params) -> tuple[list[int], bool]:
+    params = {"before_id": None, "after_id": None, "limit": None, **params}
+    result = await get_conversation("c1", user=USER, db=session, **params)
+    return [message["id"] for message in result["messages"]], result["has_more"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_paging_back_with_before_id_walks_the_whole_history(limit):
+    async def scenario(session):
+        expected = await _seed_messages(session)
+
+        page, has_more = await _history(session, limit=limit)
+        collected = page
+        while has_more:
+            page, has_more = await _history(session, before_id=collected[0], limit=limit)
+            assert page, "has_more promised older messages"
+            collected = page + collected
+
+        assert collected == expected
+
+    _run(scenario)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_paging_forward_with_after_id_walks_the_rest_of_the_history(limit):
+    async def scenario(session):
+        expected = await _seed_messages(session)
+
+        collected, has_more = [expected[0]], True
+        while has_more:
+            page, has_more = await _history(session, after_id=collected[-1], limit=limit)
+            collected += page
+
+        assert collected == expected
+
+    _run(scenario)
+
+
+def test_history_boundaries():
+    async def scenario(session):
+        expected = await _seed_messages(session)
+
+        assert await _history(session) == (expected, False)
+        assert await _history(session, limit=len(expected)) == (expected, False)
+        assert await _history(session, after_id=expected[-1], limit=3) == ([], False)
+        assert await _history(session, before_id=expected[0], limit=3) == ([], False)
+        # Tied timestamps: the later id of the tie is newer
+        assert await _history(session, after_id=expected[1]) == (expected[2:], False)
+        assert await _history(session, before_id=expected[2], limit=1) == ([expected[1]], True)
+
+    _run(scenario)
+
+
+def test_history_rejects_both_cursors():
+    async def scenario(session):
+        await _seed_messages(session)
+        with pytest.raises(HTTPException) as error:
+            await _history(session, before_id=1, after_id=2)
+        assert error.value.status_code == 400
+
+    _run(scenario)
@@ -0,0 +1,195 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.models.ingestion_job import IngestionJob
+from app.services import ingestion_queue
+from app.services.ingestion_queue import PAYLOAD_TEXT, _finish_job, process_job
+from app.utils.parser import UnprocessableDocumentError
+
+
+class FakeResult:
+    def __init__(self, rowcount: int, scalar=None):
+        self.rowcount = rowcount
+        self._scalar = scalar
+
+    def scalar_one_or_none(self):
+        return self._scalar
+
+
+class FakeSession:
+    """
+    Records statements. Each UPDATE returns the next of rowcounts (then 1);
+    SELECTs find the job row unless job_exists is False.
+    """
+
+    def __init__(self, rowcounts=(), job_exists: bool = True):
+        self.statements = []
+        self._rowcounts = list(rowcounts)
+        self._job_exists = job_exists
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        if not statement.is_dml:
+            return FakeResult(0, 7 if self._job_exists else None)
+        return FakeResult(self._rowcounts.pop(0) if self._rowcounts else 1)
+
+    async def commit(self):
+        pass
+
+    def updates(self):
+        """(table, values) of each UPDATE, without the WHERE parameters."""
+        return [
+            (statement.table.name, {k: v for k, v in statement.compile().params.items() if not k.endswith("_1")})
+            for statement in self.statements
+            if statement.is_dml
+        ]
+
+
+def _job(attempts: int = 1) -> IngestionJob:
+    return IngestionJob(
+        id=7,
+        doc_id="doc-1",
+        user_email="user@example.com",
+        payload=b"payload",
+        payload_format=PAYLOAD_TEXT,
+        status="running",
+        priority=0,
+        attempts=attempts,
+        max_attempts=5,
+    )
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(ingestion_queue, "AsyncSessionLocal", fake)
+    return fake
+
+
+def _fail_ingest_with(monkeypatch, error: Exception):
+    async def ingest(job):
+        raise error
+
+    monkeypatch.setattr(ingestion_queue, "_ingest_payload", ingest)
+
+
+def test_permanent_error_fails_job_and_document_on_first_attempt(session, monkeypatch):
+    _fail_ingest_with(monkeypatch, UnprocessableDocumentError("No extractable text found in document doc-1"))
+
+    asyncio.run(process_job(_job(attempts=1), "worker-a"))
+
+    (job_table, job_values), (doc_table, doc_values) = session.updates()
+    assert job_table == "ingestion_jobs" and job_values["status"] == "failed"
+    assert "No extractable text" in job_values["last_error"]
+    assert doc_table == "documents" and doc_values["status"] == "failed"
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ConnectionError("qdrant unreachable"),
+        # A ValueError subclass, but from a truncated provider response rather than the document
+        json.JSONDecodeError("Expecting value", "", 0),
+    ],
+)
+def test_transient_error_is_rescheduled(session, monkeypatch, error):
+    _fail_ingest_with(monkeypatch, error)
+
+    asyncio.run(process_job(_job(attempts=1), "worker-a"))
+
+    [(job_table, job_values)] = session.updates()
+    assert job_table == "ingestion_jobs" and job_values["status"] == "queued"
+
+
+def _record_vector_deletes(monkeypatch) -> list:
+    deleted = []
+
+    async def delete_vectors(doc_id, user_email=None):
+        deleted.append((doc_id, user_email))
+
+    monkeypatch.setattr(ingestion_queue, "delete_document_vectors", delete_vectors)
+    return deleted
+
+
+def _lose_lease(monkeypatch, session: FakeSession) -> asyncio.Event:
+    """Run process_job against session with an ingestion that only stops when cancelled."""
+    monkeypatch.setattr(ingestion_queue, "AsyncSessionLocal", session)
+    monkeypatch.setattr(settings, "INGESTION_LEASE_SECONDS", 0.03)
+    cancelled = asyncio.Event()
+
+    async def ingest(job):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(ingestion_queue, "_ingest_payload", ingest)
+
+    async def run():
+        await asyncio.wait_for(process_job(_job(), "worker-a"), timeout=2)
+
+    asyncio.run(run())
+    return cancelled
+
+
+def test_lease_taken_by_another_worker_cancels_processing(monkeypatch):
+    deleted = _record_vector_deletes(monkeypatch)
+    # The first lease renewal finds the job reclaimed by another worker
+    session = FakeSession(rowcounts=[0])
+
+    cancelled = _lose_lease(monkeypatch, session)
+
+    assert cancelled.is_set()
+    # Only the failed renewal: the job was neither finished nor failed by this worker
+    [(job_table, job_values)] = session.updates()
+    assert job_table == "ingestion_jobs" and "status" not in job_values
+    assert deleted == []
+
+
+def test_document_deleted_during_processing_drops_its_chunks(monkeypatch):
+    deleted = _record_vector_deletes(monkeypatch)
+    # Deleting the Document cascaded to the job row
+    session = FakeSession(rowcounts=[0], job_exists=False)
+
+    cancelled = _lose_lease(monkeypatch, session)
+
+    assert cancelled.is_set()
+    assert deleted == [("doc-1", "user@example.com")]
+
+
+def test_finish_after_lease_taken_leaves_document_alone(monkeypatch):
+    deleted = _record_vector_deletes(monkeypatch)
+    session = FakeSession(rowcounts=[0])
+    monkeypatch.setattr(ingestion_queue, "AsyncSessionLocal", session)
+
+    asyncio.run(_finish_job(_job(), "worker-a"))
+
+    [(job_table, _)] = session.updates()
+    assert job_table == "ingestion_jobs"
+    # The new lease owner is re-processing the document: its vectors must stay
+    assert deleted == []
+
+
+def test_finish_after_document_deleted_drops_its_chunks(monkeypatch):
+    deleted = _record_vector_deletes(monkeypatch)
+    session = FakeSession(rowcounts=[0], job_exists=False)
+    monkeypatch.setattr(ingestion_queue, "AsyncSessionLocal", session)
+
+    asyncio.run(_finish_job(_job(), "worker-a"))
+
+    [(job_table, _)] = session.updates()
+    assert job_table == "ingestion_jobs"
+    assert deleted == [("doc-1", "user@example.com")]
@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import types
+
+import pytest
+
+from app.services import rag
+from app.services.lexical_index import LexicalIndex, match_expression, reciprocal_rank_fusion
+
+ALICE = "alice@example.com"
+BOB = "bob@example.com"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(str(tmp_path), enabled=True)
+
+
+def _search(index: LexicalIndex, user: str, query: str, doc_ids=("d1",), limit: int = 10) -> list[str]:
+    return [hit.point_id for hit in asyncio.run(index.search(user, query, list(doc_ids), limit))]
+
+
+# ---------- reciprocal rank fusion ----------
+
+
+def test_rrf_scores_are_summed_reciprocal_ranks():
+    scores = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+
+    assert scores == {"a": 1 / 61, "b": 1 / 62 + 1 / 61, "c": 1 / 62}
+
+
+def test_rrf_prefers_items_ranked_by_both_lists():
+    dense = ["d1", "both", "d2", "d3"]
+    lexical = ["l1", "l2", "both"]
+
+    scores = reciprocal_rank_fusion([dense, lexical], k=60)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+
+    assert ranked[0] == "both"
+    # Among items found by one list only, rank within that list decides; ties keep first-seen order
+    assert ranked[1:] == ["d1", "l1", "l2", "d2", "d3"]
+
+
+def test_rrf_small_k_lets_top_ranks_dominate():
+    # "top" is first in one list only; "steady" is third in both
+    rankings = [["top", "x", "steady"], ["y", "z", "steady"]]
+
+    low_k = reciprocal_rank_fusion(rankings, k=0)
+    high_k = reciprocal_rank_fusion(rankings, k=60)
+
+    assert low_k["top"] > low_k["steady"]
+    assert high_k["steady"] > high_k["top"]
+
+
+# ---------- query parsing ----------
+
+
+def test_match_expression_quotes_and_dedupes_terms():
+    assert match_expression('Why "ERR_CONN_RESET" OR near(x)?') == '"why" OR "err_conn_reset" OR "or" OR "near" OR "x"'
+    assert match_expression("Error error ERROR") == '"error"'
+    assert match_expression("?!") == ""
+
+
+# ---------- index ----------
+
+
+def test_search_ranks_by_bm25_within_the_users_documents(index):
+    asyncio.run(index.add_chunks(ALICE, [
+        ("p1", "d1", 0, "the connection failed with ERR_CONN_RESET"),
+        ("p2", "d1", 1, "unrelated text about gardening"),
+        ("p3", "d2", 0, "ERR_CONN_RESET in another document"),
+        ("p4", "d1", 2, "ERR_CONN_RESET ERR_CONN_RESET retry ERR_CONN_RESET"),
+    ]))
+    asyncio.run(index.add_chunks(BOB, [("b1", "d1", 0, "ERR_CONN_RESET for bob")]))
+
+    assert _search(index, ALICE, "err_conn_reset") == ["p4", "p1"]
+    assert _search(index, ALICE, "err_conn_reset", doc_ids=("d1", "d2")) == ["p4", "p3", "p1"]
+    assert _search(index, BOB, "err_conn_reset") == ["b1"]
+
+
+def test_remove_doc_keeps_only_the_given_points(index):
+    asyncio.run(index.add_chunks(ALICE, [("p1", "d1", 0, "alpha"), ("p2", "d1", 1, "alpha beta")]))
+
+    asyncio.run(index.remove_doc(ALICE, "d1", keep={"p2"}))
+    assert _search(index, ALICE, "alpha") == ["p2"]
+
+    asyncio.run(index.remove_doc(ALICE, "d1"))
+    assert _search(index, ALICE, "alpha") == []
+
+
+def test_appended_text_is_searchable_until_the_row_is_rewritten(index):
+    asyncio.run(index.add_chunks(ALICE, [("p1", "d1", 0, "connection failed")]))
+
+    asyncio.run(index.append_text(ALICE, [("p1", "\n\nconnection failed with ERR_4711")]))
+    assert _search(index, ALICE, "err_4711") == ["p1"]
+
+    asyncio.run(index.add_chunks(ALICE, [("p1", "d1", 0, "connection failed")]))
+    assert _search(index, ALICE, "err_4711") == []
+
+
+def test_a_users_write_blocks_neither_their_searches_nor_other_users(index):
+    asyncio.run(index.add_chunks(ALICE, [("p1", "d1", 0, "alpha")]))
+    asyncio.run(index.add_chunks(BOB, [("b1", "d1", 0, "alpha")]))
+    writing = index._db(ALICE).write_lock
+
+    async def while_alice_writes():
+        # A long ingestion upsert for Alice holds her write lock meanwhile
+        with writing:
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    index.search(ALICE, "alpha", ["d1"], 10),
+                    index.search(BOB, "alpha", ["d1"], 10),
+                    index.add_chunks(BOB, [("b2", "d1", 1, "beta")]),
+                ),
+                timeout=5,
+            )
+
+    alice_hits, bob_hits, _ = asyncio.run(while_alice_writes())
+
+    assert [hit.point_id for hit in alice_hits] == ["p1"]
+    assert [hit.point_id for hit in bob_hits] == ["b1"]
+    assert _search(index, BOB, "beta") == ["b2"]
+
+
+def test_concurrent_writes_for_one_user_are_serialised(index):
+    errors = []
+
+    def write(start: int):
+        try:
+            rows = [(f"p{i}", "d1", i, f"alpha {i}") for i in range(start, start + 200)]
+            asyncio.run(index.add_chunks(ALICE, rows))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n * 200,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(_search(index, ALICE, "alpha", limit=1000)) == 800
+
+
+# ---------- hybrid retrieval ----------
+
+
+def _point(point_id: str, text: str, score: float):
+    return types.SimpleNamespace(id=point_id, score=score, payload={"text": text, "source": "d1", "chunk": 0})
+
+
+class FakeQdrant:
+    """Returns dense in order; rescores only the lexical hits whose points are in existing."""
+
+    def __init__(self, dense: list[str], existing: set[str]):
+        self.dense = dense
+        self.existing = existing
+
+    async def search(self, **kwargs):
+        return [_point(point_id, point_id, 0.9) for point_id in self.dense]
+
+    async def search_batch(self, collection_name, requests):
+        has_id = requests[1].filter.must[1].has_id
+        rescored = [_point(str(point_id), str(point_id), 0.5) for point_id in has_id if point_id in self.existing]
+        return [_point(point_id, point_id, 0.9) for point_id in self.dense], rescored
+
+
+def test_hybrid_search_returns_fused_order(index, monkeypatch):
+    asyncio.run(index.add_chunks(ALICE, [
+        ("shared", "d1", 0, "reset reset reset"),
+        ("lexical", "d1", 1, "reset reset"),
+        ("deleted", "d1", 2, "reset"),
+    ]))
+    monkeypatch.setattr(rag, "lexical_index", index)
+    monkeypatch.setattr(rag, "qdrant_client", FakeQdrant(["dense", "shared"], existing={"shared", "lexical"}))
+
+    matches = asyncio.run(rag._hybrid_search("reset", [0.1], ["d1"], 3, ALICE))
+
+    # "shared" is in both rankings; the lexical hit without a Qdrant point is dropped
+    assert [match["text"] for match in matches] == ["shared", "dense", "lexical"]
+
+
+def test_hybrid_search_without_lexical_hits_is_plain_vector_search(index, monkeypatch):
+    monkeypatch.setattr(rag, "lexical_index", index)
+    monkeypatch.setattr(rag, "qdrant_client", FakeQdrant(["a", "b"], existing=set()))
+
+    matches = asyncio.run(rag._hybrid_search("nothing indexed", [0.1], ["d1"], 2, ALICE))
+
+    assert [match["text"] for match in matches] == ["a", "b"]
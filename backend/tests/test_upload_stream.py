@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app.utils.upload_stream import StreamedUpload, UploadStreamError, UploadTooLarge
+
+BOUNDARY = "test-boundary"
+
+
+def _part(name: str, data: bytes, filename: str | None = None) -> bytes:
+    disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else "")
+    return f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+
+
+def _body(*parts: bytes) -> bytes:
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+class _Client:
+    """A request whose body arrives in chunk_size pieces; sent counts the bytes handed over."""
+
+    def __init__(self, body: bytes, chunk_size: int = 64, content_type: str | None = None):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.sent = 0
+        content_type = content_type or f"multipart/form-data; boundary={BOUNDARY}"
+        scope = {"type": "http", "method": "POST", "headers": [(b"content-type", content_type.encode())]}
+        self.request = Request(scope, self._receive)
+
+    async def _receive(self):
+        chunk = self.body[self.sent : self.sent + self.chunk_size]
+        self.sent += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": self.sent < len(self.body)}
+
+
+async def _read_file(upload: StreamedUpload, max_size: int | None = None) -> bytes:
+    return b"".join([data async for data in upload.chunks(max_size)])
+
+
+def test_file_is_streamed_after_other_fields():
+    client = _Client(_body(_part("note", b"hello"), _part("file", b"x" * 1000, "a.md"), _part("after", b"z")))
+    upload = StreamedUpload(client.request, "file", max_size=1000)
+
+    async def main():
+        assert await upload.open() == "a.md"
+        return await _read_file(upload)
+
+    assert asyncio.run(main()) == b"x" * 1000
+    assert upload.size == 1000
+
+
+def test_oversized_file_stops_reading_at_the_cap():
+    client = _Client(_body(_part("file", b"x" * 100_000, "big.pdf")))
+    upload = StreamedUpload(client.request, "file", max_size=1000)
+
+    async def main():
+        await upload.open()
+        await _read_file(upload)
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(main())
+    # Only the chunks up to the crossing were pulled from the client
+    assert client.sent <= 1000 + 2 * client.chunk_size + 200
+
+
+def test_per_file_limit_in_bulk_upload():
+    client = _Client(_body(_part("files", b"a" * 10, "a.md"), _part("files", b"b" * 50, "b.md")))
+    upload = StreamedUpload(client.request, "files", max_size=100)
+
+    async def main():
+        async for filename in upload.files():
+            await _read_file(upload, max_size=20)
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(main())
+    assert upload.filename == "b.md"
+
+
+def test_bulk_total_counts_skipped_files():
+    files = [_part("files", bytes([97 + i]) * 400, f"{i}.md") for i in range(3)]
+    client = _Client(_body(*files))
+
+    async def read_all(upload: StreamedUpload) -> dict[str, bytes]:
+        read = {}
+        async for filename in upload.files():
+            # The second file is never read, only skipped
+            if filename != "1.md":
+                read[filename] = await _read_file(upload)
+        return read
+
+    within = StreamedUpload(client.request, "files", max_size=1000, max_total=1200)
+    assert asyncio.run(read_all(within)) == {"0.md": b"a" * 400, "2.md": b"c" * 400}
+    assert within.received == 1200
+
+    over = StreamedUpload(_Client(_body(*files)).request, "files", max_size=1000, max_total=1199)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(read_all(over))
+
+
+@pytest.mark.parametrize(
+    "body, content_type",
+    [
+        (_body(_part("file", b"x", "a.md")), "application/json"),
+        (_body(_part("file", b"x", "a.md")), "multipart/form-data"),
+        (_body(_part("other", b"x", "a.md"), _part("file", b"no filename")), None),
+    ],
+    ids=["not-multipart", "no-boundary", "no-file-part"],
+)
+def test_open_rejects_requests_without_the_file(body, content_type):
+    upload = StreamedUpload(_Client(body, content_type=content_type).request, "file", max_size=1000)
+
+    with pytest.raises(UploadStreamError):
+        asyncio.run(upload.open())
+
+
+def test_truncated_body_is_an_error():
+    body = _body(_part("file", b"x" * 500, "a.md"))
+    upload = StreamedUpload(_Client(body[:300]).request, "file", max_size=1000)
+
+    async def main():
+        await upload.open()
+        await _read_file(upload)
+
+    with pytest.raises(UploadStreamError):
+        asyncio.run(main())
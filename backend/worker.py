@@ -0,0 +1,33 @@
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+from app.core.config import settings
+from app.services.embedding_provider import embedding_provider
+from app.services.ingestion_queue import run_worker
+from app.utils.parse_pool import parse_pool
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='{"time": "%(asctime)s", "level": "%(levelname)s", "logger": "%(name)s", "message": "%(message)s"}',
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Standalone ingestion worker pool: `python worker.py` (run as many as needed)."""
+    logger.info(f"Starting {settings.INGESTION_WORKER_CONCURRENCY} ingestion workers")
+    parse_pool.start()
+    try:
+        await embedding_provider.warm_up()
+        await asyncio.gather(*(run_worker() for _ in range(settings.INGESTION_WORKER_CONCURRENCY)))
+    finally:
+        await embedding_provider.aclose()
+        parse_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())